@@ -1,21 +1,234 @@
 #include <SPI.h>
 #include <MFRC522.h>
+#include <EEPROM.h>
 
 #define SS_PIN 10
 #define RST_PIN 9
 #define BUZZER_PIN 8  // Buzzer na porta 8
 
+// Comunicação com o host (deve ser igual ao BAUD_RATE/PROTOCOLO do main.py)
+#define BAUD_RATE 115200
+#define PROTOCOLO_BINARIO 1  // 0 = texto (uma tag por linha), 1 = quadros binários
+
+// Quadro binário v1 (ver protocolo.py):
+// A5 5A | versão | tipo | seq (LE) | tamanho | payload | CRC16-CCITT (LE)
+#define QUADRO_VERSAO 1
+#define PAYLOAD_MAXIMO 32
+#define TIPO_UID 0x01
+#define TIPO_INICIADO 0x02
+#define TIPO_RESP_VERSAO 0x11
+#define TIPO_ACK 0x15
+#define TIPO_CMD_VERSAO 0x10
+#define TIPO_CMD_LISTA_INICIO 0x12
+#define TIPO_CMD_LISTA_BLOCO 0x13
+#define TIPO_CMD_LISTA_FIM 0x14
+#define VERSAO_FIRMWARE "2.0"
+
+// Lista de autorizados enviada pelo host (ver lista_autorizados.py):
+// hashes FNV-1a dos UIDs, ordenados, em dois bancos da EEPROM. A gravação
+// vai para o banco inativo e só no fim (CRC conferido) o banco ativo troca.
+#define CAPACIDADE_LISTA 120
+#define EE_MAGICO 0         // uint16: 0x4C41 quando há lista válida
+#define EE_BANCO_ATIVO 2    // uint8: 0 ou 1
+#define EE_BANCOS 4         // cada banco: versão (uint32) + total (uint16) + hashes
+#define TAMANHO_BANCO (6 + CAPACIDADE_LISTA * 4)
+#define MAGICO_LISTA 0x4C41
+
+#define STATUS_OK 0
+#define STATUS_CAPACIDADE 1
+#define STATUS_CHECKSUM 2
+#define STATUS_SEQUENCIA 3
+
 MFRC522 mfrc522(SS_PIN, RST_PIN);
 
-// Lista de cartões autorizados
+// Lista de fábrica, usada enquanto o host não envia a lista para a EEPROM
 String authorizedTags[] = {"3A163602", "AD88C801"}; // IDs do seu Python
 
+uint16_t seqQuadro = 0;
+
+// Recepção de comandos do host
+uint8_t rx[7 + PAYLOAD_MAXIMO + 2];
+uint8_t rxPos = 0;
+
+// Transferência da lista em andamento
+bool emTransferencia = false;
+uint32_t versaoPendente = 0;
+uint16_t totalPendente = 0;
+uint16_t recebidos = 0;
+uint16_t crcLista = 0xFFFF;
+
+// CRC-16/CCITT-FALSE (poly 0x1021, início 0xFFFF)
+uint16_t crc16(const uint8_t *dados, uint8_t tamanho, uint16_t crc = 0xFFFF) {
+  for (uint8_t i = 0; i < tamanho; i++) {
+    crc ^= (uint16_t)dados[i] << 8;
+    for (uint8_t b = 0; b < 8; b++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : (crc << 1);
+    }
+  }
+  return crc;
+}
+
+// Envia um quadro binário com o payload informado
+void enviarQuadro(uint8_t tipo, const uint8_t *payload, uint8_t tamanho) {
+  uint8_t cabecalho[5] = {QUADRO_VERSAO, tipo, (uint8_t)(seqQuadro & 0xFF), (uint8_t)(seqQuadro >> 8), tamanho};
+  uint16_t crc = crc16(cabecalho, sizeof(cabecalho));
+  crc = crc16(payload, tamanho, crc);
+
+  Serial.write(0xA5);
+  Serial.write(0x5A);
+  Serial.write(cabecalho, sizeof(cabecalho));
+  Serial.write(payload, tamanho);
+  Serial.write((uint8_t)(crc & 0xFF));
+  Serial.write((uint8_t)(crc >> 8));
+  seqQuadro++;
+}
+
+// FNV-1a 32 bits (mesmo hash_tag do Python)
+uint32_t fnv1a(const uint8_t *dados, uint8_t tamanho) {
+  uint32_t h = 0x811C9DC5UL;
+  for (uint8_t i = 0; i < tamanho; i++) {
+    h ^= dados[i];
+    h *= 0x01000193UL;
+  }
+  return h;
+}
+
+bool listaValida() {
+  uint16_t magico;
+  EEPROM.get(EE_MAGICO, magico);
+  return magico == MAGICO_LISTA;
+}
+
+int enderecoBanco(uint8_t banco) {
+  return EE_BANCOS + banco * TAMANHO_BANCO;
+}
+
+uint8_t bancoAtivo() {
+  return EEPROM.read(EE_BANCO_ATIVO) ? 1 : 0;
+}
+
+// Busca binária do hash no banco ativo da EEPROM
+bool hashAutorizado(uint32_t h) {
+  int base = enderecoBanco(bancoAtivo());
+  uint16_t total;
+  EEPROM.get(base + 4, total);
+  int ini = 0, fim = (int)total - 1;
+  while (ini <= fim) {
+    int meio = (ini + fim) / 2;
+    uint32_t valor;
+    EEPROM.get(base + 6 + meio * 4, valor);
+    if (valor == h) return true;
+    if (valor < h) ini = meio + 1; else fim = meio - 1;
+  }
+  return false;
+}
+
+void enviarAck(uint8_t cmd, uint8_t status, uint32_t valor) {
+  uint8_t payload[6] = {cmd, status};
+  memcpy(payload + 2, &valor, 4);  // AVR é little-endian, como o protocolo
+  enviarQuadro(TIPO_ACK, payload, sizeof(payload));
+}
+
+void tratarComando(uint8_t tipo, const uint8_t *payload, uint8_t tamanho) {
+  if (tipo == TIPO_CMD_VERSAO) {
+    uint8_t resposta[6] = {0};
+    if (listaValida()) {
+      EEPROM.get(enderecoBanco(bancoAtivo()), *(uint32_t *)resposta);
+      EEPROM.get(enderecoBanco(bancoAtivo()) + 4, *(uint16_t *)(resposta + 4));
+    }
+    enviarQuadro(TIPO_RESP_VERSAO, resposta, sizeof(resposta));
+  } else if (tipo == TIPO_CMD_LISTA_INICIO && tamanho == 6) {
+    memcpy(&versaoPendente, payload, 4);
+    memcpy(&totalPendente, payload + 4, 2);
+    if (totalPendente > CAPACIDADE_LISTA) {
+      emTransferencia = false;
+      enviarAck(tipo, STATUS_CAPACIDADE, versaoPendente);
+      return;
+    }
+    emTransferencia = true;
+    recebidos = 0;
+    crcLista = 0xFFFF;
+    enviarAck(tipo, STATUS_OK, versaoPendente);
+  } else if (tipo == TIPO_CMD_LISTA_BLOCO && tamanho >= 2) {
+    uint16_t offset;
+    memcpy(&offset, payload, 2);
+    uint8_t n = (tamanho - 2) / 4;
+    if (!emTransferencia || offset != recebidos || recebidos + n > totalPendente) {
+      emTransferencia = false;
+      enviarAck(tipo, STATUS_SEQUENCIA, offset);
+      return;
+    }
+    // Grava no banco inativo; o ativo continua valendo até o fim
+    int base = enderecoBanco(listaValida() ? 1 - bancoAtivo() : 0);
+    for (uint8_t i = 0; i < n; i++) {
+      uint32_t h;
+      memcpy(&h, payload + 2 + i * 4, 4);
+      EEPROM.put(base + 6 + (recebidos + i) * 4, h);
+    }
+    crcLista = crc16(payload + 2, n * 4, crcLista);
+    recebidos += n;
+    enviarAck(tipo, STATUS_OK, offset);
+  } else if (tipo == TIPO_CMD_LISTA_FIM && tamanho == 6) {
+    uint32_t versao;
+    uint16_t checksum;
+    memcpy(&versao, payload, 4);
+    memcpy(&checksum, payload + 4, 2);
+    bool completa = emTransferencia && versao == versaoPendente && recebidos == totalPendente;
+    emTransferencia = false;
+    if (!completa) {
+      enviarAck(tipo, STATUS_SEQUENCIA, versao);
+      return;
+    }
+    if (checksum != crcLista) {
+      enviarAck(tipo, STATUS_CHECKSUM, versao);
+      return;
+    }
+    uint8_t destino = listaValida() ? 1 - bancoAtivo() : 0;
+    EEPROM.put(enderecoBanco(destino), versao);
+    EEPROM.put(enderecoBanco(destino) + 4, totalPendente);
+    // Troca de banco com uma única escrita de byte
+    EEPROM.write(EE_BANCO_ATIVO, destino);
+    if (!listaValida()) EEPROM.put(EE_MAGICO, (uint16_t)MAGICO_LISTA);
+    enviarAck(tipo, STATUS_OK, versao);
+  }
+}
+
+// Lê os bytes disponíveis e trata cada quadro de comando completo
+void receberComandos() {
+  while (Serial.available()) {
+    uint8_t b = Serial.read();
+    if (rxPos == 0 && b != 0xA5) continue;
+    if (rxPos == 1 && b != 0x5A) {
+      rxPos = (b == 0xA5) ? 1 : 0;
+      continue;
+    }
+    rx[rxPos++] = b;
+    if (rxPos < 7) continue;
+    uint8_t tamanho = rx[6];
+    if (rx[2] != QUADRO_VERSAO || tamanho > PAYLOAD_MAXIMO) {
+      rxPos = 0;
+      continue;
+    }
+    if (rxPos == 7 + tamanho + 2) {
+      uint16_t recebido = rx[7 + tamanho] | (rx[8 + tamanho] << 8);
+      if (crc16(rx + 2, 5 + tamanho) == recebido) {
+        tratarComando(rx[3], rx + 7, tamanho);
+      }
+      rxPos = 0;
+    }
+  }
+}
+
 void setup() {
-  Serial.begin(9600);
+  Serial.begin(BAUD_RATE);
   SPI.begin();
   mfrc522.PCD_Init();
   pinMode(BUZZER_PIN, OUTPUT);
+#if PROTOCOLO_BINARIO
+  enviarQuadro(TIPO_INICIADO, (const uint8_t *)VERSAO_FIRMWARE, sizeof(VERSAO_FIRMWARE) - 1);
+#else
   Serial.println("RFID leitor iniciado");
+#endif
 }
 
 // Função para tocar sequência de bips
@@ -27,6 +240,9 @@ void beep(int *frequencies, int *durations, int count, int pause=50) {
 }
 
 void loop() {
+  // Comandos do host (lista de autorizados)
+  receberComandos();
+
   // Verifica se há um novo cartão
   if (!mfrc522.PICC_IsNewCardPresent()) return;
   if (!mfrc522.PICC_ReadCardSerial()) return;
@@ -39,14 +255,22 @@ void loop() {
   }
   rfidTag.toUpperCase(); // corrige: apenas chama o método, não atribui
 
+#if PROTOCOLO_BINARIO
+  enviarQuadro(TIPO_UID, mfrc522.uid.uidByte, mfrc522.uid.size);
+#else
   Serial.println(rfidTag);
+#endif
 
-  // Checa se o cartão está autorizado
+  // Checa se o cartão está autorizado (lista do host ou, sem ela, a de fábrica)
   bool authorized = false;
-  for (int i = 0; i < sizeof(authorizedTags)/sizeof(authorizedTags[0]); i++) {
-    if (rfidTag == authorizedTags[i]) {
-      authorized = true;
-      break;
+  if (listaValida()) {
+    authorized = hashAutorizado(fnv1a(mfrc522.uid.uidByte, mfrc522.uid.size));
+  } else {
+    for (int i = 0; i < sizeof(authorizedTags)/sizeof(authorizedTags[0]); i++) {
+      if (rfidTag == authorizedTags[i]) {
+        authorized = true;
+        break;
+      }
     }
   }
 
@@ -0,0 +1,524 @@
+import csv
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from arquivo_colunar import ArquivoColunar, arquivar_rotacionados
+from diario_estoque import DiarioEstoque
+from historico_estoque import HistoricoEstoque
+from historico import EXTENSAO_ARQUIVADO, EscritorHistorico, arquivos_historico
+from indice_campos import CAMPOS, IndiceCampos, ler_posicoes
+from indice_tempo import ler_intervalo, trecho
+
+# ---------------- ARMAZENAMENTO DE ESTOQUE E REPOSIÇÕES ----------------
+# Dois backends com a mesma interface:
+#   ArmazenamentoArquivos: estoque no diário + snapshots JSON e histórico em
+#     reposicoes.csv (o formato de sempre, com fsync em grupo e rotação). A
+#     linha do CSV e a baixa no estoque são gravadas uma depois da outra,
+#     sem transação. Os arquivos rotacionados antigos podem ser arquivados
+#     no formato colunar (arquivar_historico, ver arquivo_colunar.py).
+#   ArmazenamentoSQLite: estoque e histórico num banco SQLite em modo WAL;
+#     a linha do histórico e a baixa no estoque entram na mesma transação.
+# Na primeira execução com SQLite, o estoque e o histórico dos arquivos são
+# importados uma única vez (migrar_arquivos).
+#
+# Cada backend guarda a própria cópia do estoque e só é chamado pela thread
+# de I/O (ExecutorIO, uma tarefa de cada vez). A interface altera os
+# dicionários dela e manda os valores; nunca compartilham os mesmos dicts.
+#
+# Nos dois backends toda alteração de estoque também vai para o histórico do
+# estoque (historico_estoque.py), que responde "qual era o estoque em T".
+
+CABECALHO_CSV = ["Data/Hora", "Nome", "Área", "Peça", "Quantidade", "Modelo"]
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+# Trecho do período (bytes) abaixo do qual ler as linhas sai mais barato que carregar os índices por campo
+VARREDURA_MAXIMA = 256 * 1024
+
+
+class ErroArmazenamento(Exception):
+    pass
+
+
+def ler_reposicoes_csv(caminho, inicio=None, fim=None):
+    """Gera (data_hora, nome, área, peça, quantidade, modelo) de cada linha do histórico
+
+    Lê os arquivos rotacionados antes do arquivo atual. Com inicio/fim, só
+    as linhas com data_hora em [inicio, fim), achadas pelo índice de tempo
+    (ou, nos arquivados, pela data/hora mínima e máxima de cada bloco).
+    """
+    for arquivo in arquivos_historico(caminho):
+        if not os.path.exists(arquivo):
+            continue
+        if arquivo.endswith(EXTENSAO_ARQUIVADO):
+            yield from ArquivoColunar(arquivo).ler(inicio, fim)
+            continue
+        if inicio is not None or fim is not None:
+            yield from _normalizar(ler_intervalo(arquivo, inicio, fim))
+            continue
+        with open(arquivo, 'r', newline='', encoding='utf-8') as f:
+            yield from _normalizar(csv.reader(f))
+
+
+def _normalizar(linhas):
+    for linha in linhas:
+        if not linha or linha == CABECALHO_CSV:
+            continue
+        linha = (linha + [""] * 6)[:6]
+        try:
+            linha[4] = int(linha[4])
+        except ValueError:
+            continue
+        yield tuple(linha)
+
+
+def copiar_estoques(estoques):
+    """Cópia de {modelo: {área: dados}} para passar entre a interface e o armazenamento"""
+    return {modelo: {area: dict(dados) for area, dados in estoque.items()}
+            for modelo, estoque in estoques.items()}
+
+
+def _filtrar(linha, inicio, fim, nome, area, modelo, peca=None):
+    data_hora = linha[0]
+    return ((inicio is None or data_hora >= inicio)
+            and (fim is None or data_hora < fim)
+            and (nome is None or linha[1] == nome)
+            and (area is None or linha[2] == area)
+            and (peca is None or linha[3] == peca)
+            and (modelo is None or linha[5] == modelo))
+
+
+class Armazenamento:
+    """Interface dos backends de estoque e histórico de reposições"""
+
+    def carregar(self):
+        """Lê o estoque gravado; retorna (resumo para o log, cópia dos estoques)"""
+        raise NotImplementedError
+
+    def registrar_reposicao(self, nome, area, peca, quantidade, modelo, data_hora=None):
+        """Grava a reposição e a baixa no estoque"""
+        raise NotImplementedError
+
+    def registrar_alteracao(self, modelo, area, quantidade=None, minimo=None, usuario=None):
+        """Grava novos valores de uma área (ex.: painel do administrador)"""
+        raise NotImplementedError
+
+    def salvar_estoque(self, estoques=None):
+        """Grava o estoque; estoques (cópia) substitui o atual, ex.: troca de catálogo
+
+        Só as áreas que mudaram são gravadas.
+        """
+        raise NotImplementedError
+
+    def descarregar(self, modelos=None):
+        """Grava já o que estiver pendente desses modelos (ou de todos)"""
+        pass
+
+    def consultar_reposicoes(self, inicio=None, fim=None, nome=None, area=None, modelo=None, peca=None):
+        """Reposições com data_hora em [inicio, fim) e os filtros dados, em ordem de gravação"""
+        raise NotImplementedError
+
+    def arquivar_historico(self, dias):
+        """Arquiva o histórico com mais de 'dias' dias; retorna os arquivos arquivados"""
+        return []
+
+    def estoque_em(self, data_hora):
+        """({modelo: {área: dados}}, info) em data_hora, ou None se for antes do histórico"""
+        return self.historico_estoque.estado_em(data_hora)
+
+    def fechar(self):
+        pass
+
+    def estatisticas(self):
+        return {}
+
+
+class ArmazenamentoArquivos(Armazenamento):
+    """Estoque no diário + snapshots JSON e histórico em CSV"""
+
+    def __init__(self, estoques, caminho_csv='reposicoes.csv', caminho_diario='estoque.diario',
+                 padrao_snapshot='estoque_temp_{modelo}.json', limite_registros=1000,
+                 opcoes_historico=None, durabilidade='completa', indices_em_memoria=32,
+                 caminho_historico_estoque='estoque.historico'):
+        self.estoques = copiar_estoques(estoques)
+        self.caminho_csv = caminho_csv
+        self.indices_campos = OrderedDict()  # Arquivos rotacionados: caminho -> IndiceCampos (LRU)
+        self.indices_em_memoria = indices_em_memoria
+        self.diario = DiarioEstoque(self.estoques, caminho_diario, padrao_snapshot,
+                                    limite_registros=limite_registros, durabilidade=durabilidade)
+        # fsync_a_cada, fsync_ms, rotacao_bytes, rotacao_diaria (ver historico.py)
+        self.historico = EscritorHistorico(caminho_csv, CABECALHO_CSV, campos_indexados=CAMPOS,
+                                           **(opcoes_historico or {}))
+        self.historico_estoque = HistoricoEstoque(self.estoques, caminho_historico_estoque)
+
+    def carregar(self):
+        reaplicados = self.diario.carregar()
+        resumo = f"{reaplicados} alterações reaplicadas do diário"
+        if self.diario.snapshots_perdidos:
+            resumo += f"; snapshot perdido: {', '.join(self.diario.snapshots_perdidos)}"
+        self.historico_estoque.abrir()
+        return resumo, copiar_estoques(self.estoques)
+
+    def registrar_reposicao(self, nome, area, peca, quantidade, modelo, data_hora=None):
+        dados = self.estoques.get(modelo, {}).get(area)
+        if dados is None or dados["quantidade"] < quantidade:
+            raise ErroArmazenamento(f"Estoque insuficiente em {area}")
+        data_hora = data_hora or datetime.now().strftime(FORMATO_DATA)
+        self.historico.escrever([data_hora, nome, area, peca, quantidade, modelo])
+        dados["quantidade"] -= quantidade
+        self.diario.registrar(modelo, area, quantidade=dados["quantidade"])
+        self.historico_estoque.registrar(modelo, area, "reposicao", nome, -quantidade)
+
+    def registrar_alteracao(self, modelo, area, quantidade=None, minimo=None, usuario=None):
+        antes = self.estoques.get(modelo, {}).get(area, {}).get("quantidade", 0)
+        if self.diario.registrar(modelo, area, quantidade, minimo):
+            self.historico_estoque.registrar(modelo, area, "ajuste", usuario,
+                                             self.estoques[modelo][area]["quantidade"] - antes)
+
+    def salvar_estoque(self, estoques=None):
+        if estoques is not None:
+            self.diario.substituir(estoques)
+            self.historico_estoque.conferir("catalogo")
+        self.diario.compactar(esperar=True)
+
+    def descarregar(self, modelos=None):
+        self.diario.compactar(esperar=True, modelos=modelos)
+
+    def consultar_reposicoes(self, inicio=None, fim=None, nome=None, area=None, modelo=None, peca=None):
+        self.historico.descarregar()
+        filtros = {campo: valor for campo, valor in (("nome", nome), ("area", area), ("peca", peca),
+                                                     ("modelo", modelo)) if valor is not None}
+        if not filtros:
+            return [linha for linha in ler_reposicoes_csv(self.caminho_csv, inicio, fim)
+                    if _filtrar(linha, inicio, fim, nome, area, modelo)]
+        # Interseção das posting lists de cada arquivo, limitada ao trecho do período
+        resultado = []
+        for arquivo in arquivos_historico(self.caminho_csv):
+            if not os.path.exists(arquivo):
+                continue
+            if arquivo.endswith(EXTENSAO_ARQUIVADO):
+                # Sem posting lists: os filtros comparam os ids de cada bloco do período
+                resultado.extend(ArquivoColunar(arquivo).ler(inicio, fim, filtros))
+                continue
+            de, ate = trecho(arquivo, inicio, fim)
+            if ate - de <= VARREDURA_MAXIMA and arquivo not in self.indices_campos:
+                linhas = ler_intervalo(arquivo, inicio, fim)  # Arquivo fora do período, ou quase
+            else:
+                linhas = ler_posicoes(arquivo, self._indice_campos(arquivo).buscar(filtros, de, ate))
+            resultado.extend(linha for linha in _normalizar(linhas)
+                             if _filtrar(linha, inicio, fim, nome, area, modelo, peca))
+        return resultado
+
+    def arquivar_historico(self, dias):
+        antes_de = (date.today() - timedelta(days=dias)).isoformat()
+        arquivados = arquivar_rotacionados(self.caminho_csv, antes_de)
+        for arquivo in arquivados:
+            self.indices_campos.pop(arquivo, None)
+        return arquivados
+
+    def _indice_campos(self, arquivo):
+        if arquivo == self.caminho_csv:
+            return self.historico.indice_campos
+        indice = self.indices_campos.pop(arquivo, None)
+        if indice is None:
+            indice = IndiceCampos(arquivo).abrir(os.path.getsize(arquivo), somente_leitura=True)
+        self.indices_campos[arquivo] = indice
+        while len(self.indices_campos) > self.indices_em_memoria:
+            self.indices_campos.popitem(last=False)
+        return indice
+
+    def fechar(self):
+        self.historico.fechar()
+        self.diario.fechar()
+        self.historico_estoque.fechar()
+
+    def estatisticas(self):
+        return {"estoque": self.diario.estatisticas(), "historico": self.historico.estatisticas(),
+                "historico_estoque": self.historico_estoque.estatisticas()}
+
+
+SINCRONO_POR_DURABILIDADE = {'nenhuma': 'OFF', 'arquivo': 'NORMAL', 'completa': 'FULL'}
+# Campo de agregar_reposicoes -> expressão do GROUP BY
+AGRUPAMENTOS_SQL = {"nome": "nome", "area": "area", "peca": "peca", "modelo": "modelo",
+                    "hora": "CAST(substr(data_hora, 12, 2) AS INTEGER)", "dia": "substr(data_hora, 1, 10)"}
+
+
+class ArmazenamentoSQLite(Armazenamento):
+    """Estoque e histórico num banco SQLite (WAL), com a reposição numa só transação"""
+
+    def __init__(self, estoques, caminho='estoque.db', sincrono='NORMAL', migrar_de=None,
+                 caminho_historico_estoque='estoque.historico'):
+        self.estoques = copiar_estoques(estoques)
+        self.caminho = caminho
+        self.historico_estoque = HistoricoEstoque(self.estoques, caminho_historico_estoque)
+        self.migrar_de = migrar_de  # Parâmetros de ArmazenamentoArquivos para a migração
+        self.linhas_gravadas = 0
+        self.linhas_evitadas = 0  # Áreas sem alteração que salvar_estoque não regravou
+        self.alteracoes_sem_efeito = 0
+        self.conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conexao.execute("PRAGMA journal_mode=WAL")
+        # NORMAL em WAL: uma queda de energia nunca deixa o banco inconsistente;
+        # no pior caso se perdem os últimos commits antes dela. FULL não perde nenhum
+        self.conexao.execute(f"PRAGMA synchronous={sincrono}")
+        with self.lock, self.conexao:
+            self.conexao.executescript("""
+                CREATE TABLE IF NOT EXISTS estoque (
+                    modelo TEXT NOT NULL, area TEXT NOT NULL, peca TEXT NOT NULL,
+                    quantidade INTEGER NOT NULL, minimo INTEGER NOT NULL,
+                    PRIMARY KEY (modelo, area));
+                CREATE TABLE IF NOT EXISTS reposicoes (
+                    id INTEGER PRIMARY KEY, data_hora TEXT NOT NULL, nome TEXT NOT NULL,
+                    area TEXT NOT NULL, peca TEXT NOT NULL, quantidade INTEGER NOT NULL,
+                    modelo TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS reposicoes_data_hora ON reposicoes (data_hora);
+                CREATE INDEX IF NOT EXISTS reposicoes_nome ON reposicoes (nome, data_hora);
+                CREATE INDEX IF NOT EXISTS reposicoes_area ON reposicoes (area, data_hora);
+                CREATE INDEX IF NOT EXISTS reposicoes_modelo ON reposicoes (modelo, data_hora);
+                CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT);
+            """)
+
+    def _meta(self, chave):
+        linha = self.conexao.execute("SELECT valor FROM meta WHERE chave = ?", (chave,)).fetchone()
+        return linha[0] if linha else None
+
+    def carregar(self):
+        resumo = ""
+        if self.migrar_de is not None and self._meta("migrado_de_arquivos") is None:
+            migrados = migrar_arquivos(self, **self.migrar_de)
+            resumo = f"migrado dos arquivos: {migrados}; "
+        with self.lock:
+            linhas = self.conexao.execute(
+                "SELECT modelo, area, peca, quantidade, minimo FROM estoque").fetchall()
+        carregadas = 0
+        no_banco = {}
+        for modelo, area, peca, quantidade, minimo in linhas:
+            dados = self.estoques.get(modelo, {}).get(area)
+            if dados is not None:
+                dados["quantidade"] = quantidade
+                dados["minimo"] = minimo
+                no_banco[(modelo, area)] = dict(dados, peca=peca)
+                carregadas += 1
+        # Áreas novas do catálogo entram com os valores iniciais; peças renomeadas são atualizadas
+        self._gravar_estoque(no_banco)
+        self.historico_estoque.abrir()
+        return f"{resumo}{carregadas} áreas carregadas do banco", copiar_estoques(self.estoques)
+
+    def registrar_reposicao(self, nome, area, peca, quantidade, modelo, data_hora=None):
+        dados = self.estoques.get(modelo, {}).get(area)
+        if dados is None:
+            raise ErroArmazenamento(f"Área {area} não existe no modelo {modelo}")
+        data_hora = data_hora or datetime.now().strftime(FORMATO_DATA)
+        with self.lock, self.conexao:
+            cursor = self.conexao.execute(
+                "UPDATE estoque SET quantidade = quantidade - ? "
+                "WHERE modelo = ? AND area = ? AND quantidade >= ?",
+                (quantidade, modelo, area, quantidade))
+            if cursor.rowcount != 1:
+                raise ErroArmazenamento(f"Estoque insuficiente em {area}")
+            self.conexao.execute(
+                "INSERT INTO reposicoes (data_hora, nome, area, peca, quantidade, modelo) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (data_hora, nome, area, peca, quantidade, modelo))
+        dados["quantidade"] -= quantidade
+        self.historico_estoque.registrar(modelo, area, "reposicao", nome, -quantidade)
+
+    def registrar_alteracao(self, modelo, area, quantidade=None, minimo=None, usuario=None):
+        dados = self.estoques[modelo][area]
+        if ((quantidade is None or dados["quantidade"] == quantidade)
+                and (minimo is None or dados["minimo"] == minimo)):
+            self.alteracoes_sem_efeito += 1
+            return
+        with self.lock, self.conexao:
+            self.conexao.execute(
+                "UPDATE estoque SET quantidade = ?, minimo = ? WHERE modelo = ? AND area = ?",
+                (dados["quantidade"] if quantidade is None else quantidade,
+                 dados["minimo"] if minimo is None else minimo, modelo, area))
+        antes = dados["quantidade"]
+        if quantidade is not None:
+            dados["quantidade"] = quantidade
+        if minimo is not None:
+            dados["minimo"] = minimo
+        self.historico_estoque.registrar(modelo, area, "ajuste", usuario, dados["quantidade"] - antes)
+
+    def salvar_estoque(self, estoques=None):
+        if estoques is None:
+            self._gravar_estoque({})
+            return
+        gravado = {(modelo, area): dados for modelo, estoque in self.estoques.items()
+                   for area, dados in estoque.items()}
+        self.estoques.clear()
+        self.estoques.update(estoques)
+        self._gravar_estoque(gravado)
+        if self.historico_estoque.arquivo is not None:
+            self.historico_estoque.conferir("catalogo")
+
+    def _gravar_estoque(self, gravado):
+        """Upsert das áreas cujo valor difere de gravado {(modelo, área): dados}"""
+        linhas = [(modelo, area, dados["peca"], dados["quantidade"], dados["minimo"])
+                  for modelo, estoque in self.estoques.items() for area, dados in estoque.items()
+                  if gravado.get((modelo, area)) != dados]
+        self.linhas_evitadas += sum(len(estoque) for estoque in self.estoques.values()) - len(linhas)
+        if not linhas:
+            return
+        with self.lock, self.conexao:
+            self.conexao.executemany(
+                "INSERT INTO estoque VALUES (?, ?, ?, ?, ?) ON CONFLICT (modelo, area) DO UPDATE SET "
+                "peca = excluded.peca, quantidade = excluded.quantidade, minimo = excluded.minimo",
+                linhas)
+        self.linhas_gravadas += len(linhas)
+
+    def consultar_reposicoes(self, inicio=None, fim=None, nome=None, area=None, modelo=None, peca=None):
+        condicoes, parametros = [], []
+        for condicao, valor in (("data_hora >= ?", inicio), ("data_hora < ?", fim), ("nome = ?", nome),
+                                ("area = ?", area), ("peca = ?", peca), ("modelo = ?", modelo)):
+            if valor is not None:
+                condicoes.append(condicao)
+                parametros.append(valor)
+        sql = "SELECT data_hora, nome, area, peca, quantidade, modelo FROM reposicoes"
+        if condicoes:
+            sql += " WHERE " + " AND ".join(condicoes)
+        with self.lock:
+            return self.conexao.execute(sql + " ORDER BY id", parametros).fetchall()
+
+    def agregar_reposicoes(self, campo, inicio=None, fim=None):
+        """[(valor, reposições, quantidade)] por campo (AGRUPAMENTOS_SQL), com data_hora em [inicio, fim)
+
+        É o GROUP BY do banco que soma: nada do histórico passa pelo Python.
+        """
+        expressao = AGRUPAMENTOS_SQL[campo]
+        condicoes, parametros = [], []
+        for condicao, valor in (("data_hora >= ?", inicio), ("data_hora < ?", fim)):
+            if valor is not None:
+                condicoes.append(condicao)
+                parametros.append(valor)
+        sql = f"SELECT {expressao}, COUNT(*), SUM(quantidade) FROM reposicoes"
+        if condicoes:
+            sql += " WHERE " + " AND ".join(condicoes)
+        with self.lock:
+            return self.conexao.execute(sql + f" GROUP BY {expressao}", parametros).fetchall()
+
+    def fechar(self):
+        with self.lock:
+            self.conexao.close()
+        self.historico_estoque.fechar()
+
+    def estatisticas(self):
+        return {"linhas_gravadas": self.linhas_gravadas, "linhas_evitadas": self.linhas_evitadas,
+                "alteracoes_sem_efeito": self.alteracoes_sem_efeito,
+                "historico_estoque": self.historico_estoque.estatisticas()}
+
+
+def migrar_arquivos(banco, caminho_csv='reposicoes.csv', caminho_diario='estoque.diario',
+                    padrao_snapshot='estoque_temp_{modelo}.json'):
+    """Importa uma única vez o estoque (snapshots + diário) e o histórico CSV para o SQLite
+
+    Os arquivos ficam no disco como cópia de segurança.
+    """
+    diario = DiarioEstoque(banco.estoques, caminho_diario, padrao_snapshot)
+    diario.carregar()
+    diario.fechar()
+    reposicoes = list(ler_reposicoes_csv(caminho_csv))
+    banco.salvar_estoque()
+    with banco.lock, banco.conexao:
+        banco.conexao.executemany(
+            "INSERT INTO reposicoes (data_hora, nome, area, peca, quantidade, modelo) "
+            "VALUES (?, ?, ?, ?, ?, ?)", reposicoes)
+        banco.conexao.execute("INSERT OR REPLACE INTO meta VALUES ('migrado_de_arquivos', ?)",
+                              (datetime.now().strftime(FORMATO_DATA),))
+    return {"reposicoes": len(reposicoes)}
+
+
+def criar_armazenamento(cfg, estoques, caminho_csv='reposicoes.csv', caminho_diario='estoque.diario',
+                        limite_registros=1000, caminho_historico_estoque='estoque.historico'):
+    """Cria o backend configurado: {"tipo": "arquivos", ...} ou {"tipo": "sqlite", "caminho": ...}
+
+    Em "arquivos", as chaves fsync_a_cada, fsync_ms, rotacao_bytes e
+    rotacao_diaria configuram o escritor do histórico. "durabilidade"
+    ('nenhuma', 'arquivo' ou 'completa', ver snapshot.py) vale para os
+    snapshots; no SQLite vira o PRAGMA synchronous se "sincrono" não for dado.
+    """
+    tipo = cfg.get("tipo", "arquivos")
+    durabilidade = cfg.get("durabilidade", "completa")
+    if tipo == "arquivos":
+        opcoes_historico = {chave: cfg[chave] for chave in
+                            ("fsync_a_cada", "fsync_ms", "rotacao_bytes", "rotacao_diaria") if chave in cfg}
+        return ArmazenamentoArquivos(estoques, caminho_csv, caminho_diario,
+                                     limite_registros=limite_registros,
+                                     opcoes_historico=opcoes_historico,
+                                     durabilidade=durabilidade,
+                                     caminho_historico_estoque=caminho_historico_estoque)
+    if tipo == "sqlite":
+        return ArmazenamentoSQLite(estoques, cfg.get("caminho", "estoque.db"),
+                                   cfg.get("sincrono", SINCRONO_POR_DURABILIDADE[durabilidade]),
+                                   migrar_de={"caminho_csv": caminho_csv, "caminho_diario": caminho_diario},
+                                   caminho_historico_estoque=caminho_historico_estoque)
+    raise ValueError(f"Armazenamento desconhecido: {tipo}")
+
+
+def medir_armazenamento(reposicoes=2000, historico=100000, n_operadores=50):
+    """Compara latência de commit e consultas ao histórico: arquivos x SQLite"""
+    import random
+    import tempfile
+    rnd = random.Random(1)
+    operadores = [f"Operador {i}" for i in range(n_operadores)]
+    areas = [f"A{i}" for i in range(1, 7)]
+    # Histórico de ~1 ano, em ordem de gravação
+    base = time.mktime((2025, 1, 1, 0, 0, 0, 0, 0, -1))
+    linhas = [(time.strftime(FORMATO_DATA, time.localtime(base + i * 300)), rnd.choice(operadores),
+               rnd.choice(areas), "Peça", rnd.randint(1, 5), rnd.choice(("313", "314")))
+              for i in range(historico)]
+    pedidos = [(rnd.choice(operadores), rnd.choice(areas), rnd.choice(("313", "314")))
+               for _ in range(reposicoes)]
+    consultas = {
+        "operador": {"nome": "Operador 7"},
+        "um_dia": {"inicio": "2025-06-01 00:00:00", "fim": "2025-06-02 00:00:00"},
+        "area_modelo": {"area": "A3", "modelo": "313"},
+    }
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        for tipo in ("arquivos", "sqlite"):
+            estoques = {m: {a: {"peca": "Peça", "quantidade": 10 ** 9, "minimo": 0} for a in areas}
+                        for m in ("313", "314")}
+            if tipo == "arquivos":
+                armazenamento = ArmazenamentoArquivos(
+                    estoques, os.path.join(pasta, "reposicoes.csv"), os.path.join(pasta, "estoque.diario"),
+                    os.path.join(pasta, "estoque_temp_{modelo}.json"),
+                    caminho_historico_estoque=os.path.join(pasta, "arquivos.historico"))
+            else:
+                armazenamento = ArmazenamentoSQLite(
+                    estoques, os.path.join(pasta, "estoque.db"),
+                    caminho_historico_estoque=os.path.join(pasta, "sqlite.historico"))
+            armazenamento.carregar()
+            # Histórico grande para as consultas (antes das reposições de agora, como no uso real)
+            if tipo == "arquivos":
+                armazenamento.historico.escrever_varias(linhas)
+            else:
+                with armazenamento.conexao:
+                    armazenamento.conexao.executemany(
+                        "INSERT INTO reposicoes (data_hora, nome, area, peca, quantidade, modelo) "
+                        "VALUES (?, ?, ?, ?, ?, ?)", linhas)
+            tempos = []
+            for nome, area, modelo in pedidos:
+                inicio = time.perf_counter()
+                armazenamento.registrar_reposicao(nome, area, "Peça", 1, modelo)
+                tempos.append(time.perf_counter() - inicio)
+            tempos.sort()
+            resultado = {"commit_p50_ms": tempos[len(tempos) // 2] * 1000,
+                         "commit_p99_ms": tempos[int(len(tempos) * 0.99)] * 1000}
+            for nome, filtros in consultas.items():
+                inicio = time.perf_counter()
+                n = len(armazenamento.consultar_reposicoes(**filtros))
+                resultado[f"consulta_{nome}_ms"] = (time.perf_counter() - inicio) * 1000
+                resultado[f"consulta_{nome}_linhas"] = n
+            armazenamento.fechar()
+            resultados[tipo] = resultado
+    return resultados
+
+
+if __name__ == "__main__":
+    for tipo, resultado in medir_armazenamento().items():
+        print(f"{tipo}: " + " | ".join(f"{k} {v:.2f}" if isinstance(v, float) else f"{k} {v}"
+                                       for k, v in resultado.items()))
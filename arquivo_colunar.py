@@ -0,0 +1,380 @@
+import argparse
+import bz2
+import csv
+import json
+import lzma
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from datetime import date, timedelta
+from functools import lru_cache
+from itertools import accumulate, zip_longest
+
+from historico import EXTENSAO_ARQUIVADO, arquivos_historico, ultima_data_hora
+from indice_campos import remover
+from indice_tempo import caminho_indice
+from snapshot import gravar_atomico
+
+# ---------------- ARQUIVO COLUNAR DO HISTÓRICO ----------------
+# Os arquivos rotacionados do histórico (reposicoes-AAAA-MM-DD-NNN.csv) já
+# estão fechados e só são lidos. Aqui eles viram reposicoes-AAAA-MM-DD-NNN.col:
+#   - por coluna: data/hora, nome, área, peça, quantidade, modelo
+#   - nome, área, peça e modelo por dicionário (id do valor no rodapé)
+#   - data/hora em segundos, guardada como diferença para a linha anterior
+#   - blocos de linhas_por_bloco linhas comprimidos um a um (zlib, bz2 ou
+#     lzma), cada um com data/hora mínima e máxima no rodapé
+# Uma leitura por período só descomprime os blocos que podem ter linhas do
+# período; os filtros por campo comparam ids, e só as linhas que passam
+# viram texto de novo.
+#
+# Layout: cabeçalho | blocos | rodapé JSON | posição, tamanho e CRC32 do
+# rodapé + mágico. O .col é gravado inteiro num arquivo temporário e
+# conferido linha a linha contra o CSV antes de o CSV (e os índices dele)
+# ser apagado. Enquanto o CSV existir, ele é que vale (ver
+# historico.arquivos_historico).
+
+MAGICO = b'REPOSCOL'
+VERSAO_ARQUIVO = 1
+CABECALHO = struct.Struct('<8sB7x')  # mágico, versão
+FINAL = struct.Struct('<QII8s')  # posição do rodapé, tamanho, CRC32, mágico
+CAMPOS = ("nome", "area", "peca", "modelo")
+COLUNAS = (("t", 'q'), ("nome", 'I'), ("area", 'I'), ("peca", 'I'), ("quantidade", 'i'), ("modelo", 'I'))
+CODECS = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "bz2": (bz2.compress, bz2.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+EPOCA = date(1970, 1, 1).toordinal()
+MINUTOS_SEGUNDOS = [f"{m:02d}:{s:02d}" for m in range(60) for s in range(60)]
+
+
+class ArquivoInvalido(Exception):
+    pass
+
+
+@lru_cache(maxsize=4096)
+def _dia(dias):
+    return date.fromordinal(EPOCA + dias).isoformat()
+
+
+# As linhas de uma mesma hora só diferem em "MM:SS": as horas ficam em cache
+@lru_cache(maxsize=4096)
+def _hora(prefixo):
+    """'AAAA-MM-DD HH' -> segundos"""
+    try:
+        horas = int(prefixo[11:])
+        valor = (date.fromisoformat(prefixo[:10]).toordinal() - EPOCA) * 86400 + horas * 3600
+    except ValueError:
+        valor = None
+    if valor is None or _prefixo(valor // 3600) != prefixo + ':':
+        raise ValueError(f"data/hora inválida: {prefixo!r}")
+    return valor
+
+
+@lru_cache(maxsize=4096)
+def _prefixo(horas):
+    """Horas desde 1970 -> 'AAAA-MM-DD HH:'"""
+    dias, hora = divmod(horas, 24)
+    return f"{_dia(dias)} {hora:02d}:"
+
+
+def segundos(data_hora):
+    """'AAAA-MM-DD HH:MM:SS' -> segundos desde 1970 (sem fuso); ValueError se não for exatamente isso"""
+    minutos, segs = data_hora[14:16], data_hora[17:19]
+    if (len(data_hora) != 19 or data_hora[13] != ':' or data_hora[16] != ':' or not (minutos + segs).isascii()
+            or not (minutos + segs).isdigit() or minutos >= '60' or segs >= '60'):
+        raise ValueError(f"data/hora inválida: {data_hora!r}")
+    return _hora(data_hora[:13]) + int(minutos) * 60 + int(segs)
+
+
+def formatar(valor):
+    """Inverso de segundos()"""
+    horas, resto = divmod(valor, 3600)
+    return _prefixo(horas) + MINUTOS_SEGUNDOS[resto]
+
+
+def dia_e_hora(valor):
+    """('AAAA-MM-DD', hora) de um valor de segundos()"""
+    dias, resto = divmod(valor, 86400)
+    return _dia(dias), resto // 3600
+
+
+def caminho_arquivo(caminho_csv):
+    return os.path.splitext(caminho_csv)[0] + EXTENSAO_ARQUIVADO
+
+
+def ler_csv(caminho_csv):
+    """Linhas do CSV como o armazenamento as vê: 6 colunas, quantidade inteira, sem cabeçalho
+
+    Só a primeira linha pode ser o cabeçalho. Qualquer outra que não tenha 5
+    (sem modelo, formato antigo) ou 6 colunas com a quantidade inteira dá
+    ValueError: arquivar o CSV sem ela a perderia quando ele fosse apagado.
+    """
+    with open(caminho_csv, 'r', newline='', encoding='utf-8') as f:
+        for numero, linha in enumerate(csv.reader(f), 1):
+            if not linha:
+                continue
+            if numero == 1 and linha[4:5] == ["Quantidade"]:
+                continue  # Cabeçalho
+            if len(linha) not in (5, 6):
+                raise ValueError(f"{caminho_csv}, linha {numero}: {len(linha)} colunas")
+            linha = (linha + [""])[:6]
+            try:
+                linha[4] = int(linha[4])
+            except ValueError:
+                raise ValueError(f"{caminho_csv}, linha {numero}: quantidade inválida ({linha[4]!r})") from None
+            yield tuple(linha)
+
+
+def _para_bytes(coluna):
+    if sys.byteorder != 'little':
+        coluna.byteswap()
+    return coluna.tobytes()
+
+
+def arquivar(caminho_csv, destino=None, linhas_por_bloco=16384, codec="zlib", durabilidade='completa'):
+    """Grava o CSV no formato colunar; retorna {"linhas", "blocos", "bytes"}
+
+    ValueError se alguma linha tiver data/hora fora do formato (o CSV fica como está).
+    """
+    destino = destino or caminho_arquivo(caminho_csv)
+    comprimir = CODECS[codec][0]
+    ids = {campo: {} for campo in CAMPOS}
+    partes = [CABECALHO.pack(MAGICO, VERSAO_ARQUIVO)]
+    posicao = CABECALHO.size
+    blocos = []
+    total = 0
+
+    def fechar_bloco(linhas):
+        nonlocal posicao
+        tempos = [segundos(linha[0]) for linha in linhas]
+        colunas = [array('q', [b - a for a, b in zip([0] + tempos, tempos)])]
+        for campo, indice in zip(CAMPOS, (1, 2, 3, 5)):
+            valores = ids[campo]
+            colunas.append(array('I', [valores.setdefault(linha[indice], len(valores)) for linha in linhas]))
+        colunas.insert(4, array('i', [linha[4] for linha in linhas]))
+        dados = comprimir(b''.join(_para_bytes(coluna) for coluna in colunas))
+        partes.append(dados)
+        blocos.append([posicao, len(dados), len(linhas), formatar(min(tempos)), formatar(max(tempos)),
+                       zlib.crc32(dados)])
+        posicao += len(dados)
+
+    linhas = []
+    for linha in ler_csv(caminho_csv):
+        linhas.append(linha)
+        if len(linhas) == linhas_por_bloco:
+            fechar_bloco(linhas)
+            total += len(linhas)
+            linhas = []
+    if linhas:
+        fechar_bloco(linhas)
+        total += len(linhas)
+    rodape = json.dumps({"codec": codec, "linhas": total, "origem": os.path.basename(caminho_csv),
+                         "dicionarios": {campo: list(valores) for campo, valores in ids.items()},
+                         "blocos": blocos}, ensure_ascii=False).encode('utf-8')
+    partes.append(rodape)
+    partes.append(FINAL.pack(posicao, len(rodape), zlib.crc32(rodape), MAGICO))
+    conteudo = b''.join(partes)
+    gravar_atomico(destino, conteudo, durabilidade)
+    return {"linhas": total, "blocos": len(blocos), "bytes": len(conteudo)}
+
+
+class ArquivoColunar:
+    """Leitura de um .col: rodapé na abertura, blocos sob demanda"""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.blocos_lidos = 0
+        self.blocos_pulados = 0
+        with open(caminho, 'rb') as f:
+            try:
+                if CABECALHO.unpack(f.read(CABECALHO.size)) != (MAGICO, VERSAO_ARQUIVO):
+                    raise ArquivoInvalido(f"{caminho}: cabeçalho desconhecido")
+                f.seek(-FINAL.size, os.SEEK_END)
+                posicao, tamanho, crc, magico = FINAL.unpack(f.read(FINAL.size))
+            except (OSError, struct.error):
+                raise ArquivoInvalido(f"{caminho}: arquivo incompleto")
+            if magico != MAGICO:
+                raise ArquivoInvalido(f"{caminho}: arquivo incompleto")
+            f.seek(posicao)
+            rodape = f.read(tamanho)
+        if zlib.crc32(rodape) != crc:
+            raise ArquivoInvalido(f"{caminho}: CRC32 do rodapé não confere")
+        rodape = json.loads(rodape)
+        self.linhas = rodape["linhas"]
+        self.dicionarios = rodape["dicionarios"]
+        self.blocos = rodape["blocos"]  # [posição, tamanho, linhas, mínima, máxima, CRC32]
+        self.descomprimir = CODECS[rodape["codec"]][1]
+
+    def blocos_no_periodo(self, inicio=None, fim=None):
+        """Índices dos blocos que podem ter linhas com data/hora em [inicio, fim)"""
+        selecionados = []
+        for i, (_, _, _, minima, maxima, _) in enumerate(self.blocos):
+            if (inicio is not None and maxima < inicio) or (fim is not None and minima >= fim):
+                self.blocos_pulados += 1
+            else:
+                selecionados.append(i)
+        return selecionados
+
+    def colunas(self, i):
+        """{coluna: array} do bloco i; "t" em segundos (ver formatar) e os campos como ids"""
+        posicao, tamanho, n, _, _, crc = self.blocos[i]
+        with open(self.caminho, 'rb') as f:
+            f.seek(posicao)
+            dados = f.read(tamanho)
+        if zlib.crc32(dados) != crc:
+            raise ArquivoInvalido(f"{self.caminho}: CRC32 do bloco {i} não confere")
+        dados = self.descomprimir(dados)
+        self.blocos_lidos += 1
+        colunas = {}
+        inicio = 0
+        for nome, tipo in COLUNAS:
+            coluna = array(tipo)
+            coluna.frombytes(dados[inicio:inicio + coluna.itemsize * n])
+            if sys.byteorder != 'little':
+                coluna.byteswap()
+            inicio += coluna.itemsize * n
+            colunas[nome] = coluna
+        colunas["t"] = array('q', accumulate(colunas["t"]))
+        return colunas
+
+    def ler(self, inicio=None, fim=None, filtros=None):
+        """Gera (data_hora, nome, área, peça, quantidade, modelo) com data em [inicio, fim) e os filtros"""
+        procurados = {}
+        for campo, valor in (filtros or {}).items():
+            try:
+                procurados[campo] = self.dicionarios[campo].index(valor)
+            except ValueError:
+                return  # Valor que não aparece no arquivo
+        nomes, areas, pecas, modelos = (self.dicionarios[campo] for campo in CAMPOS)
+        for i in self.blocos_no_periodo(inicio, fim):
+            colunas = self.colunas(i)
+            linhas = range(len(colunas["t"]))
+            for campo, valor_id in procurados.items():
+                coluna = colunas[campo]
+                linhas = [j for j in linhas if coluna[j] == valor_id]
+            t, nome, area, peca, quantidade, modelo = (colunas[coluna] for coluna, _ in COLUNAS)
+            for j in linhas:
+                data_hora = formatar(t[j])
+                if (inicio is not None and data_hora < inicio) or (fim is not None and data_hora >= fim):
+                    continue
+                yield data_hora, nomes[nome[j]], areas[area[j]], pecas[peca[j]], quantidade[j], modelos[modelo[j]]
+
+
+def arquivar_rotacionados(caminho_csv, antes_de=None, codec="zlib", durabilidade='completa'):
+    """Troca os CSVs rotacionados (do dia antes_de 'AAAA-MM-DD' para trás) pelo formato colunar
+
+    O período vale pela última linha de cada arquivo, não só pelo dia do nome.
+    Retorna os CSVs arquivados. O arquivo atual nunca é arquivado.
+    """
+    arquivados = []
+    base, extensao = os.path.splitext(caminho_csv)
+    for arquivo in arquivos_historico(caminho_csv):
+        if arquivo == caminho_csv or not arquivo.endswith(extensao):
+            continue
+        dia = arquivo[len(base) + 1:len(base) + 11]  # reposicoes-AAAA-MM-DD-NNN.csv
+        if antes_de is not None and dia >= antes_de:
+            continue
+        try:
+            ultima = ultima_data_hora(arquivo)
+        except OSError as e:
+            print(f"Não foi possível arquivar {arquivo}: {e}")
+            continue
+        if antes_de is not None and ultima is not None and ultima[:10] >= antes_de:
+            continue  # Nome com dia mais antigo que as linhas: o período ainda não fechou
+        destino = caminho_arquivo(arquivo)
+        try:
+            arquivar(arquivo, destino, codec=codec, durabilidade=durabilidade)
+            # Confere tudo antes de apagar o CSV
+            for original, arquivada in zip_longest(ler_csv(arquivo), ArquivoColunar(destino).ler()):
+                if original != arquivada:
+                    raise ArquivoInvalido(f"{destino}: linha diferente do CSV ({original} x {arquivada})")
+        except (ValueError, OSError, ArquivoInvalido) as e:
+            print(f"Não foi possível arquivar {arquivo}: {e}")
+            if os.path.exists(destino):
+                os.remove(destino)
+            continue
+        os.remove(arquivo)
+        if os.path.exists(caminho_indice(arquivo)):
+            os.remove(caminho_indice(arquivo))
+        remover(arquivo)
+        arquivados.append(arquivo)
+    return arquivados
+
+
+def medir_arquivo_colunar(linhas=1_000_000, dias=365):
+    """Tamanho e velocidade de leitura: CSV x arquivo colunar (zlib e lzma)"""
+    import random
+    import tempfile
+    rnd = random.Random(1)
+    operadores = [f"Operador {i}" for i in range(200)]
+    resultados = {"linhas": linhas}
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "reposicoes.csv")
+        momento = segundos("2025-01-01 00:00:00")
+        passo = dias * 86400 / linhas
+        with open(caminho, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["Data/Hora", "Nome", "Área", "Peça", "Quantidade", "Modelo"])
+            for i in range(linhas):
+                area = rnd.randrange(1, 7)
+                writer.writerow([formatar(momento + int(i * passo)), rnd.choice(operadores), f"A{area}",
+                                 f"Peça {area}", rnd.randint(1, 5), rnd.choice(("313", "314"))])
+        resultados["csv_mb"] = round(os.path.getsize(caminho) / 1e6, 1)
+
+        # Consumo por operador: o que um relatório faz com o histórico inteiro
+        inicio = time.perf_counter()
+        por_operador = {}
+        for linha in ler_csv(caminho):
+            por_operador[linha[1]] = por_operador.get(linha[1], 0) + linha[4]
+        resultados["csv_consumo_por_operador_ms"] = round((time.perf_counter() - inicio) * 1000)
+        inicio = time.perf_counter()
+        um_dia = [l for l in ler_csv(caminho) if "2025-06-04" <= l[0] < "2025-06-05"]
+        resultados["csv_um_dia_ms"] = round((time.perf_counter() - inicio) * 1000)
+
+        for codec in ("zlib", "lzma"):
+            destino = os.path.join(pasta, f"reposicoes-{codec}.col")
+            inicio = time.perf_counter()
+            arquivar(caminho, destino, codec=codec, durabilidade='nenhuma')
+            resultados[f"{codec}_arquivar_ms"] = round((time.perf_counter() - inicio) * 1000)
+            resultados[f"{codec}_mb"] = round(os.path.getsize(destino) / 1e6, 2)
+
+            arquivo = ArquivoColunar(destino)
+            inicio = time.perf_counter()
+            soma = [0] * len(arquivo.dicionarios["nome"])
+            for i in range(len(arquivo.blocos)):
+                colunas = arquivo.colunas(i)
+                for nome, quantidade in zip(colunas["nome"], colunas["quantidade"]):
+                    soma[nome] += quantidade
+            resultados[f"{codec}_consumo_por_operador_ms"] = round((time.perf_counter() - inicio) * 1000)
+            assert dict(zip(arquivo.dicionarios["nome"], soma)) == por_operador
+
+            arquivo = ArquivoColunar(destino)
+            inicio = time.perf_counter()
+            assert list(arquivo.ler("2025-06-04", "2025-06-05")) == um_dia
+            resultados[f"{codec}_um_dia_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+            resultados[f"{codec}_um_dia_blocos"] = f"{arquivo.blocos_lidos}/{len(arquivo.blocos)}"
+
+            inicio = time.perf_counter()
+            completo = sum(1 for _ in ArquivoColunar(destino).ler())
+            resultados[f"{codec}_leitura_completa_ms"] = round((time.perf_counter() - inicio) * 1000)
+            assert completo == linhas
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arquivo colunar dos arquivos rotacionados do histórico")
+    parser.add_argument("--csv", default="reposicoes.csv", help="histórico de reposições")
+    parser.add_argument("--dias", type=int, default=30, help="arquiva os arquivos com mais de N dias")
+    parser.add_argument("--codec", choices=CODECS, default="zlib")
+    parser.add_argument("--medir", action="store_true", help="mede tamanho e leitura: CSV x colunar")
+    args = parser.parse_args()
+    if args.medir:
+        print(f"Arquivo colunar: {medir_arquivo_colunar()}")
+    else:
+        antes_de = (date.today() - timedelta(days=args.dias)).isoformat()
+        arquivados = arquivar_rotacionados(args.csv, antes_de, args.codec)
+        print(f"{len(arquivados)} arquivos arquivados: {', '.join(arquivados) or '-'}")
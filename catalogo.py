@@ -0,0 +1,368 @@
+import sys
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections.abc import Mapping, MutableMapping
+
+# ---------------- CATÁLOGO DE MODELOS ----------------
+# Modelos, áreas, peças e estoque vêm de dados (catalogo.json, ver
+# configuracao.py), em qualquer quantidade. Cada modelo guarda as áreas
+# numa lista (área -> posição por dicionário) e, por posição, três arrays:
+# id da peça, quantidade e mínimo. Os nomes de peça ficam uma vez só no
+# catálogo (a mesma peça em vários modelos é o mesmo id) e os nomes de área
+# são internados (sys.intern), então "A1" de mil modelos é uma string só.
+#
+# O modelo em uso é Catalogo.atual: trocar de modelo é guardar uma
+# referência (com várias estações, cada Estacao guarda o seu, ver
+# estacao.py). Para o código que já tratava o estoque como
+# {modelo: {área: {"peca", "quantidade", "minimo"}}}, Catalogo e Modelo são
+# Mappings e cada área é uma visão (Item) que lê e grava direto nos arrays.
+#
+# Áreas no mínimo ou abaixo: cada modelo mantém um índice (área -> déficit,
+# mínimo - quantidade) e a lista delas ordenada do maior déficit para o
+# menor, atualizados a cada alteração de quantidade ou mínimo (busca binária
+# na lista). Alertas custam O(alertas), não O(áreas). Quem se inscreve no
+# catálogo é avisado quando uma área cruza o mínimo numa alteração (não na
+# carga nem na troca de catálogo).
+#
+# Nada aqui tem trava: alterações de mais de uma thread (ou de várias
+# estações) passam pelo ServicoEstoque (servico_estoque.py).
+
+
+class Item(MutableMapping):
+    """Uma área vista como o dict {"peca", "quantidade", "minimo"}"""
+
+    __slots__ = ("modelo", "area")
+    CHAVES = ("peca", "quantidade", "minimo")
+
+    def __init__(self, modelo, area):
+        self.modelo = modelo
+        self.area = area
+
+    def __getitem__(self, chave):
+        modelo = self.modelo
+        i = modelo.slots[self.area]  # Pela área: continua certo se o catálogo mudar as posições
+        if chave == "quantidade":
+            return modelo.quantidades[i]
+        if chave == "minimo":
+            return modelo.minimos[i]
+        if chave == "peca":
+            return modelo.catalogo.pecas[modelo.peca_ids[i]]
+        raise KeyError(chave)
+
+    def __setitem__(self, chave, valor):
+        if chave not in self.CHAVES:
+            raise KeyError(chave)
+        self.modelo.definir(self.area, **{chave: valor})
+
+    def __delitem__(self, chave):
+        raise TypeError("os campos de uma área não podem ser removidos")
+
+    def __iter__(self):
+        return iter(self.CHAVES)
+
+    def __len__(self):
+        return len(self.CHAVES)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class Modelo(Mapping):
+    """Áreas de um modelo com peça, quantidade e mínimo em arrays"""
+
+    def __init__(self, catalogo, nome):
+        self.catalogo = catalogo
+        self.nome = nome
+        self.areas = []  # posição -> área
+        self.slots = {}  # área -> posição
+        self.peca_ids = array('I')
+        self.quantidades = array('q')
+        self.minimos = array('q')
+        self.deficits = {}  # área -> mínimo - quantidade, só das áreas no mínimo ou abaixo
+        self.ordem = []  # [(-déficit, área)] em ordem: a mais abaixo do mínimo primeiro
+
+    def _acrescentar(self, area, peca, quantidade, minimo):
+        area = sys.intern(area)
+        self.slots[area] = len(self.areas)
+        self.areas.append(area)
+        self.peca_ids.append(self.catalogo.internar(peca))
+        self.quantidades.append(quantidade)
+        self.minimos.append(minimo)
+        self._indexar(area, len(self.areas) - 1)
+
+    def _indexar(self, area, i):
+        """Atualiza o índice de mínimos da área; retorna (estava abaixo, está abaixo)"""
+        deficit = self.minimos[i] - self.quantidades[i]
+        antes = self.deficits.get(area)
+        if antes == deficit:
+            return True, True
+        if antes is not None:
+            del self.ordem[bisect_left(self.ordem, (-antes, area))]
+        if deficit >= 0:
+            self.deficits[area] = deficit
+            insort(self.ordem, (-deficit, area))
+        elif antes is not None:
+            del self.deficits[area]
+        return antes is not None, deficit >= 0
+
+    def _remover(self, removidas):
+        """Tira as áreas e recompacta os arrays (só em troca de catálogo)"""
+        manter = [i for i, area in enumerate(self.areas) if area not in removidas]
+        self.areas = [self.areas[i] for i in manter]
+        self.slots = {area: i for i, area in enumerate(self.areas)}
+        self.peca_ids = array('I', (self.peca_ids[i] for i in manter))
+        self.quantidades = array('q', (self.quantidades[i] for i in manter))
+        self.minimos = array('q', (self.minimos[i] for i in manter))
+        for area in removidas & self.deficits.keys():
+            del self.deficits[area]
+        self.ordem = [(deficit, area) for deficit, area in self.ordem if area not in removidas]
+
+    def __getitem__(self, area):
+        if area not in self.slots:
+            raise KeyError(area)
+        return Item(self, area)
+
+    def __contains__(self, area):
+        return area in self.slots
+
+    def __iter__(self):
+        return iter(self.areas)
+
+    def __len__(self):
+        return len(self.areas)
+
+    def peca(self, area):
+        return self.catalogo.pecas[self.peca_ids[self.slots[area]]]
+
+    def quantidade(self, area):
+        return self.quantidades[self.slots[area]]
+
+    def minimo(self, area):
+        return self.minimos[self.slots[area]]
+
+    def definir(self, area, peca=None, quantidade=None, minimo=None):
+        i = self.slots[area]
+        if peca is not None:
+            self.peca_ids[i] = self.catalogo.internar(peca)
+        if quantidade is not None:
+            self.quantidades[i] = quantidade
+        if minimo is not None:
+            self.minimos[i] = minimo
+        if quantidade is not None or minimo is not None:
+            estava, esta = self._indexar(area, i)
+            if estava != esta:
+                self.catalogo._avisar(self.nome, area, esta)
+
+    def esta_abaixo(self, area):
+        """True se a quantidade da área estiver no mínimo ou abaixo"""
+        return area in self.deficits
+
+    def abaixo_do_minimo(self):
+        """Áreas no mínimo ou abaixo, da mais abaixo do mínimo para a menos"""
+        return [area for _, area in self.ordem]
+
+    def pecas(self):
+        """{área: peça}"""
+        nomes = self.catalogo.pecas
+        return {area: nomes[peca_id] for area, peca_id in zip(self.areas, self.peca_ids)}
+
+
+class Catalogo(Mapping):
+    """Todos os modelos (modelo -> Modelo), com as peças internadas e o modelo em uso"""
+
+    def __init__(self):
+        self.pecas = []  # id -> nome da peça (só cresce)
+        self.ids_pecas = {}  # nome da peça -> id
+        self.modelos = {}
+        self.atual = None  # Modelo selecionado
+        self.inscritos = []  # ao_cruzar(modelo, área, abaixo) quando uma área cruza o mínimo
+
+    @classmethod
+    def de_dicionario(cls, estoques):
+        """Catálogo a partir de {modelo: {área: {"peca", "quantidade", "minimo"}}}"""
+        catalogo = cls()
+        for modelo, areas in estoques.items():
+            catalogo.adicionar_modelo(modelo, ((area, item["peca"], item["quantidade"], item["minimo"])
+                                               for area, item in areas.items()))
+        return catalogo
+
+    def internar(self, peca):
+        peca_id = self.ids_pecas.get(peca)
+        if peca_id is None:
+            peca_id = self.ids_pecas[peca] = len(self.pecas)
+            self.pecas.append(peca)
+        return peca_id
+
+    def adicionar_modelo(self, nome, areas):
+        """Cria (ou recria) o modelo com areas = [(área, peça, quantidade, mínimo)]"""
+        modelo = Modelo(self, nome)
+        for area, peca, quantidade, minimo in areas:
+            modelo._acrescentar(area, peca, quantidade, minimo)
+        self.modelos[nome] = modelo
+        return modelo
+
+    def selecionar(self, modelo):
+        """Torna o modelo (ou None) o modelo em uso; retorna o Modelo"""
+        self.atual = None if modelo is None else self.modelos[modelo]
+        return self.atual
+
+    @property
+    def modelo_atual(self):
+        return None if self.atual is None else self.atual.nome
+
+    def inscrever(self, ao_cruzar):
+        self.inscritos.append(ao_cruzar)
+
+    def cancelar_inscricao(self, ao_cruzar):
+        if ao_cruzar in self.inscritos:
+            self.inscritos.remove(ao_cruzar)
+
+    def _avisar(self, modelo, area, abaixo):
+        for ao_cruzar in list(self.inscritos):
+            try:
+                ao_cruzar(modelo, area, abaixo)
+            except Exception as e:
+                print(f"Erro ao avisar mínimo de {modelo}/{area}: {e}")
+
+    def aplicar(self, catalogo):
+        """Aplica um catálogo lido (ver configuracao.ler_catalogo); retorna os modelos alterados
+
+        Áreas novas entram com os valores iniciais; áreas removidas saem do
+        modelo; peças renomeadas são atualizadas sem mexer na quantidade. Se
+        o modelo em uso sair do catálogo, nenhum fica selecionado.
+        """
+        alterados = set()
+        for nome in list(self.modelos):
+            if nome not in catalogo:
+                del self.modelos[nome]
+                alterados.add(nome)
+        if self.atual is not None and self.atual.nome not in self.modelos:
+            self.atual = None
+        for nome, areas in catalogo.items():
+            modelo = self.modelos.get(nome)
+            if modelo is None:
+                self.adicionar_modelo(nome, ((area, item["peca"], item["quantidade"], item["minimo"])
+                                             for area, item in areas.items()))
+                alterados.add(nome)
+                continue
+            if {area: item["peca"] for area, item in areas.items()} != modelo.pecas():
+                alterados.add(nome)
+            removidas = {area for area in modelo.areas if area not in areas}
+            if removidas:
+                modelo._remover(removidas)
+            for area, item in areas.items():
+                if area in modelo:
+                    modelo.definir(area, peca=item["peca"])
+                else:
+                    modelo._acrescentar(area, item["peca"], item["quantidade"], item["minimo"])
+        return alterados
+
+    def para_dicionario(self):
+        """{modelo: {área: {"peca", "quantidade", "minimo"}}} com dicts de verdade (JSON, cópias)"""
+        return {nome: {area: dict(item) for area, item in modelo.items()} for nome, modelo in self.modelos.items()}
+
+    def __getitem__(self, modelo):
+        return self.modelos[modelo]
+
+    def __contains__(self, modelo):
+        return modelo in self.modelos
+
+    def __iter__(self):
+        return iter(self.modelos)
+
+    def __len__(self):
+        return len(self.modelos)
+
+
+def medir_catalogo(tamanhos=((10, 10), (100, 100), (1000, 1000)), consultas=200_000):
+    """Memória e consultas: dicts aninhados (como antes) x catálogo em arrays"""
+    import random
+    import tracemalloc
+    resultados = {}
+    for modelos, areas in tamanhos:
+        rnd = random.Random(1)
+        nome = f"{modelos}x{areas}"
+        # Como vindo de um JSON: strings novas em cada modelo, 300 peças diferentes
+        tracemalloc.start()
+        estoques = {f"M{m}": {f"A{a}": {"peca": f"Peça {(a * 7 + m) % 300}", "quantidade": 100, "minimo": 10}
+                              for a in range(areas)} for m in range(modelos)}
+        resultados[f"{nome}_dicts_kb"] = round(tracemalloc.get_traced_memory()[0] / 1e3)
+        tracemalloc.stop()
+
+        def carregar():
+            catalogo = Catalogo()
+            for m in range(modelos):
+                catalogo.adicionar_modelo(f"M{m}", ((f"A{a}", f"Peça {(a * 7 + m) % 300}", 100, 10)
+                                                    for a in range(areas)))
+            return catalogo
+
+        # Memória e tempo em passadas separadas (o tracemalloc deixa a carga bem mais lenta)
+        tracemalloc.start()
+        catalogo = carregar()
+        resultados[f"{nome}_catalogo_kb"] = round(tracemalloc.get_traced_memory()[0] / 1e3)
+        tracemalloc.stop()
+        del catalogo
+        inicio = time.perf_counter()
+        catalogo = carregar()
+        resultados[f"{nome}_carga_catalogo_ms"] = round((time.perf_counter() - inicio) * 1000)
+
+        pares = [(f"M{rnd.randrange(modelos)}", f"A{rnd.randrange(areas)}") for _ in range(consultas)]
+        inicio = time.perf_counter()
+        soma_dicts = sum(estoques[m][a]["quantidade"] for m, a in pares)
+        resultados[f"{nome}_consulta_dicts_ns"] = round((time.perf_counter() - inicio) / consultas * 1e9)
+        inicio = time.perf_counter()
+        soma = sum(catalogo[m].quantidade(a) for m, a in pares)
+        resultados[f"{nome}_consulta_catalogo_ns"] = round((time.perf_counter() - inicio) / consultas * 1e9)
+        inicio = time.perf_counter()
+        soma_visao = sum(catalogo[m][a]["quantidade"] for m, a in pares)
+        resultados[f"{nome}_consulta_visao_dict_ns"] = round((time.perf_counter() - inicio) / consultas * 1e9)
+        assert soma == soma_dicts == soma_visao
+
+        inicio = time.perf_counter()
+        for m, _ in pares:
+            catalogo.selecionar(m)
+        resultados[f"{nome}_troca_de_modelo_ns"] = round((time.perf_counter() - inicio) / consultas * 1e9)
+        del estoques, catalogo
+    return resultados
+
+
+def medir_alertas(tamanhos=(1_000, 100_000), fracao_abaixo=0.01, alteracoes=100_000):
+    """Alertas de mínimo: varrer todas as áreas (como antes) x índice mantido a cada alteração"""
+    import random
+    rnd = random.Random(1)
+    resultados = {}
+    for areas in tamanhos:
+        catalogo = Catalogo()
+        abaixo = int(areas * fracao_abaixo)
+        modelo = catalogo.adicionar_modelo("M", ((f"A{a}", f"Peça {a % 300}", 5 if a < abaixo else 100, 10)
+                                                 for a in range(areas)))
+        avisos = []
+        catalogo.inscrever(lambda m, a, b: avisos.append((a, b)))
+
+        inicio = time.perf_counter()
+        varredura = [area for area, dados in modelo.items() if dados["quantidade"] <= dados["minimo"]]
+        resultados[f"{areas}_varredura_us"] = round((time.perf_counter() - inicio) * 1e6)
+        inicio = time.perf_counter()
+        indice = modelo.abaixo_do_minimo()
+        resultados[f"{areas}_indice_us"] = round((time.perf_counter() - inicio) * 1e6, 1)
+        assert sorted(indice) == sorted(varredura)
+
+        # Consumo e reposição aleatórios: parte das alterações cruza o mínimo
+        nomes = [f"A{a}" for a in range(areas)]
+        inicio = time.perf_counter()
+        for _ in range(alteracoes):
+            area = rnd.choice(nomes)
+            modelo.definir(area, quantidade=max(0, modelo.quantidade(area) + rnd.choice((-3, -1, 2))))
+        resultados[f"{areas}_alteracao_ns"] = round((time.perf_counter() - inicio) / alteracoes * 1e9)
+        resultados[f"{areas}_avisos"] = len(avisos)
+        assert sorted(modelo.abaixo_do_minimo()) == sorted(
+            area for area, dados in modelo.items() if dados["quantidade"] <= dados["minimo"])
+        deficits = [modelo.deficits[area] for area in modelo.abaixo_do_minimo()]
+        assert deficits == sorted(deficits, reverse=True)
+    return resultados
+
+
+if __name__ == "__main__":
+    print(f"Catálogo: {medir_catalogo()}")
+    print(f"Alertas de mínimo: {medir_alertas()}")
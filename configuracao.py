@@ -0,0 +1,153 @@
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import sys
+import threading
+import time
+
+# ---------------- CONFIGURAÇÃO RECARREGÁVEL ----------------
+# Crachás e catálogo (modelos, áreas, peças e estoque inicial) ficam em
+# arquivos observados. Quando um deles muda, o arquivo é lido e validado
+# na thread do observador; só o resultado pronto é entregue ao Tk, que o
+# aplica de uma vez entre duas leituras. Um arquivo inválido é ignorado e
+# a configuração anterior continua valendo.
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+
+class ObservadorArquivos(threading.Thread):
+    """Chama ao_mudar(caminho) quando um arquivo observado é alterado"""
+
+    def __init__(self, intervalo_poll=1.0, espera=0.1):
+        super().__init__(daemon=True, name="observador-config")
+        self.intervalo_poll = intervalo_poll  # Usado quando não há inotify
+        self.espera = espera  # Junta rajadas de eventos de um mesmo salvamento
+        self.callbacks = {}  # caminho absoluto -> ao_mudar
+        self.assinaturas = {}
+        self.running = True
+        self.fd_cancelar, self.fd_aviso_cancelar = os.pipe()
+        self.libc = self._carregar_inotify()
+
+    def _carregar_inotify(self):
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            libc.inotify_init1
+            return libc
+        except (OSError, AttributeError):
+            return None
+
+    def observar(self, caminho, ao_mudar):
+        caminho = os.path.abspath(caminho)
+        self.callbacks[caminho] = ao_mudar
+        self.assinaturas[caminho] = self._assinatura(caminho)
+
+    def _assinatura(self, caminho):
+        try:
+            st = os.stat(caminho)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def run(self):
+        fd = self.libc.inotify_init1(os.O_CLOEXEC) if self.libc else -1
+        if fd < 0:
+            print("inotify indisponível, observando configuração por mtime")
+            self._rodar_poll()
+            return
+        try:
+            mascara = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+            for pasta in {os.path.dirname(c) for c in self.callbacks}:
+                self.libc.inotify_add_watch(fd, pasta.encode(), mascara)
+            self._rodar_inotify(fd)
+        finally:
+            os.close(fd)
+
+    def _rodar_inotify(self, fd):
+        while self.running:
+            prontos, _, _ = select.select([fd, self.fd_cancelar], [], [])
+            if self.fd_cancelar in prontos:
+                return
+            # Espera o editor terminar de gravar e descarta os eventos acumulados;
+            # quem decide o que mudou são as assinaturas (mtime, tamanho), o que
+            # ignora os outros arquivos da pasta e cobre um estouro da fila
+            time.sleep(self.espera)
+            while select.select([fd], [], [], 0)[0]:
+                os.read(fd, 65536)
+            self._verificar()
+
+    def _rodar_poll(self):
+        while self.running:
+            prontos, _, _ = select.select([self.fd_cancelar], [], [], self.intervalo_poll)
+            if prontos:
+                return
+            self._verificar()
+
+    def _verificar(self):
+        for caminho, ao_mudar in list(self.callbacks.items()):
+            assinatura = self._assinatura(caminho)
+            if assinatura is None or assinatura == self.assinaturas.get(caminho):
+                continue
+            self.assinaturas[caminho] = assinatura
+            try:
+                ao_mudar(caminho)
+            except Exception as e:
+                print(f"Erro ao recarregar {caminho}: {e}")
+
+    def parar(self):
+        self.running = False
+        os.write(self.fd_aviso_cancelar, b'x')
+
+
+# ---------------- CATÁLOGO ----------------
+# catalogo.json:
+# {"modelos": {"313": {"A1": {"peca": "Eixos", "quantidade": 100, "minimo": 20}, ...}, ...}}
+# "quantidade" e "minimo" são os valores iniciais de uma área nova; depois
+# disso valem os do estoque salvo (e o mínimo definido no painel). O
+# catálogo lido é aplicado por Catalogo.aplicar (catalogo.py).
+
+def salvar_catalogo(caminho, estoques):
+    """Grava o catálogo a partir dos estoques iniciais ({modelo: {área: dados}})"""
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump({"modelos": estoques}, f, ensure_ascii=False, indent=2)
+
+
+def ler_catalogo(caminho):
+    """Lê e valida o catálogo; retorna {modelo: {área: {"peca", "quantidade", "minimo"}}}"""
+    with open(caminho, 'r', encoding='utf-8') as f:
+        dados = json.load(f)
+    modelos = dados.get("modelos") if isinstance(dados, dict) else None
+    if not isinstance(modelos, dict) or not modelos:
+        raise ValueError("catálogo sem modelos")
+    catalogo = {}
+    for modelo, areas in modelos.items():
+        if not isinstance(areas, dict) or not areas:
+            raise ValueError(f"modelo {modelo} sem áreas")
+        catalogo[str(modelo)] = {}
+        for area, item in areas.items():
+            peca = item.get("peca") if isinstance(item, dict) else item
+            if not isinstance(peca, str) or not peca:
+                raise ValueError(f"área {area} do modelo {modelo} sem peça")
+            item = item if isinstance(item, dict) else {}
+            catalogo[str(modelo)][area] = {
+                "peca": peca,
+                "quantidade": _inteiro(item.get("quantidade", 0), f"quantidade da área {area} do modelo {modelo}"),
+                "minimo": _inteiro(item.get("minimo", 0), f"mínimo da área {area} do modelo {modelo}"),
+            }
+    return catalogo
+
+
+def _inteiro(valor, descricao):
+    """int(valor), com ValueError também para null, listas, objetos e true/false"""
+    if isinstance(valor, bool):
+        raise ValueError(f"{descricao}: valor inválido ({valor!r})")
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"{descricao}: valor inválido ({valor!r})") from None
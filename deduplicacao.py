@@ -0,0 +1,88 @@
+import time
+from collections import OrderedDict
+
+# ---------------- FILTRO DE LEITURAS DUPLICADAS ----------------
+# Cada (leitor, tag) aceito fica no mapa até vencer o TTL. Como todas as
+# entradas têm o mesmo TTL, a ordem de inserção do OrderedDict já é a ordem
+# de vencimento: a limpeza só olha o início do mapa, o que mantém o custo
+# O(1) amortizado por leitura mesmo com milhares de tags em circulação.
+
+
+class FiltroDuplicatas:
+    """Descarta leituras repetidas do mesmo cartão dentro de uma janela (TTL)"""
+
+    def __init__(self, ttl=3.0, capacidade=10000, por_leitor=True, relogio=time.monotonic):
+        self.ttl = ttl
+        self.capacidade = capacidade
+        self.por_leitor = por_leitor  # Mesmo cartão em leitores diferentes não é duplicata
+        self.relogio = relogio
+        self.vistos = OrderedDict()  # (leitor, tag) -> instante em que vence
+        self.aceitas = 0
+        self.suprimidas = 0
+        self.expiradas = 0
+        self.despejadas = 0  # Removidas por falta de espaço antes de vencer
+
+    def aceitar(self, tag, leitor_id=None):
+        """Retorna True se a leitura deve ser processada, False se for duplicata"""
+        agora = self.relogio()
+        self._expirar(agora)
+        chave = (leitor_id if self.por_leitor else None, tag)
+        vence = self.vistos.get(chave)
+        if vence is not None and agora < vence:
+            self.suprimidas += 1
+            return False
+        self.vistos[chave] = agora + self.ttl
+        self.vistos.move_to_end(chave)
+        if len(self.vistos) > self.capacidade:
+            self.vistos.popitem(last=False)
+            self.despejadas += 1
+        self.aceitas += 1
+        return True
+
+    def _expirar(self, agora):
+        """Remove do início do mapa as entradas já vencidas"""
+        vistos = self.vistos
+        while vistos:
+            chave, vence = next(iter(vistos.items()))
+            if vence > agora:
+                break
+            del vistos[chave]
+            self.expiradas += 1
+
+    def limpar(self, leitor_id=None):
+        """Esquece as leituras de um leitor, ou de todos (ex.: ao voltar para a tela inicial)"""
+        if leitor_id is None or not self.por_leitor:
+            self.vistos.clear()
+            return
+        for chave in [chave for chave in self.vistos if chave[0] == leitor_id]:
+            del self.vistos[chave]
+
+    def estatisticas(self):
+        return {
+            "aceitas": self.aceitas,
+            "suprimidas": self.suprimidas,
+            "expiradas": self.expiradas,
+            "despejadas": self.despejadas,
+            "em_memoria": len(self.vistos),
+        }
+
+
+def medir_filtro(leituras=1000000, tags_distintas=5000):
+    """Mede o custo por leitura com milhares de tags distintas em circulação"""
+    import random
+    rnd = random.Random(1)
+    tags = [f"{rnd.getrandbits(32):08X}" for _ in range(tags_distintas)]
+    relogio = [0.0]
+    filtro = FiltroDuplicatas(ttl=3.0, relogio=lambda: relogio[0])
+    sequencia = [rnd.choice(tags) for _ in range(leituras)]
+    inicio = time.perf_counter()
+    for tag in sequencia:
+        relogio[0] += 0.0005  # 2000 leituras/s
+        filtro.aceitar(tag, "estacao1")
+    duracao = time.perf_counter() - inicio
+    return duracao / leituras * 1e6, filtro.estatisticas()
+
+
+if __name__ == "__main__":
+    custo_us, estatisticas = medir_filtro()
+    print(f"Custo por leitura: {custo_us:.2f} µs | {estatisticas}")
@@ -0,0 +1,343 @@
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+from snapshot import SnapshotInvalido, Snapshots, serializar
+
+# ---------------- DIÁRIO DE ESTOQUE ----------------
+# Cada alteração de estoque vira uma linha curta acrescentada ao diário, em
+# vez de regravar o JSON inteiro de todos os modelos. De tempos em tempos o
+# diário é compactado: o diário atual é renomeado (estoque.diario.<seq>),
+# um diário vazio é aberto e, numa thread separada, os modelos alterados
+# ganham um snapshot novo (geração nova de estoque_temp_<modelo>.json, ver
+# snapshot.py) com o seq do último registro incluído. Só depois disso o
+# diário renomeado é apagado.
+#
+# Carregar = snapshot de cada modelo + registros com seq maior que o dele.
+# Registro: {"s": seq, "m": modelo, "a": área, "q": quantidade, "min": mínimo}
+# "q" e "min" são valores absolutos, então reaplicar um registro é seguro.
+#
+# Só se grava o que mudou: alterações que não mudam nada não entram no
+# diário, cada compactação grava só os modelos com áreas sujas e
+# compactar(modelos=...) grava o snapshot de alguns modelos sem rotacionar o
+# diário (os registros deles ficam cobertos pelo seq do snapshot). Quando
+# não sobra modelo sujo, o diário é rotacionado e apagado.
+
+
+class DiarioEstoque:
+    """Diário de alterações de estoque com compactação periódica em snapshots"""
+
+    def __init__(self, estoques, caminho='estoque.diario',
+                 padrao_snapshot='estoque_temp_{modelo}.json',
+                 limite_registros=1000, intervalo_compactacao=300.0,
+                 durabilidade='completa', geracoes=3):
+        self.estoques = estoques  # {modelo: {área: dados}}, alterado no lugar
+        self.caminho = caminho
+        self.padrao_snapshot = padrao_snapshot
+        self.durabilidade = durabilidade  # Ver snapshot.DURABILIDADES
+        self.geracoes = geracoes  # Gerações de snapshot mantidas por modelo
+        self.snapshots = {}  # modelo -> Snapshots
+        self.limite_registros = limite_registros  # Compacta ao chegar neste número de registros
+        self.intervalo_compactacao = intervalo_compactacao  # ... ou depois deste tempo (s)
+        self.seq = 0
+        self.registros = 0  # Registros desde a última compactação
+        self.ultima_compactacao = time.monotonic()
+        self.sujos = {}  # modelo -> áreas alteradas que ainda não estão no snapshot
+        self.pendentes = Counter()  # modelo -> registros que ainda não estão no snapshot
+        self.falhas = set()  # Modelos cujo snapshot não pôde ser gravado
+        self.lock = threading.Lock()
+        self.arquivo = None
+        self.trabalhos = queue.Queue()
+        self.ocioso = threading.Event()
+        self.ocioso.set()
+        self.compactacoes = 0
+        self.snapshots_gravados = 0
+        self.registros_invalidos = 0
+        self.snapshots_perdidos = []  # Modelos sem nenhuma geração de snapshot legível
+        # Gravações evitadas
+        self.alteracoes_sem_efeito = 0  # registrar() com os valores que já estavam
+        self.registros_coalescidos = 0  # Registros que entraram num snapshot junto com outros
+        self.snapshots_evitados = 0  # Modelos sem alteração que não foram regravados
+        threading.Thread(target=self._rodar, daemon=True, name="compactacao-estoque").start()
+
+    # ---- carga ----
+
+    def carregar(self):
+        """Lê os snapshots e reaplica o diário; retorna quantos registros foram reaplicados"""
+        seqs = {}
+        for modelo, estoque in self.estoques.items():
+            try:
+                seqs[modelo] = self._ler_snapshot(modelo, estoque)
+            except SnapshotInvalido as e:
+                # As gerações ruins ficaram como .corrompido; o modelo segue com
+                # o estoque inicial mais o que ainda estiver no diário
+                print(f"Snapshot do modelo {modelo} perdido: {e}")
+                self.snapshots_perdidos.append(modelo)
+                seqs[modelo] = 0
+        self.seq = max(seqs.values(), default=0)
+        diarios = self._diarios_rotacionados() + [self.caminho]
+        reaplicados = 0
+        for caminho in diarios:
+            for registro in self._ler_registros(caminho):
+                self.seq = max(self.seq, registro["s"])
+                modelo = registro["m"]
+                if modelo not in seqs or registro["s"] <= seqs[modelo]:
+                    continue
+                dados = self.estoques[modelo].get(registro["a"])
+                if dados is None:
+                    continue  # Área que saiu do catálogo
+                if "q" in registro:
+                    dados["quantidade"] = int(registro["q"])
+                if "min" in registro:
+                    dados["minimo"] = int(registro["min"])
+                self.sujos.setdefault(modelo, set()).add(registro["a"])
+                reaplicados += 1
+        if self.sujos:
+            # Incorpora o que foi reaplicado antes de aceitar registros novos
+            self._gravar_snapshots(self._serializar(self.sujos))
+            self.sujos.clear()
+        for caminho in diarios:
+            if os.path.exists(caminho):
+                os.remove(caminho)
+        self._abrir()
+        return reaplicados
+
+    def _snapshots(self, modelo):
+        if modelo not in self.snapshots:
+            self.snapshots[modelo] = Snapshots(self.padrao_snapshot.format(modelo=modelo),
+                                               self.geracoes, self.durabilidade)
+        return self.snapshots[modelo]
+
+    def _ler_snapshot(self, modelo, estoque):
+        """Aplica o snapshot do modelo no estoque; retorna o seq que ele cobre
+
+        Levanta snapshot.SnapshotInvalido se nenhuma geração puder ser lida.
+        """
+        dados = self._snapshots(modelo).carregar()
+        if dados is None:
+            return 0
+        if isinstance(dados.get("estoque"), dict) and "seq" in dados:
+            seq, salvo = int(dados["seq"]), dados["estoque"]
+        else:
+            seq, salvo = 0, dados  # Formato antigo: só o dicionário do estoque
+        # Só as áreas do catálogo; a peça vem do catálogo e os valores do arquivo
+        for area, valores in salvo.items():
+            if area in estoque and isinstance(valores, dict):
+                estoque[area]["quantidade"] = int(valores.get("quantidade", 0))
+                estoque[area]["minimo"] = int(valores.get("minimo", 0))
+        return seq
+
+    def _ler_registros(self, caminho):
+        if not os.path.exists(caminho):
+            return
+        with open(caminho, 'r', encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    registro = json.loads(linha)
+                    registro["s"], registro["m"], registro["a"]
+                except (ValueError, TypeError, KeyError):
+                    # Normalmente a última linha, cortada por uma queda de energia
+                    self.registros_invalidos += 1
+                    continue
+                yield registro
+
+    def _diarios_rotacionados(self):
+        prefixo = self.caminho + '.'
+        caminhos = [c for c in glob.glob(glob.escape(self.caminho) + '.*')
+                    if c[len(prefixo):].isdigit()]
+        return sorted(caminhos, key=lambda c: int(c[len(prefixo):]))
+
+    def _abrir(self):
+        self.arquivo = open(self.caminho, 'a', encoding='utf-8')
+
+    # ---- escrita ----
+
+    def registrar(self, modelo, area, quantidade=None, minimo=None):
+        """Aplica a alteração nos estoques do diário e a acrescenta ao arquivo
+
+        Retorna False (e não grava nada) se os valores já eram esses.
+        """
+        dados = self.estoques.setdefault(modelo, {}).setdefault(
+            area, {"peca": "", "quantidade": 0, "minimo": 0})
+        if ((quantidade is None or dados["quantidade"] == quantidade)
+                and (minimo is None or dados["minimo"] == minimo)):
+            self.alteracoes_sem_efeito += 1
+            return False
+        if quantidade is not None:
+            dados["quantidade"] = quantidade
+        if minimo is not None:
+            dados["minimo"] = minimo
+        self.seq += 1
+        registro = {"s": self.seq, "m": modelo, "a": area}
+        if quantidade is not None:
+            registro["q"] = quantidade
+        if minimo is not None:
+            registro["min"] = minimo
+        self.arquivo.write(json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.arquivo.flush()
+        self.sujos.setdefault(modelo, set()).add(area)
+        self.pendentes[modelo] += 1
+        self.registros += 1
+        if (self.registros >= self.limite_registros
+                or time.monotonic() - self.ultima_compactacao >= self.intervalo_compactacao):
+            self.compactar()
+        return True
+
+    def compactar(self, todos=False, esperar=False, modelos=None):
+        """Grava snapshots dos modelos alterados (ou de todos) e recomeça o diário
+
+        modelos limita a gravação a esses modelos (se estiverem sujos); o
+        diário só é rotacionado quando nenhum modelo fica sujo.
+        Roda na mesma thread que chama registrar(): a cópia dos estoques é
+        feita aqui, a gravação dos arquivos fica com a thread de compactação.
+        Retorna False se uma compactação anterior ainda estiver em andamento.
+        """
+        if not self.ocioso.is_set():
+            if not esperar:
+                return False
+            self.ocioso.wait()
+        with self.lock:
+            for modelo in self.falhas:
+                self.sujos.setdefault(modelo, set())
+            self.falhas.clear()
+        if todos:
+            alvo = set(self.estoques)
+        else:
+            alvo = set(self.sujos) if modelos is None else set(self.sujos) & set(modelos)
+            alvo &= set(self.estoques)
+        for modelo in list(self.sujos):
+            if modelo in alvo or modelo not in self.estoques:
+                del self.sujos[modelo]  # Modelos que saíram do catálogo não têm o que gravar
+        rotacionar = not self.sujos and self.registros > 0
+        if not alvo and not rotacionar:
+            return True
+        self.snapshots_evitados += len(set(self.estoques) - alvo)
+        self.registros_coalescidos += sum(max(self.pendentes.pop(m, 0) - 1, 0) for m in alvo)
+        snapshots = self._serializar(alvo)
+        rotacionado = None
+        if rotacionar:
+            self.arquivo.close()
+            rotacionado = f"{self.caminho}.{self.seq}"
+            os.replace(self.caminho, rotacionado)
+            self._abrir()
+            self.pendentes.clear()
+            self.registros = 0
+            self.ultima_compactacao = time.monotonic()
+            self.compactacoes += 1
+        self.ocioso.clear()
+        self.trabalhos.put((snapshots, rotacionado))
+        if esperar:
+            self.ocioso.wait()
+        return True
+
+    def substituir(self, estoques):
+        """Troca o conteúdo dos estoques (ex.: catálogo novo); marca só as áreas que mudaram"""
+        for modelo, estoque in estoques.items():
+            atual = self.estoques.get(modelo, {})
+            areas = {area for area, dados in estoque.items() if atual.get(area) != dados}
+            areas |= set(atual) - set(estoque)
+            if areas:
+                self.sujos.setdefault(modelo, set()).update(areas)
+        self.estoques.clear()
+        self.estoques.update(estoques)
+
+    def _serializar(self, modelos):
+        return {modelo: serializar({"seq": self.seq, "estoque": self.estoques[modelo]})
+                for modelo in modelos}
+
+    def _gravar_snapshots(self, snapshots):
+        for modelo, corpo in snapshots.items():
+            self._snapshots(modelo).gravar(corpo)
+            self.snapshots_gravados += 1
+
+    def _rodar(self):
+        while True:
+            snapshots, rotacionado = self.trabalhos.get()
+            try:
+                self._gravar_snapshots(snapshots)
+                if rotacionado is not None:
+                    os.remove(rotacionado)
+            except OSError as e:
+                # O diário rotacionado fica no disco e é reaplicado na próxima carga
+                print(f"Erro ao salvar estoque: {e}")
+                with self.lock:
+                    self.falhas.update(snapshots)
+            finally:
+                self.ocioso.set()
+
+    def fechar(self):
+        """Compacta o que estiver pendente e fecha o diário"""
+        if self.arquivo is None:
+            return
+        self.compactar(esperar=True)
+        self.arquivo.close()
+        self.arquivo = None
+
+    def estatisticas(self):
+        return {
+            "seq": self.seq,
+            "registros_pendentes": self.registros,
+            "compactacoes": self.compactacoes,
+            "snapshots_gravados": self.snapshots_gravados,
+            "registros_invalidos": self.registros_invalidos,
+            "snapshots_perdidos": len(self.snapshots_perdidos),
+            "areas_sujas": sum(len(areas) for areas in self.sujos.values()),
+            "alteracoes_sem_efeito": self.alteracoes_sem_efeito,
+            "registros_coalescidos": self.registros_coalescidos,
+            "snapshots_evitados": self.snapshots_evitados,
+        }
+
+
+def medir_diario(tamanhos=(6, 100, 1000, 10000), mutacoes=2000, modelos=2):
+    """Compara alterações/s: regravar o JSON de todos os modelos x diário com compactação"""
+    import random
+    import tempfile
+    rnd = random.Random(1)
+    resultados = []
+    for n_areas in tamanhos:
+        with tempfile.TemporaryDirectory() as pasta:
+            estoques = {str(313 + m): {f"A{i}": {"peca": f"Peça {i}", "quantidade": 1000, "minimo": 10}
+                                       for i in range(n_areas)}
+                        for m in range(modelos)}
+            alteracoes = [(rnd.choice(list(estoques)), f"A{rnd.randrange(n_areas)}")
+                          for _ in range(mutacoes)]
+
+            # Antes: cada alteração regrava todos os modelos por inteiro
+            n_antes = min(mutacoes, 200)
+            inicio = time.perf_counter()
+            for modelo, area in alteracoes[:n_antes]:
+                estoques[modelo][area]["quantidade"] -= 1
+                for m, estoque in estoques.items():
+                    temp_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json', dir=pasta)
+                    json.dump(estoque, temp_file)
+                    temp_file.close()
+                    os.replace(temp_file.name, os.path.join(pasta, f'estoque_temp_{m}.json'))
+            antes = n_antes / (time.perf_counter() - inicio)
+
+            diario = DiarioEstoque(estoques, os.path.join(pasta, 'estoque.diario'),
+                                   os.path.join(pasta, 'estoque_temp_{modelo}.json'))
+            diario.carregar()
+            inicio = time.perf_counter()
+            for modelo, area in alteracoes:
+                # estoques é o próprio dicionário do diário: registrar() faz a baixa
+                diario.registrar(modelo, area, quantidade=estoques[modelo][area]["quantidade"] - 1)
+            depois = mutacoes / (time.perf_counter() - inicio)
+            diario.fechar()
+
+            # A carga (snapshot + diário) tem que reproduzir o estoque em memória
+            copia = {m: {a: dict(d, quantidade=0) for a, d in e.items()} for m, e in estoques.items()}
+            DiarioEstoque(copia, os.path.join(pasta, 'estoque.diario'),
+                          os.path.join(pasta, 'estoque_temp_{modelo}.json')).carregar()
+            assert copia == estoques
+            resultados.append({"areas_por_modelo": n_areas, "regravar_json_s": round(antes),
+                               "diario_s": round(depois), "compactacoes": diario.compactacoes})
+    return resultados
+
+
+if __name__ == "__main__":
+    for resultado in medir_diario():
+        print(f"Alterações de estoque: {resultado}")
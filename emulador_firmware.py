@@ -0,0 +1,150 @@
+import bisect
+import queue
+import struct
+import time
+
+from lista_autorizados import (
+    CAPACIDADE_LISTA, STATUS_OK, STATUS_CAPACIDADE, STATUS_CHECKSUM, STATUS_SEQUENCIA,
+    hash_tag, empacotar, sincronizar_lista,
+)
+from protocolo import (
+    CodificadorFirmware, ParserQuadros, crc16,
+    TIPO_ACK, TIPO_RESP_VERSAO,
+    TIPO_CMD_VERSAO, TIPO_CMD_LISTA_INICIO, TIPO_CMD_LISTA_BLOCO, TIPO_CMD_LISTA_FIM,
+)
+from leitor_serial import LeitorSerial
+from transportes import TransporteMemoria
+
+# ---------------- EMULADOR DO FIRMWARE ----------------
+# Reproduz o arduino.ino no host: envia os mesmos quadros, responde aos
+# comandos da lista de autorizados com a mesma lógica de dois bancos da
+# EEPROM e registra o bip que o leitor tocaria. Permite testar o protocolo
+# de sincronização e sua vazão no Linux, sem placa.
+
+LISTA_DE_FABRICA = ["3A163602", "AD88C801"]  # authorizedTags[] do firmware
+
+
+class EmuladorFirmware(TransporteMemoria):
+    """Leitor emulado, visto pelo host como uma porta serial"""
+
+    def __init__(self, protocolo='binario'):
+        super().__init__()
+        self.codificador = CodificadorFirmware(protocolo)
+        self.parser_comandos = ParserQuadros()
+        # EEPROM: dois bancos (versão, hashes) e o índice do banco ativo
+        self.bancos = [(0, []), (0, [])]
+        self.banco_ativo = None  # None = EEPROM sem lista válida
+        self.transferencia = None
+        self.bipes = []  # 'autorizado' / 'negado', na ordem das leituras
+        self.bytes_recebidos = 0
+        self.bytes_enviados = 0
+        self.injetar(self.codificador.iniciado())
+
+    def injetar(self, dados):
+        self.bytes_enviados += len(dados)
+        super().injetar(dados)
+
+    def apresentar_cartao(self, tag):
+        """Simula a aproximação de um cartão: envia o UID e decide o bip localmente"""
+        self.injetar(self.codificador.cartao(tag))
+        self.bipes.append('autorizado' if self.autorizado(tag) else 'negado')
+
+    def injetar_ruido(self, dados):
+        """Coloca bytes arbitrários na linha (ruído, reset do Arduino etc.)"""
+        self.injetar(dados)
+
+    def autorizado(self, tag):
+        if self.banco_ativo is None:
+            return tag.upper() in LISTA_DE_FABRICA
+        hashes = self.bancos[self.banco_ativo][1]
+        h = hash_tag(tag)
+        i = bisect.bisect_left(hashes, h)
+        return i < len(hashes) and hashes[i] == h
+
+    def versao(self):
+        if self.banco_ativo is None:
+            return 0, 0
+        versao, hashes = self.bancos[self.banco_ativo]
+        return versao, len(hashes)
+
+    # Host -> leitor
+    def write(self, dados):
+        self.bytes_recebidos += len(dados)
+        for quadro in self.parser_comandos.alimentar(dados):
+            self._tratar_comando(quadro.tipo, quadro.payload)
+        return len(dados)
+
+    def _responder(self, tipo, payload):
+        self.injetar(self.codificador.quadro(tipo, payload))
+
+    def _ack(self, cmd, status, valor=0):
+        self._responder(TIPO_ACK, struct.pack('<BBI', cmd, status, valor))
+
+    def _tratar_comando(self, tipo, payload):
+        if tipo == TIPO_CMD_VERSAO:
+            self._responder(TIPO_RESP_VERSAO, struct.pack('<IH', *self.versao()))
+        elif tipo == TIPO_CMD_LISTA_INICIO:
+            versao, total = struct.unpack('<IH', payload)
+            if total > CAPACIDADE_LISTA:
+                self.transferencia = None
+                self._ack(tipo, STATUS_CAPACIDADE, versao)
+                return
+            self.transferencia = {"versao": versao, "total": total, "hashes": []}
+            self._ack(tipo, STATUS_OK, versao)
+        elif tipo == TIPO_CMD_LISTA_BLOCO:
+            offset = struct.unpack_from('<H', payload)[0]
+            t = self.transferencia
+            if t is None or offset != len(t["hashes"]) or offset + (len(payload) - 2) // 4 > t["total"]:
+                self.transferencia = None
+                self._ack(tipo, STATUS_SEQUENCIA, offset)
+                return
+            t["hashes"].extend(struct.unpack_from(f'<{(len(payload) - 2) // 4}I', payload, 2))
+            self._ack(tipo, STATUS_OK, offset)
+        elif tipo == TIPO_CMD_LISTA_FIM:
+            versao, checksum = struct.unpack('<IH', payload)
+            t = self.transferencia
+            self.transferencia = None
+            if t is None or versao != t["versao"] or len(t["hashes"]) != t["total"]:
+                self._ack(tipo, STATUS_SEQUENCIA, versao)
+                return
+            if crc16(empacotar(t["hashes"])) != checksum:
+                self._ack(tipo, STATUS_CHECKSUM, versao)
+                return
+            # Grava no banco inativo e só então troca o banco ativo
+            destino = 0 if self.banco_ativo != 0 else 1
+            self.bancos[destino] = (versao, list(t["hashes"]))
+            self.banco_ativo = destino
+            self._ack(tipo, STATUS_OK, versao)
+
+
+def medir_sincronizacao(rodadas=200, n_tags=CAPACIDADE_LISTA, baud=115200):
+    """Mede a sincronização completa da lista contra o emulador, via LeitorSerial"""
+    import random
+    rnd = random.Random(1)
+    duracoes = []
+    bytes_por_rodada = 0
+    for _ in range(rodadas):
+        emulador = EmuladorFirmware()
+        leitor = LeitorSerial(emulador, queue.Queue(), decodificador=ParserQuadros(),
+                              leitor_id="emulador", verboso=False)
+        leitor.start()
+        tags = [f"{rnd.getrandbits(32):08X}" for _ in range(n_tags)]
+        inicio = time.perf_counter()
+        sincronizar_lista(leitor.enviar, leitor.decodificador.respostas, tags)
+        duracoes.append(time.perf_counter() - inicio)
+        leitor.parar()
+        bytes_por_rodada = emulador.bytes_recebidos + emulador.bytes_enviados
+        assert all(emulador.autorizado(tag) for tag in tags)
+    duracoes.sort()
+    # Tempo de linha: 10 bits por byte (8N1) nos dois sentidos
+    return {
+        "tags": n_tags,
+        "p50_ms": duracoes[len(duracoes) // 2] * 1000,
+        "sincronizacoes_s": rodadas / sum(duracoes),
+        "bytes_na_linha": bytes_por_rodada,
+        "tempo_linha_ms": bytes_por_rodada * 10 / baud * 1000,
+    }
+
+
+if __name__ == "__main__":
+    print(f"Sincronização: {medir_sincronizacao()}")
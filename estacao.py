@@ -0,0 +1,406 @@
+import heapq
+import itertools
+import threading
+import time
+
+# ---------------- ESTAÇÕES ----------------
+# Cada quiosque é uma Estacao ligada a um leitor: a janela principal, um
+# Toplevel ou nenhuma tela (simulação). O que é de uma sessão (usuário,
+# papel, modelo em uso, tela, leitura bloqueada, timer de inatividade,
+# callbacks agendados e os widgets da tela) fica na estação; o que é do
+# processo (Catalogo, armazenamento, executor de I/O) continua um só e é
+# compartilhado por todas.
+#
+# O estoque compartilhado é alterado pelo ServicoEstoque
+# (servico_estoque.py): a conferência do saldo e a baixa de uma reposição
+# (Estacao.baixar) são uma operação só, sem outra estação ou thread no
+# meio. A gravação vai para a fila 'armazenamento' do ExecutorIO, na mesma
+# ordem das alterações.
+#
+# Enquanto o formulário está aberto, a estação reserva a área e a
+# quantidade escolhidas (Estacao.reservar): outra estação não vê as mesmas
+# últimas peças como disponíveis. O Registrar confirma a reserva; Voltar,
+# troca de modelo e logout a cancelam, e a atividade na estação a renova.
+# Se a estação some sem nada disso, a reserva vence sozinha no serviço.
+#
+# As estações agendam pelo objeto com after/after_cancel que recebem (o
+# root do Tk ou o LoopSimulado): sem tela, centenas de estações rodam num
+# relógio virtual, sem esperar os 60 s de inatividade de verdade.
+
+INATIVIDADE_MS = 60000
+
+
+class Estacao:
+    """Sessão, timers e tela de um quiosque; o catálogo é compartilhado com as outras estações"""
+
+    def __init__(self, estacao_id, servico, agendador, leitor_id=None, janela=None,
+                 inatividade_ms=INATIVIDADE_MS, ao_expirar=None):
+        self.id = estacao_id
+        self.leitor_id = estacao_id if leitor_id is None else leitor_id
+        self.servico = servico  # ServicoEstoque compartilhado
+        self.catalogo = servico.catalogo
+        self.agendador = agendador  # after(ms, função, *args) / after_cancel(id)
+        self.janela = janela  # tk.Tk, tk.Toplevel ou None (sem tela)
+        self.inatividade_ms = inatividade_ms
+        self.ao_expirar = ao_expirar  # ao_expirar(estacao), depois do logout por inatividade
+        # Sessão
+        self.usuario = None
+        self.papel = None  # 'admin', 'operador'
+        self.modelo_atual = None  # Nome do modelo em uso
+        self.tela = None  # 'inicial', 'selecao_modelo', 'formulario' ou 'painel'
+        self.bloquear_leitura = False
+        self.ultima_atividade = time.time()
+        self.timer_logout = None
+        self.agendados = {}  # ID da estação -> ID do after; cancelados ao voltar para a tela inicial
+        self._ids = itertools.count(1)
+        self.reserva = None  # (ID, modelo, área, quantidade) da reserva do formulário
+        # Widgets da tela atual (continuam None sem tela)
+        self.status_label = None
+        self.wave_canvas = None
+        self.wave_ativa = False
+        self.wave_offset = 0
+        self.area_var = None
+        self.peca_var = None
+        self.quantidade_entry = None
+        # Contadores
+        self.logins = 0
+        self.expiradas = 0
+        self.baixas = 0
+        self.recusadas = 0
+        self.reservas_recusadas = 0
+
+    def __repr__(self):
+        return f"Estacao({self.id!r}, usuario={self.usuario!r}, modelo={self.modelo_atual!r})"
+
+    @property
+    def atual(self):
+        """Modelo em uso (None se nenhum ou se ele saiu do catálogo)"""
+        return None if self.modelo_atual is None else self.catalogo.get(self.modelo_atual)
+
+    # ---- sessão ----
+
+    def entrar(self, usuario, papel):
+        self.usuario = usuario
+        self.papel = papel
+        self.bloquear_leitura = True
+        self.logins += 1
+        self.reiniciar_inatividade()
+
+    def selecionar(self, modelo):
+        """Torna o modelo (ou None) o modelo em uso desta estação; retorna o Modelo"""
+        if modelo is not None and modelo not in self.catalogo:
+            raise KeyError(modelo)
+        if modelo != self.modelo_atual:
+            self.liberar_reserva()
+        self.modelo_atual = modelo
+        return self.atual
+
+    def encerrar_sessao(self):
+        """Esquece usuário e modelo e cancela a reserva e tudo o que a sessão agendou"""
+        self.liberar_reserva()
+        self.usuario = None
+        self.papel = None
+        self.modelo_atual = None
+        self.bloquear_leitura = False
+        self.cancelar_agendados()
+
+    def reservar(self, area, quantidade):
+        """Reserva a quantidade da área do modelo em uso até o Registrar; False se não houver
+
+        Uma reserva de outra área ou quantidade é trocada; a mesma só é renovada.
+        """
+        reserva = self.reserva
+        if reserva is not None and reserva[1:] == (self.modelo_atual, area, quantidade) \
+                and self.servico.renovar(reserva[0]):
+            return True
+        self.liberar_reserva()
+        reserva_id = None if self.modelo_atual is None else self.servico.reservar(self.modelo_atual, area, quantidade)
+        if reserva_id is None:
+            self.reservas_recusadas += 1
+            return False
+        self.reserva = (reserva_id, self.modelo_atual, area, quantidade)
+        return True
+
+    def reservado(self, area):
+        """Quantidade que esta estação tem reservada na área do modelo em uso"""
+        reserva = self.reserva
+        return reserva[3] if reserva is not None and reserva[1:3] == (self.modelo_atual, area) else 0
+
+    def liberar_reserva(self):
+        if self.reserva is not None:
+            self.servico.cancelar(self.reserva[0])
+            self.reserva = None
+
+    def baixar(self, area, quantidade):
+        """Baixa a quantidade da área do modelo em uso; False se não houver
+
+        Com a reserva da mesma área e quantidade, confirma a reserva; senão (ou
+        se ela já venceu) confere o saldo e baixa numa operação só.
+        """
+        reserva, self.reserva = self.reserva, None
+        if reserva is not None:
+            if reserva[1:] == (self.modelo_atual, area, quantidade) and self.servico.confirmar(reserva[0]):
+                self.baixas += 1
+                return True
+            self.servico.cancelar(reserva[0])
+        if self.modelo_atual is None or not self.servico.baixar(self.modelo_atual, area, quantidade):
+            self.recusadas += 1
+            return False
+        self.baixas += 1
+        return True
+
+    # ---- timers ----
+
+    def agendar(self, atraso_ms, funcao, *args):
+        """Agenda um callback da sessão e retorna seu ID (para cancelar)"""
+        callback_id = next(self._ids)
+        self.agendados[callback_id] = self.agendador.after(atraso_ms, self._rodar_agendado,
+                                                           callback_id, funcao, args)
+        return callback_id
+
+    def _rodar_agendado(self, callback_id, funcao, args):
+        if self.agendados.pop(callback_id, None) is not None:
+            funcao(*args)
+
+    def cancelar(self, callback_id):
+        after_id = self.agendados.pop(callback_id, None)
+        if after_id is not None:
+            try:
+                self.agendador.after_cancel(after_id)
+            except Exception:
+                pass
+
+    def cancelar_agendados(self):
+        for callback_id in list(self.agendados):
+            self.cancelar(callback_id)
+        self.timer_logout = None
+
+    def reiniciar_inatividade(self):
+        """Reinicia a contagem para o logout por inatividade (só com alguém logado) e renova a reserva"""
+        self.ultima_atividade = time.time()
+        if self.reserva is not None:
+            self.servico.renovar(self.reserva[0])
+        if self.timer_logout is not None:
+            self.cancelar(self.timer_logout)
+            self.timer_logout = None
+        if self.usuario is not None:
+            self.timer_logout = self.agendar(self.inatividade_ms, self._expirar)
+
+    def _expirar(self):
+        self.timer_logout = None
+        if self.usuario is None:
+            return  # Já está na tela inicial
+        self.expiradas += 1
+        self.encerrar_sessao()
+        if self.ao_expirar is not None:
+            self.ao_expirar(self)
+
+    def estatisticas(self):
+        return {"logins": self.logins, "expiradas": self.expiradas, "baixas": self.baixas,
+                "recusadas": self.recusadas, "reservas_recusadas": self.reservas_recusadas,
+                "agendados": len(self.agendados)}
+
+
+class LoopSimulado:
+    """after/after_cancel num relógio virtual, no lugar do root do Tk (estações sem tela)
+
+    after pode ser chamado de outras threads (callbacks do ExecutorIO); os
+    callbacks só rodam em rodar(), na thread que o chamar.
+    """
+
+    def __init__(self):
+        self.agora_ms = 0
+        self.fila = []  # heap (instante, id, função, args)
+        self.cancelados = set()
+        self.lock = threading.Lock()
+        self._ids = itertools.count()
+        self.executados = 0
+
+    def after(self, atraso_ms, funcao, *args):
+        with self.lock:
+            after_id = next(self._ids)
+            heapq.heappush(self.fila, (self.agora_ms + atraso_ms, after_id, funcao, args))
+        return after_id
+
+    def after_cancel(self, after_id):
+        with self.lock:
+            self.cancelados.add(after_id)
+
+    def rodar(self, ate_ms=None):
+        """Roda os callbacks na ordem dos instantes até a fila esvaziar (ou passar de ate_ms)"""
+        while True:
+            with self.lock:
+                if not self.fila or (ate_ms is not None and self.fila[0][0] > ate_ms):
+                    return
+                instante, after_id, funcao, args = heapq.heappop(self.fila)
+                if after_id in self.cancelados:
+                    self.cancelados.discard(after_id)
+                    continue
+                self.agora_ms = max(self.agora_ms, instante)
+            funcao(*args)
+            self.executados += 1
+
+
+def medir_estacoes(estacoes=24, operacoes=300, areas=6, quantidade_inicial=150, semente=1):
+    """Muitas estações sem tela num processo só, com o estoque e o armazenamento compartilhados
+
+    Cada estação loga o seu usuário, escolhe um modelo e faz reposições em
+    intervalos aleatórios, às vezes troca de modelo e às vezes sai andando
+    (logout por inatividade); a estação 0 é de um administrador que
+    reabastece as áreas. Os operadores escolhem área e quantidade num passo
+    (reserva) e registram no seguinte; quem sai andando deixa a reserva
+    para vencer ou para o logout. Confere que nenhuma sessão vê o estado de outra,
+    que um Registrar com a reserva de pé nunca é recusado, que nenhuma
+    reserva sobra no fim,
+    que o armazenamento nunca recusa uma baixa aceita pela interface (não
+    há saque a descoberto) e que catálogo, armazenamento, histórico de
+    reposições e histórico do estoque terminam com os mesmos valores.
+    """
+    import os
+    import random
+    import tempfile
+    from collections import Counter
+    from armazenamento import ArmazenamentoArquivos
+    from catalogo import Catalogo
+    from executor_io import ExecutorIO
+    from leitor_serial import MedidorLatencia
+    from servico_estoque import ServicoEstoque
+    rnd = random.Random(semente)
+    nomes_modelos = ("313", "314")
+    catalogo = Catalogo.de_dicionario({
+        modelo: {f"A{i}": {"peca": f"Peça {i}", "quantidade": quantidade_inicial, "minimo": 20}
+                 for i in range(1, areas + 1)}
+        for modelo in nomes_modelos})
+    loop = LoopSimulado()
+    servico = ServicoEstoque(catalogo, relogio=lambda: loop.agora_ms / 1000)
+    latencia = MedidorLatencia(capacidade=estacoes * operacoes)
+    esperado = Counter({(modelo, area): quantidade_inicial for modelo in nomes_modelos for area in catalogo[modelo]})
+    baixado = Counter()
+    falhas_io = []
+    restantes = {}
+    usuarios = {}
+    escolhas = {}  # estação -> (área, quantidade) reservadas no formulário
+    recusadas_com_reserva = []
+
+    with tempfile.TemporaryDirectory() as pasta:
+        armazenamento = ArmazenamentoArquivos(catalogo, os.path.join(pasta, "reposicoes.csv"),
+                                              os.path.join(pasta, "estoque.diario"),
+                                              os.path.join(pasta, "estoque_temp_{modelo}.json"),
+                                              opcoes_historico={"fsync_a_cada": 0, "fsync_ms": None},
+                                              durabilidade='nenhuma',
+                                              caminho_historico_estoque=os.path.join(pasta, "estoque.historico"))
+        armazenamento.carregar()
+        executor = ExecutorIO(2, agendar=lambda callback, valor: loop.after(0, callback, valor))
+
+        def passo(estacao):
+            inicio = time.perf_counter()
+            if _passo(estacao):
+                estacao.reiniciar_inatividade()
+                estacao.agendar(rnd.randint(200, 5000), passo, estacao)
+            latencia.registrar(time.perf_counter() - inicio)
+
+        def _passo(estacao):
+            if estacao.usuario is None:
+                # Crachá lido: a sessão começa do zero nesta estação
+                escolhas.pop(estacao.id, None)
+                estacao.entrar(usuarios[estacao.id], "admin" if estacao.id == "estacao0" else "operador")
+                estacao.selecionar(rnd.choice(nomes_modelos))
+                return True
+            # Nenhuma outra estação mexeu na sessão desta
+            assert estacao.usuario == usuarios[estacao.id] and estacao.modelo_atual in nomes_modelos
+            restantes[estacao.id] -= 1
+            if restantes[estacao.id] <= 0:
+                estacao.encerrar_sessao()  # Voltar
+                return False
+            if rnd.random() < 0.02:
+                return False  # Saiu andando: o logout por inatividade encerra a sessão
+            if rnd.random() < 0.05:
+                estacao.selecionar(rnd.choice(nomes_modelos))  # Outro modelo cancela a reserva
+                escolhas.pop(estacao.id, None)
+            modelo, area = estacao.atual, f"A{rnd.randint(1, areas)}"
+            chave = (modelo.nome, area)
+            if estacao.papel == "admin":
+                reposto = rnd.randint(20, 60)
+                servico.devolver(modelo.nome, area, reposto)
+                esperado[chave] += reposto
+                executor.enviar('armazenamento', armazenamento.registrar_alteracao,
+                                modelo.nome, area, modelo.quantidade(area), None, estacao.usuario,
+                                ao_falhar=falhas_io.append)
+                return True
+            escolha = escolhas.pop(estacao.id, None)
+            if escolha is None:
+                # Escolheu área e quantidade no formulário: fica reservado até o Registrar
+                quantidade = rnd.randint(1, 5)
+                if estacao.reservar(area, quantidade):
+                    escolhas[estacao.id] = (area, quantidade)
+                return True
+            area, quantidade = escolha
+            chave = (modelo.nome, area)
+            reservada = estacao.reserva is not None and \
+                servico.vencimentos.get(estacao.reserva[0], 0) > loop.agora_ms / 1000
+            if estacao.baixar(area, quantidade):
+                esperado[chave] -= quantidade
+                baixado[chave] += quantidade
+                executor.enviar('armazenamento', armazenamento.registrar_reposicao,
+                                estacao.usuario, area, modelo.peca(area), quantidade, modelo.nome,
+                                ao_falhar=falhas_io.append)
+            elif reservada:
+                recusadas_com_reserva.append((estacao.id, chave, quantidade))
+            return True
+
+        def voltar_depois(estacao):
+            # Depois do logout por inatividade, o mesmo usuário volta mais tarde
+            loop.after(rnd.randint(1000, 20000), passo, estacao)
+
+        todas = []
+        for i in range(estacoes):
+            estacao = Estacao(f"estacao{i}", servico, loop, ao_expirar=voltar_depois)
+            usuarios[estacao.id] = f"Administrador {i}" if i == 0 else f"Operador {i}"
+            restantes[estacao.id] = operacoes
+            todas.append(estacao)
+            loop.after(rnd.randint(0, 1000), passo, estacao)
+
+        inicio = time.perf_counter()
+        loop.rodar()
+        duracao_loop = time.perf_counter() - inicio
+        executor.esperar()
+        loop.rodar()  # Callbacks de I/O que chegaram depois
+        executor.parar()
+
+        assert not falhas_io, falhas_io
+        assert not recusadas_com_reserva, recusadas_com_reserva
+        assert not servico.reservas and not servico.vencimentos
+        assert all(not estado.reservado for estado in servico.estados.values())
+        final = Counter({(modelo.nome, area): modelo.quantidade(area)
+                         for modelo in catalogo.values() for area in modelo})
+        assert final == esperado and min(final.values()) >= 0
+        assert {(m, a): d["quantidade"] for m, e in armazenamento.estoques.items() for a, d in e.items()} == final
+        reconstruido, _ = armazenamento.estoque_em(None)
+        assert {(m, a): d["quantidade"] for m, e in reconstruido.items() for a, d in e.items()} == final
+        gravado = Counter()
+        for linha in armazenamento.consultar_reposicoes():
+            gravado[(linha[5], linha[2])] += int(linha[4])
+        assert gravado == baixado
+        assert all(not estacao.agendados and estacao.usuario is None for estacao in todas)
+        armazenamento.fechar()
+
+    resumo = latencia.resumo()
+    return {
+        "estacoes": estacoes,
+        "minutos_simulados": round(loop.agora_ms / 60000, 1),
+        "callbacks": loop.executados,
+        "baixas": sum(estacao.baixas for estacao in todas),
+        "recusadas": sum(estacao.recusadas for estacao in todas),
+        "logins": sum(estacao.logins for estacao in todas),
+        "logouts_por_inatividade": sum(estacao.expiradas for estacao in todas),
+        "reservas_recusadas": sum(estacao.reservas_recusadas for estacao in todas),
+        "reservas_vencidas": servico.expiradas,
+        "passo_p50_us": round(resumo["p50"] * 1000, 1),
+        "passo_p99_us": round(resumo["p99"] * 1000, 1),
+        "passos_por_s": round(len(latencia.amostras) / duracao_loop),
+    }
+
+
+if __name__ == "__main__":
+    for n in (24, 200):
+        print(f"Estações: {medir_estacoes(n)}")
@@ -0,0 +1,162 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from leitor_serial import MedidorLatencia
+
+# ---------------- EXECUTOR DE I/O ----------------
+# Toda gravação e leitura de disco sai da thread do Tk e vai para um pool
+# pequeno de threads. Cada tarefa tem uma chave (o arquivo ou o banco que
+# ela usa): tarefas da mesma chave rodam uma de cada vez, na ordem em que
+# foram enviadas; chaves diferentes rodam em paralelo. O resultado volta
+# como Future e, se houver callback, ele é entregue na thread do Tk via
+# agendar (root.after), nunca na thread de I/O.
+
+
+class ExecutorIO:
+    """Pool de threads de I/O com filas ordenadas por chave"""
+
+    def __init__(self, trabalhadores=2, agendar=None):
+        self.agendar = agendar  # agendar(callback, valor) na thread da interface; None = chama direto
+        self.lock = threading.Lock()
+        self.ociosa = threading.Condition(self.lock)
+        self.filas = {}  # chave -> deque de tarefas (existe enquanto a chave tem trabalho)
+        self.prontas = queue.Queue()  # Chaves com tarefa esperando e nenhuma thread nelas
+        self.pendentes = 0
+        self.maior_profundidade = 0
+        self.concluidas = 0
+        self.erros = 0
+        self.encerrando = False
+        self.latencia_espera = MedidorLatencia()  # Envio até começar a rodar
+        self.latencia_execucao = MedidorLatencia()  # Duração da operação de disco
+        self.threads = [threading.Thread(target=self._rodar, daemon=True, name=f"io-{i}")
+                        for i in range(trabalhadores)]
+        for thread in self.threads:
+            thread.start()
+
+    def enviar(self, chave, funcao, *args, ao_concluir=None, ao_falhar=None):
+        """Agenda funcao(*args) na fila da chave; retorna um Future
+
+        ao_concluir(resultado) e ao_falhar(exceção) rodam na thread da interface.
+        """
+        futuro = Future()
+        tarefa = (funcao, args, futuro, ao_concluir, ao_falhar, time.perf_counter())
+        with self.lock:
+            fila = self.filas.get(chave)
+            if fila is None:
+                self.filas[chave] = deque([tarefa])
+                self.prontas.put(chave)
+            else:
+                fila.append(tarefa)
+            self.pendentes += 1
+            self.maior_profundidade = max(self.maior_profundidade, self.pendentes)
+        return futuro
+
+    def _rodar(self):
+        while True:
+            chave = self.prontas.get()
+            if chave is None:
+                return
+            with self.lock:
+                funcao, args, futuro, ao_concluir, ao_falhar, enviada = self.filas[chave].popleft()
+            inicio = time.perf_counter()
+            self.latencia_espera.registrar(inicio - enviada)
+            try:
+                resultado = funcao(*args)
+            except Exception as e:
+                self.erros += 1
+                futuro.set_exception(e)
+                if ao_falhar is None:
+                    print(f"Erro de I/O ({chave}): {e}")
+                else:
+                    self._entregar(ao_falhar, e)
+            else:
+                futuro.set_result(resultado)
+                if ao_concluir is not None:
+                    self._entregar(ao_concluir, resultado)
+            self.latencia_execucao.registrar(time.perf_counter() - inicio)
+            with self.lock:
+                self.pendentes -= 1
+                self.concluidas += 1
+                if self.filas[chave]:
+                    self.prontas.put(chave)  # Próxima tarefa da chave, depois das outras chaves
+                else:
+                    del self.filas[chave]
+                if self.pendentes == 0:
+                    self.ociosa.notify_all()
+
+    def _entregar(self, callback, valor):
+        if self.encerrando:
+            return  # A interface está fechando; ninguém vai ver o resultado
+        if self.agendar is None:
+            callback(valor)
+            return
+        try:
+            self.agendar(callback, valor)
+        except Exception as e:
+            print(f"Não foi possível entregar o resultado de I/O à interface: {e}")
+
+    def esperar(self, timeout=None):
+        """Bloqueia até todas as filas esvaziarem; retorna False se o timeout vencer"""
+        with self.lock:
+            return self.ociosa.wait_for(lambda: self.pendentes == 0, timeout)
+
+    def parar(self, timeout=None):
+        """Termina o que já foi enviado (sem entregar callbacks) e encerra as threads"""
+        self.encerrando = True
+        concluido = self.esperar(timeout)
+        for _ in self.threads:
+            self.prontas.put(None)
+        return concluido
+
+    def estatisticas(self):
+        espera = self.latencia_espera.resumo()
+        execucao = self.latencia_execucao.resumo()
+        return {
+            "profundidade": self.pendentes,
+            "maior_profundidade": self.maior_profundidade,
+            "concluidas": self.concluidas,
+            "erros": self.erros,
+            "espera_p99_ms": espera["p99"],
+            "escrita_p50_ms": execucao["p50"],
+            "escrita_p99_ms": execucao["p99"],
+        }
+
+
+def medir_executor(operacoes=2000, chaves=3, atraso=0.001):
+    """Custo para a thread da interface: operação de disco lenta direta x enviada ao executor"""
+    def gravar(registro, chave, atraso):
+        time.sleep(atraso)  # Cartão SD lento
+        registro.append(chave)
+        return chave
+
+    inicio = time.perf_counter()
+    for i in range(min(operacoes, 200)):
+        gravar([], i % chaves, atraso)
+    direto_ms = (time.perf_counter() - inicio) / min(operacoes, 200) * 1000
+
+    executor = ExecutorIO(trabalhadores=chaves)
+    ordem = {chave: [] for chave in range(chaves)}
+    enviados = {chave: [] for chave in range(chaves)}
+    tempos = []
+    for i in range(operacoes):
+        chave = i % chaves
+        enviados[chave].append(i)
+        inicio = time.perf_counter()
+        executor.enviar(chave, gravar, ordem[chave], i, atraso)
+        tempos.append(time.perf_counter() - inicio)
+    executor.parar()
+    assert ordem == enviados  # Cada chave gravou na ordem de envio
+    tempos.sort()
+    return {
+        "direto_ms_por_operacao": direto_ms,
+        "envio_p50_us": tempos[len(tempos) // 2] * 1e6,
+        "envio_p99_us": tempos[int(len(tempos) * 0.99)] * 1e6,
+        "executor": executor.estatisticas(),
+    }
+
+
+if __name__ == "__main__":
+    print(f"Executor de I/O: {medir_executor()}")
@@ -0,0 +1,309 @@
+import csv
+import glob
+import io
+import os
+import threading
+import time
+from datetime import date
+
+from indice_campos import IndiceCampos, renomear
+from indice_tempo import IndiceTempo, caminho_indice, indexar
+
+# ---------------- ESCRITOR DO HISTÓRICO ----------------
+# O CSV de reposições fica aberto durante toda a execução e as linhas vão
+# para o buffer do arquivo. O fsync é feito em grupo: a cada fsync_a_cada
+# linhas ou, no máximo, fsync_ms depois da primeira linha pendente (uma
+# thread cuida do prazo). Numa queda de energia perdem-se no máximo as
+# linhas desse grupo.
+#
+# Rotação: quando o arquivo passa de rotacao_bytes ou muda o dia, o arquivo
+# atual vira reposicoes-AAAA-MM-DD-NNN.csv (dia das linhas que ele contém) e
+# um novo começa com o cabeçalho. Um arquivo que já existe e não está vazio
+# continua sem cabeçalho repetido.
+#
+# Cada arquivo tem um índice de tempo esparso (<arquivo>.idx, ver
+# indice_tempo.py) e, se campos_indexados for dado, índices por campo
+# (indice_campos.py), mantidos durante a escrita; eles são renomeados junto
+# na rotação e refeitos se estiverem faltando.
+#
+# Arquivos rotacionados antigos podem ter sido trocados pela versão colunar
+# (reposicoes-AAAA-MM-DD-NNN.col, ver arquivo_colunar.py).
+
+EXTENSAO_ARQUIVADO = '.col'
+
+
+def arquivos_historico(caminho):
+    """Arquivos rotacionados (mais antigos primeiro) seguidos do arquivo atual
+
+    Inclui os arquivados (.col) na posição do CSV que os originou; se o CSV
+    ainda existir (arquivamento interrompido), vale o CSV.
+    """
+    base, extensao = os.path.splitext(caminho)
+    rotacionados = glob.glob(f"{glob.escape(base)}-????-??-??-???{extensao}")
+    existentes = {os.path.splitext(arquivo)[0] for arquivo in rotacionados}
+    rotacionados += [arquivo for arquivo in glob.glob(f"{glob.escape(base)}-????-??-??-???{EXTENSAO_ARQUIVADO}")
+                     if os.path.splitext(arquivo)[0] not in existentes]
+    return sorted(rotacionados) + [caminho]
+
+
+def ultima_data_hora(caminho, bloco=4096):
+    """Data/hora (1ª coluna) da última linha de um CSV do histórico; None se só tiver o cabeçalho"""
+    with open(caminho, 'rb') as f:
+        tamanho = f.seek(0, os.SEEK_END)
+        inicio = tamanho
+        while True:
+            inicio = max(0, inicio - bloco)
+            f.seek(inicio)
+            linhas = f.read(tamanho - inicio).rstrip(b'\r\n').splitlines()
+            # Com início > 0 a primeira linha pode estar cortada; com início 0 é o cabeçalho
+            if len(linhas) >= 2 or inicio == 0:
+                break
+    if len(linhas) < 2:
+        return None
+    campos = next(csv.reader([linhas[-1].decode('utf-8', errors='replace')]), None)
+    return campos[0] if campos else None
+
+
+class EscritorHistorico:
+    """Escritor de CSV com o arquivo sempre aberto, fsync em grupo e rotação"""
+
+    def __init__(self, caminho, cabecalho, fsync_a_cada=32, fsync_ms=200,
+                 rotacao_bytes=None, rotacao_diaria=False, indice_a_cada=128,
+                 campos_indexados=None):
+        self.caminho = caminho
+        self.cabecalho = cabecalho
+        self.fsync_a_cada = fsync_a_cada  # 1 = fsync a cada linha; 0 = só pelo prazo
+        self.fsync_ms = fsync_ms  # None = sem prazo (só por contagem e ao fechar)
+        self.rotacao_bytes = rotacao_bytes
+        self.rotacao_diaria = rotacao_diaria
+        self.indice_a_cada = indice_a_cada  # None = sem índice de tempo
+        self.indice = None
+        self.campos_indexados = campos_indexados  # {campo: coluna}, ver indice_campos.CAMPOS
+        self.indice_campos = None
+        self.linha_texto = io.StringIO()  # Cada linha é formatada aqui para saber o tamanho em bytes
+        self.formatador = csv.writer(self.linha_texto)
+        self.lock = threading.Lock()
+        self.pendentes = 0  # Linhas escritas desde o último fsync
+        self.prazo = None  # Instante (monotônico) em que as pendentes têm que ir ao disco
+        self.linhas = 0
+        self.fsyncs = 0
+        self.rotacoes = 0
+        self.maior_atraso_fsync = 0.0
+        self.arquivo = None
+        self.ultimo_registro = None  # Data/hora da última linha do arquivo atual (dá o nome na rotação)
+        self._abrir()
+        self.acordar = threading.Condition(self.lock)
+        self.running = True
+        if fsync_ms:
+            threading.Thread(target=self._rodar, daemon=True, name="fsync-historico").start()
+
+    def _abrir(self):
+        existia = os.path.exists(self.caminho)
+        self.arquivo = open(self.caminho, 'a', newline='', encoding='utf-8')
+        self.posicao = os.path.getsize(self.caminho)  # Bytes do arquivo (o que vai para ele passa por _acrescentar)
+        self.dia = date.fromtimestamp(os.path.getmtime(self.caminho)) if existia else date.today()
+        self.ultimo_registro = ultima_data_hora(self.caminho) if existia else None
+        if self.indice_a_cada:
+            self.indice = IndiceTempo(self.caminho, self.indice_a_cada)
+            if not self.indice.abrir(self.posicao) and self.posicao:
+                indexar(self.caminho, self.indice_a_cada)  # CSV de antes do índice
+                self.indice.abrir(self.posicao)
+        if self.campos_indexados:
+            self.indice_campos = IndiceCampos(self.caminho, self.campos_indexados).abrir(self.posicao)
+        if self.posicao == 0:
+            self._acrescentar([self.cabecalho], indexar_linhas=False)
+
+    def _acrescentar(self, linhas, indexar_linhas=True):
+        for linha in linhas:
+            self.formatador.writerow(linha)
+            texto = self.linha_texto.getvalue()
+            self.linha_texto.seek(0)
+            self.linha_texto.truncate()
+            if indexar_linhas and self.indice is not None:
+                self.indice.anotar(linha[0], self.posicao)
+            if indexar_linhas and self.indice_campos is not None:
+                self.indice_campos.anotar(self.posicao, linha)
+            if indexar_linhas:
+                self.ultimo_registro = linha[0]
+            self.arquivo.write(texto)
+            self.posicao += len(texto) if texto.isascii() else len(texto.encode('utf-8'))
+
+    def escrever(self, linha):
+        """Acrescenta uma linha ao histórico"""
+        self.escrever_varias((linha,))
+
+    def escrever_varias(self, linhas):
+        """Acrescenta um lote de linhas (uma chamada, um fsync no máximo)"""
+        with self.lock:
+            self._rotacionar_se_preciso()
+            self._acrescentar(linhas)
+            n = len(linhas)
+            self.linhas += n
+            if self.pendentes == 0 and self.fsync_ms:
+                self.prazo = time.monotonic() + self.fsync_ms / 1000
+                self.acordar.notify()
+            self.pendentes += n
+            if self.fsync_a_cada and self.pendentes >= self.fsync_a_cada:
+                self._sincronizar()
+
+    def _rotacionar_se_preciso(self):
+        hoje = date.today()
+        if self.rotacao_diaria and hoje != self.dia:
+            self._rotacionar()
+        elif self.rotacao_bytes and self.posicao >= self.rotacao_bytes:
+            self._rotacionar()
+        if self.rotacao_diaria:
+            self.dia = hoje
+
+    def _rotacionar(self):
+        self._sincronizar()
+        self.arquivo.close()
+        if self.indice is not None:
+            self.indice.fechar()
+        if self.indice_campos is not None:
+            self.indice_campos.fechar()
+        base, extensao = os.path.splitext(self.caminho)
+        # O nome leva o dia da última linha escrita, não o da criação do arquivo
+        # (numa rotação só por tamanho ele pode ser bem mais antigo que as linhas)
+        dia = str(self.ultimo_registro)[:10] if self.ultimo_registro else date.today().isoformat()
+        numero = 1
+        while True:
+            destino = f"{base}-{dia}-{numero:03d}{extensao}"
+            if not os.path.exists(destino):
+                break
+            numero += 1
+        os.replace(self.caminho, destino)
+        if self.indice is not None:
+            os.replace(caminho_indice(self.caminho), caminho_indice(destino))
+        if self.indice_campos is not None:
+            renomear(self.caminho, destino)
+        self.rotacoes += 1
+        self._abrir()
+
+    def _sincronizar(self):
+        """flush + fsync das linhas pendentes (com o lock)"""
+        if self.pendentes == 0:
+            return
+        self.arquivo.flush()
+        os.fsync(self.arquivo.fileno())
+        if self.indice is not None:
+            # Sem fsync: entradas além do fim do CSV são descartadas ao abrir
+            self.indice.descarregar()
+        if self.indice_campos is not None:
+            self.indice_campos.descarregar()
+        if self.prazo is not None:
+            self.maior_atraso_fsync = max(self.maior_atraso_fsync, time.monotonic() - self.prazo)
+        self.pendentes = 0
+        self.prazo = None
+        self.fsyncs += 1
+
+    def descarregar(self):
+        """Grava no disco tudo o que estiver pendente"""
+        with self.lock:
+            if self.arquivo is not None:
+                self._sincronizar()
+
+    def _rodar(self):
+        with self.lock:
+            while self.running:
+                if self.prazo is None:
+                    self.acordar.wait()
+                    continue
+                restante = self.prazo - time.monotonic()
+                if restante > 0:
+                    self.acordar.wait(restante)
+                    continue
+                try:
+                    self._sincronizar()
+                except (OSError, ValueError) as e:
+                    print(f"Erro ao gravar o histórico: {e}")
+                    self.prazo = None
+
+    def fechar(self):
+        with self.lock:
+            if self.arquivo is None:
+                return
+            self.running = False
+            self.acordar.notify()
+            self._sincronizar()
+            self.arquivo.close()
+            self.arquivo = None
+            if self.indice is not None:
+                self.indice.fechar()
+            if self.indice_campos is not None:
+                self.indice_campos.fechar()
+
+    def estatisticas(self):
+        return {
+            "linhas": self.linhas,
+            "fsyncs": self.fsyncs,
+            "linhas_por_fsync": self.linhas / self.fsyncs if self.fsyncs else 0,
+            "pendentes": self.pendentes,
+            "rotacoes": self.rotacoes,
+        }
+
+
+def medir_historico(linhas=20000, lote=1):
+    """Linhas/s do histórico: abrir-escrever-fechar por linha x escritor com políticas de fsync"""
+    import tempfile
+    cabecalho = ["Data/Hora", "Nome", "Área", "Peça", "Quantidade", "Modelo"]
+    linha = ["2025-01-01 10:00:00", "Operador 1", "A1", "Eixos", 3, "313"]
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "antes.csv")
+        n = min(linhas, 5000)
+        inicio = time.perf_counter()
+        for _ in range(n):
+            file_exists = os.path.exists(caminho)
+            with open(caminho, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                if not file_exists:
+                    writer.writerow(cabecalho)
+                writer.writerow(linha)
+        resultados["abrir_por_linha (sem fsync)"] = n / (time.perf_counter() - inicio)
+
+        politicas = {
+            "fsync_por_linha": {"fsync_a_cada": 1, "fsync_ms": None},
+            "fsync_a_cada_32": {"fsync_a_cada": 32, "fsync_ms": 200},
+            "fsync_a_cada_200ms": {"fsync_a_cada": 0, "fsync_ms": 200},
+            "rotacao_1MB_a_cada_32": {"fsync_a_cada": 32, "fsync_ms": 200, "rotacao_bytes": 1 << 20},
+        }
+        for nome, politica in politicas.items():
+            escritor = EscritorHistorico(os.path.join(pasta, f"{nome}.csv"), cabecalho, **politica)
+            n = min(linhas, 2000) if politica["fsync_a_cada"] == 1 else linhas
+            inicio = time.perf_counter()
+            for i in range(0, n, lote):
+                escritor.escrever_varias([linha] * min(lote, n - i))
+            escritor.fechar()
+            resultados[nome] = n / (time.perf_counter() - inicio)
+            arquivos = arquivos_historico(escritor.caminho)
+            total = 0
+            for arquivo in arquivos:
+                with open(arquivo, newline='', encoding='utf-8') as f:
+                    conteudo = list(csv.reader(f))
+                assert conteudo[0] == cabecalho and cabecalho not in conteudo[1:]
+                total += len(conteudo) - 1
+            assert total == n
+
+        # Arquivo antigo reaberto e rotacionado por tamanho: o nome tem o dia das linhas, não o do arquivo
+        caminho = os.path.join(pasta, "reaberto.csv")
+        with open(caminho, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows([cabecalho, linha])
+        antigo = time.time() - 60 * 86400
+        os.utime(caminho, (antigo, antigo))
+        escritor = EscritorHistorico(caminho, cabecalho, fsync_ms=None, indice_a_cada=None)
+        agora = time.strftime("%Y-%m-%d %H:%M:%S")
+        escritor.escrever([agora] + linha[1:])
+        escritor.rotacao_bytes = 1
+        escritor.escrever([agora] + linha[1:])
+        escritor.fechar()
+        rotacionados = arquivos_historico(caminho)[:-1]
+        assert [os.path.basename(a) for a in rotacionados] == [f"reaberto-{agora[:10]}-001.csv"], rotacionados
+        assert ultima_data_hora(rotacionados[0]) == agora and ultima_data_hora(caminho) == agora
+    return resultados
+
+
+if __name__ == "__main__":
+    for lote in (1, 50):
+        for nome, taxa in medir_historico(lote=lote).items():
+            print(f"Histórico (lote {lote}) {nome}: {taxa:,.0f} linhas/s")
@@ -0,0 +1,234 @@
+import json
+import os
+import time
+from bisect import bisect_right
+from datetime import datetime
+
+# ---------------- HISTÓRICO DO ESTOQUE ----------------
+# Toda alteração de estoque (reposição, ajuste do administrador, troca de
+# catálogo) vira uma linha em estoque.historico, que nunca é compactado:
+#   {"t": data/hora, "m": modelo, "a": área, "q": quantidade, "min": mínimo,
+#    "d": variação da quantidade, "o": origem, "u": usuário}
+# "q" e "min" são os valores depois da alteração. A cada checkpoint_a_cada
+# linhas, o estoque inteiro vai para estoque.checkpoints (uma linha JSON por
+# checkpoint) e estoque.checkpoints.idx ganha "data/hora;posição no
+# checkpoints;posição no historico".
+#
+# Estoque no instante T = último checkpoint até T + as linhas do histórico
+# depois dele com data/hora <= T (no máximo checkpoint_a_cada linhas).
+# As datas/horas nunca diminuem: se o relógio voltar, repete-se a última.
+
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+
+
+class HistoricoEstoque:
+    """Registro permanente das alterações de estoque, com checkpoints para consultas no tempo"""
+
+    def __init__(self, estoques, caminho='estoque.historico', checkpoint_a_cada=500):
+        self.estoques = estoques  # {modelo: {área: dados}} do armazenamento, lido nos checkpoints
+        self.caminho = caminho
+        self.caminho_checkpoints = caminho + '.checkpoints'
+        self.caminho_indice = caminho + '.checkpoints.idx'
+        self.checkpoint_a_cada = checkpoint_a_cada
+        self.checkpoints = []  # [(data/hora, posição no .checkpoints, posição no histórico)]
+        self.desde_checkpoint = 0
+        self.ultima_data = ""
+        self.arquivo = None
+        self.linhas = 0
+        self.reconstrucoes = 0
+        self.relogio = lambda: datetime.now().strftime(FORMATO_DATA)
+
+    # ---- escrita ----
+
+    def abrir(self):
+        """Abre os arquivos depois da carga do estoque; grava um checkpoint se o histórico não bater"""
+        self._ler_indice()
+        self.arquivo = open(self.caminho, 'ab')
+        # Primeira execução, queda de energia entre gravações ou arquivos editados
+        self.conferir("carga")
+
+    def conferir(self, motivo):
+        """Grava um checkpoint se o estoque atual não for o que o histórico reconstrói"""
+        ultimo = self.estado_em(None)
+        if ultimo is None or _valores(ultimo[0]) != _valores(self.estoques):
+            self.checkpoint(motivo)
+            return True
+        self.desde_checkpoint = ultimo[1]["reaplicadas"]
+        return False
+
+    def _ler_indice(self):
+        self.checkpoints = []
+        tamanho_checkpoints = os.path.getsize(self.caminho_checkpoints) if os.path.exists(self.caminho_checkpoints) else 0
+        tamanho_historico = os.path.getsize(self.caminho) if os.path.exists(self.caminho) else 0
+        if os.path.exists(self.caminho_indice):
+            with open(self.caminho_indice, 'r', encoding='utf-8') as f:
+                for linha in f:
+                    try:
+                        data, pos_checkpoint, pos_historico = linha.rstrip('\n').split(';')
+                        pos_checkpoint, pos_historico = int(pos_checkpoint), int(pos_historico)
+                    except ValueError:
+                        break  # Linha cortada por uma queda de energia
+                    if pos_checkpoint >= tamanho_checkpoints or pos_historico > tamanho_historico:
+                        break
+                    self.checkpoints.append((data, pos_checkpoint, pos_historico))
+        if self.checkpoints:
+            self.ultima_data = self.checkpoints[-1][0]
+        # A última data pode estar no histórico, depois do último checkpoint
+        if self.checkpoints and tamanho_historico > self.checkpoints[-1][2]:
+            for registro in self._registros(self.checkpoints[-1][2]):
+                self.ultima_data = max(self.ultima_data, registro["t"])
+
+    def _agora(self):
+        self.ultima_data = max(self.ultima_data, self.relogio())
+        return self.ultima_data
+
+    def registrar(self, modelo, area, origem, usuario=None, variacao=None):
+        """Grava os valores atuais da área (já alterados em estoques)"""
+        dados = self.estoques[modelo][area]
+        registro = {"t": self._agora(), "m": modelo, "a": area, "q": dados["quantidade"],
+                    "min": dados["minimo"], "o": origem}
+        if variacao is not None:
+            registro["d"] = variacao
+        if usuario is not None:
+            registro["u"] = usuario
+        self.arquivo.write(json.dumps(registro, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+        self.arquivo.flush()
+        self.linhas += 1
+        self.desde_checkpoint += 1
+        if self.desde_checkpoint >= self.checkpoint_a_cada:
+            self.checkpoint("periodico")
+
+    def checkpoint(self, motivo):
+        """Grava o estoque inteiro; as consultas a partir de agora começam dele"""
+        self.arquivo.flush()
+        data = self._agora()
+        posicao_historico = self.arquivo.tell()
+        estado = {modelo: {area: [dados["peca"], dados["quantidade"], dados["minimo"]]
+                           for area, dados in estoque.items()}
+                  for modelo, estoque in self.estoques.items()}
+        linha = json.dumps({"t": data, "motivo": motivo, "estoque": estado},
+                           ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        with open(self.caminho_checkpoints, 'ab') as f:
+            posicao_checkpoint = f.tell()
+            f.write(linha)
+        # O índice só aponta para checkpoints que já estão inteiros no arquivo
+        with open(self.caminho_indice, 'a', encoding='utf-8') as f:
+            f.write(f"{data};{posicao_checkpoint};{posicao_historico}\n")
+        self.checkpoints.append((data, posicao_checkpoint, posicao_historico))
+        self.desde_checkpoint = 0
+
+    def fechar(self):
+        if self.arquivo is not None:
+            self.arquivo.close()
+            self.arquivo = None
+
+    # ---- consulta ----
+
+    def _registros(self, posicao, ate=None):
+        if self.arquivo is not None:
+            self.arquivo.flush()
+        with open(self.caminho, 'rb') as f:
+            f.seek(posicao)
+            for linha in f:
+                if not linha.endswith(b'\n'):
+                    return  # Linha sendo escrita
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    continue
+                if ate is not None and registro["t"] > ate:
+                    return  # As datas não diminuem: o resto é depois de T
+                yield registro
+
+    def estado_em(self, data_hora):
+        """({modelo: {área: dados}}, info) no instante data_hora ('AAAA-MM-DD HH:MM:SS'; None = agora)
+
+        None se data_hora for anterior ao primeiro checkpoint.
+        """
+        if not self.checkpoints:
+            return None
+        i = len(self.checkpoints) if data_hora is None else bisect_right(
+            self.checkpoints, (data_hora, float('inf'), float('inf')))
+        if i == 0:
+            return None
+        data, posicao_checkpoint, posicao_historico = self.checkpoints[i - 1]
+        with open(self.caminho_checkpoints, 'rb') as f:
+            f.seek(posicao_checkpoint)
+            checkpoint = json.loads(f.readline())
+        estoques = {modelo: {area: {"peca": peca, "quantidade": quantidade, "minimo": minimo}
+                             for area, (peca, quantidade, minimo) in estoque.items()}
+                    for modelo, estoque in checkpoint["estoque"].items()}
+        reaplicadas = 0
+        for registro in self._registros(posicao_historico, data_hora):
+            dados = estoques.get(registro["m"], {}).get(registro["a"])
+            if dados is None:
+                continue  # Área que só entrou no catálogo depois do checkpoint
+            dados["quantidade"] = registro["q"]
+            dados["minimo"] = registro["min"]
+            reaplicadas += 1
+        self.reconstrucoes += 1
+        return estoques, {"checkpoint": data, "reaplicadas": reaplicadas}
+
+    def estatisticas(self):
+        return {"linhas": self.linhas, "checkpoints": len(self.checkpoints),
+                "desde_checkpoint": self.desde_checkpoint, "reconstrucoes": self.reconstrucoes}
+
+
+def _valores(estoques):
+    return {modelo: {area: (dados["quantidade"], dados["minimo"]) for area, dados in estoque.items()}
+            for modelo, estoque in estoques.items()}
+
+
+def medir_historico_estoque(alteracoes=200_000, areas=50, consultas=200, checkpoint_a_cada=500):
+    """Estoque em T: reaplicar tudo desde o início x checkpoint mais próximo + diferença"""
+    import random
+    import tempfile
+    rnd = random.Random(1)
+    estoques = {m: {f"A{i}": {"peca": f"Peça {i}", "quantidade": 10 ** 6, "minimo": 10} for i in range(areas)}
+                for m in ("313", "314")}
+    inicio = time.mktime((2025, 1, 1, 0, 0, 0, 0, 0, -1))
+    relogio = [inicio]
+    with tempfile.TemporaryDirectory() as pasta:
+        historico = HistoricoEstoque(estoques, os.path.join(pasta, "estoque.historico"), checkpoint_a_cada)
+        # Um ano de alterações num relógio simulado
+        historico.relogio = lambda: time.strftime(FORMATO_DATA, time.localtime(relogio[0]))
+        historico.abrir()
+        for i in range(alteracoes):
+            relogio[0] = inicio + i * 365 * 86400 // alteracoes
+            modelo, area = rnd.choice(("313", "314")), f"A{rnd.randrange(areas)}"
+            estoques[modelo][area]["quantidade"] -= 1
+            historico.registrar(modelo, area, "reposicao", variacao=-1)
+        datas = [time.strftime(FORMATO_DATA, time.localtime(inicio + rnd.randrange(365 * 86400)))
+                 for _ in range(consultas)]
+        tempos = []
+        for data in datas:
+            t0 = time.perf_counter()
+            historico.estado_em(data)
+            tempos.append(time.perf_counter() - t0)
+        tempos.sort()
+
+        # Sem checkpoints: reaplicar o histórico inteiro até T
+        data = datas[0]
+        t0 = time.perf_counter()
+        primeiro = historico.checkpoints[0]
+        with open(historico.caminho_checkpoints, 'rb') as f:
+            completo = json.loads(f.readline())["estoque"]
+        for registro in historico._registros(primeiro[2], data):
+            completo[registro["m"]][registro["a"]][1] = registro["q"]
+        desde_inicio_ms = (time.perf_counter() - t0) * 1000
+        reconstruido, _ = historico.estado_em(data)
+        assert {m: {a: d["quantidade"] for a, d in e.items()} for m, e in reconstruido.items()} == \
+               {m: {a: v[1] for a, v in e.items()} for m, e in completo.items()}
+        assert _valores(historico.estado_em(None)[0]) == _valores(estoques)
+        resultado = {"alteracoes": alteracoes, "checkpoints": len(historico.checkpoints),
+                     "historico_mb": round(os.path.getsize(historico.caminho) / 1e6, 1),
+                     "checkpoints_mb": round(os.path.getsize(historico.caminho_checkpoints) / 1e6, 1),
+                     "consulta_p50_ms": tempos[len(tempos) // 2] * 1000,
+                     "consulta_p99_ms": tempos[int(len(tempos) * 0.99)] * 1000,
+                     "reaplicar_desde_o_inicio_ms": desde_inicio_ms}
+        historico.fechar()
+    return resultado
+
+
+if __name__ == "__main__":
+    print(f"Histórico do estoque: {medir_historico_estoque()}")
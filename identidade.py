@@ -0,0 +1,402 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict, namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ---------------- IDENTIDADE DOS CRACHÁS ----------------
+# Provedores de identidade (arquivo JSON, SQLite ou um serviço HTTP local)
+# atrás de um cache LRU com TTL e de um cache negativo para crachás
+# desconhecidos. Se o provedor ficar lento ou fora do ar, o cache continua
+# respondendo: entradas vencidas são usadas até o provedor voltar.
+#
+# Com um executor (o ExecutorIO do main.py), o provedor nunca é chamado na
+# thread de quem busca: uma entrada vencida (positiva ou negativa) é
+# devolvida na hora e atualizada em segundo plano, e um crachá fora do
+# cache devolve PENDENTE e
+# chega depois por ao_resolver. As consultas usam uma chave só do executor,
+# então um provedor lento ocupa no máximo uma thread de I/O. Se o provedor
+# falhar, a entrada vencida ganha mais ttl_erro segundos e um crachá sem
+# entrada fica no cache negativo pelo mesmo tempo: com o provedor fora,
+# cada crachá custa uma tentativa a cada ttl_erro, não uma por leitura.
+
+PAPEIS = ('admin', 'operador')
+
+Identidade = namedtuple('Identidade', ['nome', 'papel'])
+
+PENDENTE = object()  # CacheIdentidade.buscar: consulta ao provedor em andamento
+
+
+class ErroProvedor(Exception):
+    """Provedor indisponível (diferente de 'crachá não cadastrado')"""
+
+
+class ProvedorIdentidade:
+    """Interface dos provedores: buscar(tag) e listar()"""
+
+    def buscar(self, tag):
+        """Retorna a Identidade do crachá ou None se não estiver cadastrado"""
+        raise NotImplementedError
+
+    def listar(self):
+        """Retorna {tag: Identidade} com todos os crachás cadastrados"""
+        raise NotImplementedError
+
+
+def crachas_de_dicionarios(administradores, operadores):
+    """Converte os dicionários antigos do main.py em {tag: Identidade}"""
+    crachas = {tag: Identidade(nome, 'operador') for tag, nome in operadores.items()}
+    crachas.update({tag: Identidade(nome, 'admin') for tag, nome in administradores.items()})
+    return crachas
+
+
+class ProvedorMemoria(ProvedorIdentidade):
+    """Crachás num dicionário em memória"""
+
+    def __init__(self, crachas):
+        self.crachas = dict(crachas)
+
+    def buscar(self, tag):
+        return self.crachas.get(tag)
+
+    def listar(self):
+        return dict(self.crachas)
+
+
+class ProvedorArquivo(ProvedorIdentidade):
+    """Crachás num arquivo JSON: {"administradores": {tag: nome}, "operadores": {tag: nome}}"""
+
+    def __init__(self, caminho, padrao=None):
+        self.caminho = caminho
+        if not os.path.exists(caminho) and padrao is not None:
+            self.salvar(padrao)
+        self.crachas = {}
+        self.recarregar()
+
+    def ler(self):
+        """Lê o arquivo e retorna {tag: Identidade}, sem trocar os crachás em uso"""
+        try:
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                dados = json.load(f)
+            return crachas_de_dicionarios(dados.get("administradores", {}),
+                                          dados.get("operadores", {}))
+        except (OSError, ValueError, AttributeError) as e:
+            raise ErroProvedor(f"Erro ao ler {self.caminho}: {e}")
+
+    def recarregar(self):
+        self.crachas = self.ler()
+
+    def salvar(self, crachas):
+        dados = {"administradores": {}, "operadores": {}}
+        for tag, identidade in crachas.items():
+            grupo = "administradores" if identidade.papel == 'admin' else "operadores"
+            dados[grupo][tag] = identidade.nome
+        with open(self.caminho, 'w', encoding='utf-8') as f:
+            json.dump(dados, f, ensure_ascii=False, indent=2)
+
+    def buscar(self, tag):
+        return self.crachas.get(tag)
+
+    def listar(self):
+        return dict(self.crachas)
+
+
+class ProvedorSQLite(ProvedorIdentidade):
+    """Crachás numa tabela SQLite (tag, nome, papel)"""
+
+    def __init__(self, caminho, padrao=None):
+        self.conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conexao:
+            self.conexao.execute("CREATE TABLE IF NOT EXISTS crachas ("
+                                 "tag TEXT PRIMARY KEY, nome TEXT NOT NULL, papel TEXT NOT NULL)")
+            vazio = self.conexao.execute("SELECT COUNT(*) FROM crachas").fetchone()[0] == 0
+            if vazio and padrao:
+                self.conexao.executemany("INSERT INTO crachas VALUES (?, ?, ?)",
+                                         [(tag, i.nome, i.papel) for tag, i in padrao.items()])
+
+    def buscar(self, tag):
+        try:
+            with self.lock:
+                linha = self.conexao.execute("SELECT nome, papel FROM crachas WHERE tag = ?",
+                                             (tag,)).fetchone()
+        except sqlite3.Error as e:
+            raise ErroProvedor(str(e))
+        return Identidade(*linha) if linha else None
+
+    def listar(self):
+        try:
+            with self.lock:
+                linhas = self.conexao.execute("SELECT tag, nome, papel FROM crachas").fetchall()
+        except sqlite3.Error as e:
+            raise ErroProvedor(str(e))
+        return {tag: Identidade(nome, papel) for tag, nome, papel in linhas}
+
+
+class ProvedorHTTP(ProvedorIdentidade):
+    """Crachás num serviço HTTP: GET /crachas/<tag> e GET /crachas"""
+
+    def __init__(self, url, timeout=2.0):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _get(self, caminho):
+        try:
+            with urllib.request.urlopen(self.url + caminho, timeout=self.timeout) as resposta:
+                return json.load(resposta)
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise ErroProvedor(f"HTTP {e.code}")
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise ErroProvedor(str(e))
+
+    def buscar(self, tag):
+        dados = self._get(f"/crachas/{urllib.parse.quote(tag)}")
+        return Identidade(dados["nome"], dados["papel"]) if dados else None
+
+    def listar(self):
+        dados = self._get("/crachas") or {}
+        return {tag: Identidade(d["nome"], d["papel"]) for tag, d in dados.items()}
+
+
+class ServidorCrachasLocal:
+    """Serviço HTTP local que faz o papel do cadastro central (para testes)"""
+
+    def __init__(self, crachas, porta=0, atraso=0.0):
+        self.crachas = dict(crachas)
+        self.atraso = atraso  # Simula um backend lento (segundos por requisição)
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(servidor.atraso)
+                if self.path == "/crachas":
+                    corpo = {tag: i._asdict() for tag, i in servidor.crachas.items()}
+                elif self.path.startswith("/crachas/"):
+                    identidade = servidor.crachas.get(urllib.parse.unquote(self.path[9:]))
+                    if identidade is None:
+                        self.send_error(404)
+                        return
+                    corpo = identidade._asdict()
+                else:
+                    self.send_error(404)
+                    return
+                dados = json.dumps(corpo).encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", porta), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def iniciar(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def parar(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def criar_provedor(cfg, padrao):
+    """Cria o provedor configurado; padrao ({tag: Identidade}) inicializa arquivo/SQLite vazios"""
+    tipo = cfg.get("tipo", "memoria")
+    if tipo == "memoria":
+        return ProvedorMemoria(padrao)
+    if tipo == "arquivo":
+        return ProvedorArquivo(cfg.get("caminho", "crachas.json"), padrao)
+    if tipo == "sqlite":
+        return ProvedorSQLite(cfg.get("caminho", "crachas.db"), padrao)
+    if tipo == "http":
+        return ProvedorHTTP(cfg["url"], cfg.get("timeout", 2.0))
+    raise ValueError(f"Provedor de identidade desconhecido: {tipo}")
+
+
+# ---------------- CACHE ----------------
+
+class CacheIdentidade:
+    """LRU com TTL para crachás conhecidos e cache negativo para desconhecidos"""
+
+    def __init__(self, provedor, capacidade=2048, ttl=300.0, ttl_negativo=30.0,
+                 capacidade_negativa=4096, relogio=time.monotonic, executor=None, ttl_erro=10.0):
+        self.provedor = provedor
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self.ttl_erro = ttl_erro  # Sobrevida das entradas enquanto o provedor está fora
+        self.capacidade_negativa = capacidade_negativa
+        self.relogio = relogio
+        self.executor = executor  # ExecutorIO; None = consulta o provedor na hora (scripts)
+        self.lock = threading.Lock()
+        self.positivos = OrderedDict()  # tag -> (Identidade, vence)
+        self.negativos = OrderedDict()  # tag -> vence
+        self.consultando = {}  # tag -> [ao_resolver] das buscas que esperam o provedor
+        self.acertos = 0
+        self.acertos_negativos = 0
+        self.consultas_provedor = 0
+        self.respostas_vencidas = 0  # Entradas vencidas devolvidas (atualizadas em segundo plano)
+        self.erros_provedor = 0
+
+    def buscar(self, tag, ao_resolver=None):
+        """Retorna a Identidade do crachá, None se não estiver cadastrado ou PENDENTE
+
+        PENDENTE só com executor, para um crachá fora do cache: ao_resolver
+        (identidade ou None) é chamado na thread da interface quando o
+        provedor responder.
+        """
+        agora = self.relogio()
+        with self.lock:
+            entrada = self.positivos.get(tag)
+            if entrada is not None:
+                self.positivos.move_to_end(tag)
+                if agora < entrada[1]:
+                    self.acertos += 1
+                    return entrada[0]
+            vence = self.negativos.get(tag)
+            if vence is not None and agora < vence:
+                self.acertos_negativos += 1
+                return None
+            if self.executor is not None:
+                esperando = self.consultando.get(tag)
+                if esperando is None:
+                    esperando = self.consultando[tag] = []
+                    self.executor.enviar('identidade', self._consultar, tag,
+                                         ao_concluir=lambda identidade: self._resolver(tag, identidade),
+                                         ao_falhar=lambda e: self._falhou(tag, e))
+                if entrada is not None or vence is not None:
+                    # Vencida (positiva ou negativa): serve agora, atualiza em segundo plano
+                    self.respostas_vencidas += 1
+                    return None if entrada is None else entrada[0]
+                if ao_resolver is not None:
+                    esperando.append(ao_resolver)
+                return PENDENTE
+        return self._consultar(tag)
+
+    def _consultar(self, tag):
+        """Consulta o provedor e atualiza o cache (na thread de I/O, com executor)"""
+        with self.lock:
+            self.consultas_provedor += 1
+        try:
+            identidade = self.provedor.buscar(tag)
+        except ErroProvedor as e:
+            print(f"Provedor de identidade indisponível: {e}")
+            vence = self.relogio() + self.ttl_erro
+            with self.lock:
+                self.erros_provedor += 1
+                entrada = self.positivos.get(tag)
+                if entrada is not None:
+                    self.positivos[tag] = (entrada[0], vence)
+                    if self.executor is None:
+                        self.respostas_vencidas += 1
+                    return entrada[0]
+                self._guardar(self.negativos, tag, vence, self.capacidade_negativa)
+            return None
+        agora = self.relogio()
+        with self.lock:
+            if identidade is None:
+                self.positivos.pop(tag, None)
+                self._guardar(self.negativos, tag, agora + self.ttl_negativo, self.capacidade_negativa)
+            else:
+                self.negativos.pop(tag, None)
+                self._guardar(self.positivos, tag, (identidade, agora + self.ttl), self.capacidade)
+        return identidade
+
+    def _resolver(self, tag, identidade):
+        with self.lock:
+            esperando = self.consultando.pop(tag, [])
+        for ao_resolver in esperando:
+            ao_resolver(identidade)
+
+    def _falhou(self, tag, erro):
+        print(f"Erro ao consultar o crachá {tag}: {erro}")
+        self._resolver(tag, None)
+
+    def _guardar(self, mapa, chave, valor, capacidade):
+        mapa[chave] = valor
+        mapa.move_to_end(chave)
+        if len(mapa) > capacidade:
+            mapa.popitem(last=False)
+
+    def aquecer(self):
+        """Carrega todos os crachás do provedor no cache; retorna {tag: Identidade}"""
+        crachas = self.provedor.listar()
+        vence = self.relogio() + self.ttl
+        with self.lock:
+            for tag, identidade in crachas.items():
+                self.negativos.pop(tag, None)
+                self._guardar(self.positivos, tag, (identidade, vence), self.capacidade)
+        return crachas
+
+    def invalidar(self):
+        with self.lock:
+            self.positivos.clear()
+            self.negativos.clear()
+
+    def estatisticas(self):
+        return {
+            "acertos": self.acertos,
+            "acertos_negativos": self.acertos_negativos,
+            "consultas_provedor": self.consultas_provedor,
+            "respostas_vencidas": self.respostas_vencidas,
+            "erros_provedor": self.erros_provedor,
+            "em_cache": len(self.positivos),
+            "negativos": len(self.negativos),
+        }
+
+
+def medir_cache(n_crachas=500, consultas=20000, atraso=0.02, ttl=0.05):
+    """Mede buscas com cache contra um provedor HTTP local lento, e depois fora do ar
+
+    O TTL curto faz as entradas vencerem durante a medição: com o executor,
+    elas continuam sendo servidas na hora e atualizadas em segundo plano.
+    Na segunda fase o servidor para; nenhuma busca espera o timeout.
+    """
+    import random
+    from executor_io import ExecutorIO
+    rnd = random.Random(1)
+    crachas = {f"{rnd.getrandbits(32):08X}": Identidade(f"Operador {i}", 'operador')
+               for i in range(n_crachas)}
+    servidor = ServidorCrachasLocal(crachas, atraso=atraso).iniciar()
+    executor = ExecutorIO(2)
+    cache = CacheIdentidade(ProvedorHTTP(servidor.url), ttl=ttl, ttl_negativo=ttl, executor=executor)
+    cache.aquecer()
+    desconhecidos = [f"{rnd.getrandbits(32):08X}" for _ in range(20)]
+    tags = list(crachas)
+    for tag in desconhecidos:
+        assert cache.buscar(tag) is PENDENTE  # Primeira consulta vai ao provedor; depois, cache negativo
+    executor.esperar()
+    resultados = {"atraso_provedor_ms": atraso * 1000}
+    for fase in ("provedor_lento", "provedor_fora"):
+        tempos = []
+        for _ in range(consultas):
+            tag = rnd.choice(desconhecidos) if rnd.random() < 0.1 else rnd.choice(tags)
+            inicio = time.perf_counter()
+            identidade = cache.buscar(tag)
+            tempos.append(time.perf_counter() - inicio)
+            assert identidade == crachas.get(tag)  # Vencida ou não, nunca PENDENTE depois de vista
+        tempos.sort()
+        resultados[f"{fase}_p50_us"] = round(tempos[len(tempos) // 2] * 1e6, 1)
+        resultados[f"{fase}_p99_us"] = round(tempos[int(len(tempos) * 0.99)] * 1e6, 1)
+        resultados[f"{fase}_max_ms"] = round(tempos[-1] * 1000, 2)
+        resultados[f"{fase}_cache"] = cache.estatisticas()
+        if fase == "provedor_lento":
+            executor.esperar()
+            servidor.parar()
+            time.sleep(ttl)  # Tudo vence com o provedor fora
+    executor.parar(timeout=10)
+    return resultados
+
+
+if __name__ == "__main__":
+    print(f"Cache de identidade: {medir_cache()}")
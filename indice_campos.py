@@ -0,0 +1,262 @@
+import csv
+import json
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+
+# ---------------- ÍNDICES POR CAMPO DO HISTÓRICO ----------------
+# Para cada CSV do histórico, listas de linhas (posting lists) por valor de
+# Nome, Área, Peça e Modelo. A linha é identificada pela posição em bytes
+# dela no CSV, que cresce com o arquivo: as listas já ficam ordenadas e
+# filtros com vários campos são a interseção delas, sem ler as linhas. Só as
+# linhas do resultado são decodificadas (via mmap).
+#
+# No disco, ao lado do CSV:
+#   <arquivo>.valores  uma linha JSON [campo, valor] por valor novo; o id do
+#                      valor é a ordem em que ele aparece para o campo
+#   <arquivo>.campos   um registro fixo por linha do CSV: posição + id de
+#                      cada campo
+# Os dois só crescem. As listas ficam em memória e são montadas a partir dos
+# registros ao abrir; registros além do fim do CSV (queda de energia) são
+# descartados e, se os arquivos faltarem ou não baterem, o índice é refeito
+# a partir do CSV.
+
+CAMPOS = {"nome": 1, "area": 2, "peca": 3, "modelo": 5}  # Campo -> coluna do CSV
+
+
+def _caminhos(caminho_csv):
+    return caminho_csv + '.valores', caminho_csv + '.campos'
+
+
+class IndiceCampos:
+    """Posting lists por valor dos campos de um CSV do histórico"""
+
+    def __init__(self, caminho_csv, campos=CAMPOS):
+        self.caminho_csv = caminho_csv
+        self.campos = campos
+        self.caminho_valores, self.caminho_registros = _caminhos(caminho_csv)
+        self.registro = struct.Struct('<Q' + 'I' * len(campos))
+        self.arquivo_valores = None
+        self.arquivo_registros = None
+        self._limpar()
+
+    def _limpar(self):
+        self.ids = {campo: {} for campo in self.campos}  # campo -> valor -> id
+        self.listas = {campo: [] for campo in self.campos}  # campo -> [array de posições por id]
+        self.linhas = 0
+
+    def abrir(self, tamanho_csv, somente_leitura=False):
+        """Carrega o índice do disco (refazendo-o se preciso); retorna self"""
+        if not self._carregar(tamanho_csv, truncar=not somente_leitura):
+            self._refazer(tamanho_csv)
+        if not somente_leitura:
+            self.arquivo_valores = open(self.caminho_valores, 'a', encoding='utf-8')
+            self.arquivo_registros = open(self.caminho_registros, 'ab')
+        return self
+
+    def _carregar(self, tamanho_csv, truncar=True):
+        self._limpar()
+        if not (os.path.exists(self.caminho_valores) and os.path.exists(self.caminho_registros)):
+            return tamanho_csv == 0 and self._criar()
+        try:
+            with open(self.caminho_valores, 'r', encoding='utf-8') as f:
+                for linha in f:
+                    if not linha.endswith('\n'):
+                        break  # Valor cortado: os registros que o usam também não chegaram
+                    campo, valor = json.loads(linha)
+                    self._novo_id(campo, valor)
+        except (ValueError, KeyError) as e:
+            print(f"Índice de campos de {self.caminho_csv} inválido ({e}); refazendo")
+            return False
+        with open(self.caminho_registros, 'r+b') as f:
+            dados = f.read()
+            n = len(dados) // self.registro.size
+            colunas = list(zip(*self.registro.iter_unpack(dados[:n * self.registro.size]))) or [()]
+            posicoes = colunas[0]
+            validos = bisect_left(posicoes, tamanho_csv)  # Posições crescem com o arquivo
+            posicoes = posicoes[:validos]
+            for campo, ids in zip(self.campos, colunas[1:]):
+                listas = self.listas[campo]
+                if validos and max(ids[:validos]) >= len(listas):
+                    return False
+                for posicao, valor_id in zip(posicoes, ids):
+                    listas[valor_id].append(posicao)
+            if truncar:
+                f.truncate(validos * self.registro.size)
+        self.linhas = validos
+        return True
+
+    def _criar(self):
+        open(self.caminho_valores, 'w').close()
+        open(self.caminho_registros, 'wb').close()
+        return True
+
+    def _refazer(self, tamanho_csv):
+        self._limpar()
+        self._criar()
+        self.arquivo_valores = open(self.caminho_valores, 'a', encoding='utf-8')
+        self.arquivo_registros = open(self.caminho_registros, 'ab')
+        try:
+            if tamanho_csv:
+                with open(self.caminho_csv, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                    posicao = mapa.find(b'\n') + 1  # Pula o cabeçalho
+                    while 0 < posicao < tamanho_csv:
+                        fim = mapa.find(b'\n', posicao, tamanho_csv)
+                        if fim < 0:
+                            break
+                        linha = next(csv.reader([mapa[posicao:fim + 1].decode('utf-8', 'replace')]), [])
+                        if len(linha) > max(self.campos.values()):
+                            self.anotar(posicao, linha)
+                        posicao = fim + 1
+        finally:
+            self.fechar()
+
+    def _novo_id(self, campo, valor):
+        self.ids[campo][valor] = len(self.listas[campo])
+        self.listas[campo].append(array('Q'))
+        return self.ids[campo][valor]
+
+    def anotar(self, posicao, linha):
+        """Acrescenta a linha do CSV que começa em posicao"""
+        ids = []
+        for campo, coluna in self.campos.items():
+            valor = str(linha[coluna])
+            valor_id = self.ids[campo].get(valor)
+            if valor_id is None:
+                valor_id = self._novo_id(campo, valor)
+                self.arquivo_valores.write(json.dumps([campo, valor], ensure_ascii=False) + '\n')
+            self.listas[campo][valor_id].append(posicao)
+            ids.append(valor_id)
+        self.arquivo_registros.write(self.registro.pack(posicao, *ids))
+        self.linhas += 1
+
+    def buscar(self, filtros, de=0, ate=None):
+        """Posições das linhas com todos os filtros {campo: valor}, entre de e ate (bytes)"""
+        listas = []
+        for campo, valor in filtros.items():
+            valor_id = self.ids[campo].get(valor)
+            if valor_id is None:
+                return []
+            listas.append(self.listas[campo][valor_id])
+        listas.sort(key=len)
+        menor = listas[0]
+        inicio = bisect_left(menor, de)
+        fim = len(menor) if ate is None else bisect_left(menor, ate)
+        candidatas = menor[inicio:fim]
+        for outra in listas[1:]:
+            if not candidatas:
+                break
+            if len(candidatas) * 16 < len(outra):
+                # Poucas candidatas: busca binária de cada uma na lista maior
+                candidatas = [p for p in candidatas if _contem(outra, p)]
+            else:
+                candidatas = sorted(set(candidatas).intersection(outra))
+        return list(candidatas)
+
+    def descarregar(self):
+        # Valores antes dos registros que os usam
+        if self.arquivo_valores is not None:
+            self.arquivo_valores.flush()
+            self.arquivo_registros.flush()
+
+    def fechar(self):
+        if self.arquivo_valores is not None:
+            self.arquivo_valores.close()
+            self.arquivo_registros.close()
+            self.arquivo_valores = self.arquivo_registros = None
+
+    def memoria(self):
+        """Bytes das posting lists"""
+        return sum(lista.itemsize * len(lista) for listas in self.listas.values() for lista in listas)
+
+
+def _contem(lista, posicao):
+    i = bisect_left(lista, posicao)
+    return i < len(lista) and lista[i] == posicao
+
+
+def renomear(caminho_csv, destino_csv):
+    """Renomeia os arquivos do índice junto com o CSV (rotação)"""
+    for origem, destino in zip(_caminhos(caminho_csv), _caminhos(destino_csv)):
+        if os.path.exists(origem):
+            os.replace(origem, destino)
+
+
+def remover(caminho_csv):
+    """Apaga os arquivos do índice de um CSV que deixou de existir"""
+    for caminho in _caminhos(caminho_csv):
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+
+def ler_posicoes(caminho_csv, posicoes):
+    """Gera as linhas (listas do csv) que começam nas posições dadas"""
+    if not posicoes:
+        return
+    with open(caminho_csv, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+        yield from csv.reader(mapa[posicao:mapa.find(b'\n', posicao) + 1].decode('utf-8', 'replace')
+                              for posicao in posicoes)
+
+
+def medir_indice_campos(linhas=2_000_000, rotacao_bytes=10 * 1024 * 1024):
+    """Consultas de auditoria: leitura completa do histórico x posting lists"""
+    import random
+    import tempfile
+    import time
+    from datetime import datetime, timedelta
+    from armazenamento import CABECALHO_CSV, ArmazenamentoArquivos, _filtrar, ler_reposicoes_csv
+    rnd = random.Random(1)
+    operadores = [f"Operador {i}" for i in range(200)]
+    resultados = {"linhas": linhas}
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "reposicoes.csv")
+        estoques = {m: {f"A{i}": {"peca": f"Peça {i}", "quantidade": 0, "minimo": 0} for i in range(1, 7)}
+                    for m in ("313", "314")}
+        armazenamento = ArmazenamentoArquivos(estoques, caminho, os.path.join(pasta, "estoque.diario"),
+                                              os.path.join(pasta, "estoque_temp_{modelo}.json"),
+                                              opcoes_historico={"fsync_a_cada": 0, "fsync_ms": None,
+                                                                "rotacao_bytes": rotacao_bytes})
+        momento = datetime(2025, 1, 1)
+        passo = timedelta(seconds=max(1, 365 * 86400 // linhas))
+        lote = []
+        inicio = time.perf_counter()
+        for i in range(linhas):
+            area = rnd.randrange(1, 7)
+            lote.append([momento.strftime("%Y-%m-%d %H:%M:%S"), rnd.choice(operadores), f"A{area}",
+                         f"Peça {area}", rnd.randint(1, 5), rnd.choice(("313", "314"))])
+            momento += passo
+            if len(lote) == 10000:
+                armazenamento.historico.escrever_varias(lote)
+                lote = []
+        armazenamento.historico.escrever_varias(lote)
+        armazenamento.historico.descarregar()
+        resultados["escrita_linhas_s"] = round(linhas / (time.perf_counter() - inicio))
+
+        consultas = {
+            "operador_no_mes": {"nome": "Operador 7", "inicio": "2025-06-01", "fim": "2025-07-01"},
+            "area_modelo": {"area": "A4", "modelo": "313"},
+            "operador_area_modelo": {"nome": "Operador 7", "area": "A4", "modelo": "313"},
+        }
+        for nome, filtros in consultas.items():
+            inicio = time.perf_counter()
+            completa = [l for l in ler_reposicoes_csv(caminho) if _filtrar(l, filtros.get("inicio"),
+                        filtros.get("fim"), filtros.get("nome"), filtros.get("area"), filtros.get("modelo"))]
+            resultados[f"{nome}_leitura_completa_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+            # 1ª vez carrega do disco os índices dos arquivos rotacionados; 2ª já os tem em memória
+            for vez in ("indice_frio_ms", "indice_ms"):
+                inicio = time.perf_counter()
+                indexada = armazenamento.consultar_reposicoes(**filtros)
+                resultados[f"{nome}_{vez}"] = round((time.perf_counter() - inicio) * 1000, 1)
+                assert indexada == completa
+            resultados[f"{nome}_linhas"] = len(indexada)
+        indices = list(armazenamento.indices_campos.values()) + [armazenamento.historico.indice_campos]
+        resultados["memoria_indices_mb"] = round(sum(indice.memoria() for indice in indices) / 1e6, 1)
+        armazenamento.fechar()
+    return resultados
+
+
+if __name__ == "__main__":
+    for n in (100_000, 2_000_000):
+        print(f"Índices por campo: {medir_indice_campos(n)}")
@@ -0,0 +1,270 @@
+import csv
+import mmap
+import os
+import struct
+
+# ---------------- ÍNDICE DE TEMPO DO HISTÓRICO ----------------
+# Ao lado de cada CSV do histórico fica um <arquivo>.idx com uma entrada a
+# cada 'a_cada' linhas: (data/hora da linha, posição em bytes dela no CSV).
+# As entradas têm tamanho fixo, então a busca binária é feita direto no
+# arquivo mapeado (mmap), sem carregar o índice. Uma consulta por período
+# acha no índice o trecho do CSV que pode ter linhas do período e decodifica
+# só esse trecho, também via mmap: a memória usada não depende do tamanho
+# do arquivo.
+#
+# O índice vale enquanto as datas do CSV estão em ordem. Se uma linha chega
+# com data menor que a anterior (relógio ajustado para trás), o índice é
+# marcado como fora de ordem e as consultas naquele arquivo leem o arquivo
+# inteiro (continuam certas, só mais lentas).
+
+MAGICO = b'IDXTEMPO'
+VERSAO_INDICE = 1
+CABECALHO = struct.Struct('<8sBB6x')  # mágico, versão, flags
+ENTRADA = struct.Struct('<19sQ')  # "AAAA-MM-DD HH:MM:SS", posição no CSV
+FORA_DE_ORDEM = 0x01
+
+
+def caminho_indice(caminho_csv):
+    return caminho_csv + '.idx'
+
+
+def _chave(data_hora):
+    return str(data_hora)[:19].encode('ascii', 'replace').ljust(19)
+
+
+class IndiceTempo:
+    """Escrita do índice esparso de um CSV do histórico (usado pelo EscritorHistorico)"""
+
+    def __init__(self, caminho_csv, a_cada=128):
+        self.caminho = caminho_indice(caminho_csv)
+        self.a_cada = a_cada
+        self.arquivo = None
+        self.flags = 0
+        self.desde_ultima = 0  # Linhas desde a última entrada
+        self.ultima_chave = None  # Data/hora da última linha anotada
+        self.entradas = 0
+
+    def abrir(self, tamanho_csv):
+        """Abre (ou cria) o índice, descartando entradas além do fim do CSV
+
+        Retorna False se o índice não existia ou não serve e precisa ser refeito.
+        """
+        valido = self._conferir(tamanho_csv)
+        if not valido:
+            with open(self.caminho, 'wb') as f:
+                f.write(CABECALHO.pack(MAGICO, VERSAO_INDICE, 0))
+            self.flags = 0
+            self.entradas = 0
+            self.ultima_chave = None
+        self.arquivo = open(self.caminho, 'r+b')
+        self.arquivo.seek(0, os.SEEK_END)
+        self.desde_ultima = self.a_cada  # A próxima linha sempre ganha entrada
+        return valido
+
+    def _conferir(self, tamanho_csv):
+        if not os.path.exists(self.caminho):
+            return False
+        with open(self.caminho, 'r+b') as f:
+            cabecalho = f.read(CABECALHO.size)
+            if len(cabecalho) < CABECALHO.size:
+                return False
+            magico, versao, flags = CABECALHO.unpack(cabecalho)
+            if magico != MAGICO or versao != VERSAO_INDICE:
+                return False
+            tamanho = os.fstat(f.fileno()).st_size
+            n = (tamanho - CABECALHO.size) // ENTRADA.size
+            # Entradas de linhas que não chegaram ao CSV (queda de energia) saem
+            while n > 0:
+                f.seek(CABECALHO.size + (n - 1) * ENTRADA.size)
+                chave, posicao = ENTRADA.unpack(f.read(ENTRADA.size))
+                if posicao < tamanho_csv:
+                    break
+                n -= 1
+            f.truncate(CABECALHO.size + n * ENTRADA.size)
+        self.flags = flags
+        self.entradas = n
+        self.ultima_chave = chave if n else None
+        return True
+
+    def anotar(self, data_hora, posicao):
+        """Registra que a linha com essa data/hora começa em posicao no CSV"""
+        chave = _chave(data_hora)
+        if self.ultima_chave is not None and chave < self.ultima_chave and not self.flags & FORA_DE_ORDEM:
+            self.flags |= FORA_DE_ORDEM
+            self.arquivo.seek(0)
+            self.arquivo.write(CABECALHO.pack(MAGICO, VERSAO_INDICE, self.flags))
+            self.arquivo.seek(0, os.SEEK_END)
+        self.ultima_chave = chave
+        self.desde_ultima += 1
+        if self.desde_ultima >= self.a_cada:
+            self.arquivo.write(ENTRADA.pack(chave, posicao))
+            self.entradas += 1
+            self.desde_ultima = 0
+
+    def descarregar(self, fsync=False):
+        self.arquivo.flush()
+        if fsync:
+            os.fsync(self.arquivo.fileno())
+
+    def fechar(self):
+        if self.arquivo is not None:
+            self.arquivo.close()
+            self.arquivo = None
+
+
+def _linhas(mapa, inicio, fim):
+    """(posição, bytes) de cada linha completa em mapa[inicio:fim]"""
+    while inicio < fim:
+        quebra = mapa.find(b'\n', inicio, fim)
+        if quebra < 0:
+            return  # Linha ainda sendo escrita
+        yield inicio, mapa[inicio:quebra + 1]
+        inicio = quebra + 1
+
+
+def indexar(caminho_csv, a_cada=128):
+    """Refaz o índice de um CSV inteiro (arquivos antigos ou índice perdido)"""
+    indice = IndiceTempo(caminho_csv, a_cada)
+    if os.path.exists(indice.caminho):
+        os.remove(indice.caminho)
+    tamanho = os.path.getsize(caminho_csv)
+    indice.abrir(tamanho)
+    try:
+        if tamanho:
+            with open(caminho_csv, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                primeira = True
+                for posicao, linha in _linhas(mapa, 0, tamanho):
+                    if primeira:
+                        primeira = False  # Cabeçalho
+                        continue
+                    indice.anotar(linha[:19].decode('ascii', 'replace'), posicao)
+    finally:
+        indice.fechar()
+    return indice
+
+
+def _trecho(caminho_csv, tamanho_csv, inicio, fim):
+    """(de, ate) em bytes do CSV que contém as linhas com data em [inicio, fim)
+
+    None se o índice não existir, não servir ou estiver fora de ordem.
+    """
+    caminho = caminho_indice(caminho_csv)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, 'rb') as f:
+        cabecalho = f.read(CABECALHO.size)
+        if len(cabecalho) < CABECALHO.size:
+            return None
+        magico, versao, flags = CABECALHO.unpack(cabecalho)
+        if magico != MAGICO or versao != VERSAO_INDICE or flags & FORA_DE_ORDEM:
+            return None
+        n = (os.fstat(f.fileno()).st_size - CABECALHO.size) // ENTRADA.size
+        if n == 0:
+            return 0, tamanho_csv
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            def entrada(i):
+                return ENTRADA.unpack_from(mapa, CABECALHO.size + i * ENTRADA.size)
+
+            def primeira_maior_ou_igual(chave):
+                baixo, alto = 0, n
+                while baixo < alto:
+                    meio = (baixo + alto) // 2
+                    if entrada(meio)[0] < chave:
+                        baixo = meio + 1
+                    else:
+                        alto = meio
+                return baixo
+
+            de = 0
+            if inicio is not None:
+                i = primeira_maior_ou_igual(_chave(inicio)) - 1
+                if i >= 0:
+                    de = entrada(i)[1]
+            ate = tamanho_csv
+            if fim is not None:
+                i = primeira_maior_ou_igual(_chave(fim))
+                if i < n:
+                    ate = min(entrada(i)[1], tamanho_csv)
+    return de, ate
+
+
+def trecho(caminho_csv, inicio=None, fim=None):
+    """(de, ate) em bytes do CSV onde podem estar as linhas com data em [inicio, fim)"""
+    tamanho = os.path.getsize(caminho_csv)
+    if tamanho == 0 or (inicio is None and fim is None):
+        return 0, tamanho
+    return _trecho(caminho_csv, tamanho, inicio, fim) or (0, tamanho)
+
+
+def ler_intervalo(caminho_csv, inicio=None, fim=None):
+    """Gera as linhas (listas do csv) com data_hora em [inicio, fim), lendo só o trecho indexado"""
+    try:
+        de, ate = trecho(caminho_csv, inicio, fim)
+    except FileNotFoundError:
+        return
+    if de >= ate:
+        return
+    chave_inicio = None if inicio is None else _chave(inicio)
+    chave_fim = None if fim is None else _chave(fim)
+    with open(caminho_csv, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+        for _, linha in _linhas(mapa, de, ate):
+            chave = linha[:19].ljust(19)
+            if chave_inicio is not None and chave < chave_inicio:
+                continue
+            if chave_fim is not None and chave >= chave_fim:
+                continue
+            yield next(csv.reader([linha.decode('utf-8', 'replace')]))
+
+
+def medir_indice(linhas=2_000_000, a_cada=128):
+    """Consulta de um dia num histórico grande: leitura completa x índice de tempo + mmap"""
+    import tempfile
+    import time
+    import tracemalloc
+    from datetime import datetime, timedelta
+    from historico import EscritorHistorico
+    cabecalho = ["Data/Hora", "Nome", "Área", "Peça", "Quantidade", "Modelo"]
+    resultados = {"linhas": linhas}
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "reposicoes.csv")
+        escritor = EscritorHistorico(caminho, cabecalho, fsync_a_cada=0, fsync_ms=None, indice_a_cada=a_cada)
+        momento = datetime(2024, 1, 1)
+        passo = timedelta(seconds=max(1, 365 * 86400 // linhas))
+        lote = []
+        for i in range(linhas):
+            lote.append([momento.strftime("%Y-%m-%d %H:%M:%S"), f"Operador {i % 50}", f"A{i % 6 + 1}",
+                         f"Peça {i % 6 + 1}", 1 + i % 10, "313" if i % 2 else "314"])
+            momento += passo
+            if len(lote) == 10000:
+                escritor.escrever_varias(lote)
+                lote = []
+        escritor.escrever_varias(lote)
+        escritor.fechar()
+        resultados["tamanho_mb"] = round(os.path.getsize(caminho) / 1e6, 1)
+        resultados["indice_kb"] = round(os.path.getsize(caminho_indice(caminho)) / 1e3, 1)
+
+        # "Tudo que saiu da A3 na terça passada"
+        inicio, fim = "2024-06-04", "2024-06-05"
+        t0 = time.perf_counter()
+        with open(caminho, newline='', encoding='utf-8') as f:
+            completa = [l for l in csv.reader(f) if inicio <= l[0] < fim and l[2] == "A3"]
+        resultados["leitura_completa_ms"] = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        indexada = [l for l in ler_intervalo(caminho, inicio, fim) if l[2] == "A3"]
+        resultados["indice_ms"] = (time.perf_counter() - t0) * 1000
+        assert indexada == completa
+
+        # Memória da consulta em si (sem guardar as linhas): não cresce com o arquivo
+        tracemalloc.start()
+        for _ in ler_intervalo(caminho, inicio, fim):
+            pass
+        resultados["indice_pico_memoria_kb"] = round(tracemalloc.get_traced_memory()[1] / 1e3, 1)
+        tracemalloc.stop()
+        resultados["linhas_encontradas"] = len(indexada)
+    return resultados
+
+
+if __name__ == "__main__":
+    for n in (100_000, 2_000_000):
+        print(f"Índice de tempo: {medir_indice(n)}")
@@ -0,0 +1,285 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+
+from protocolo import DecodificadorLinhas, criar_decodificador
+from transportes import TransportePty
+
+# ---------------- LEITOR SERIAL ----------------
+# A thread do leitor fica bloqueada em read() até chegar algum byte
+# (timeout=None na porta), então não consome CPU com o quiosque ocioso.
+# Os bytes passam pelo decodificador do protocolo (linhas de texto ou
+# quadros binários, ver protocolo.py) e cada tag completa vai para uma fila limitada junto com o instante em
+# que chegou pelo fio, para medir a latência até o processar_rfid.
+# Vários leitores (um por estação) podem alimentar a mesma fila; cada
+# leitura carrega o ID do leitor que a produziu.
+
+TAMANHO_FILA = 256
+
+Leitura = namedtuple('Leitura', ['leitor', 'tag', 't_fio'])
+
+
+class MedidorLatencia:
+    """Acumula amostras de latência (em segundos) e calcula percentis"""
+
+    def __init__(self, capacidade=10000):
+        self.amostras = deque(maxlen=capacidade)
+        self.lock = threading.Lock()
+
+    def registrar(self, segundos):
+        with self.lock:
+            self.amostras.append(segundos)
+
+    def percentil(self, p):
+        """Retorna o percentil p (0-100) em milissegundos"""
+        with self.lock:
+            ordenadas = sorted(self.amostras)
+        if not ordenadas:
+            return 0.0
+        indice = min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))
+        return ordenadas[indice] * 1000
+
+    def resumo(self):
+        """Retorna contagem, p50, p99 e máximo (ms)"""
+        with self.lock:
+            n = len(self.amostras)
+            maximo = max(self.amostras) * 1000 if n else 0.0
+        return {"n": n, "p50": self.percentil(50), "p99": self.percentil(99), "max": maximo}
+
+
+class LeitorSerial(threading.Thread):
+    """Lê a porta de forma bloqueante e entrega as tags decodificadas na fila"""
+
+    def __init__(self, porta, fila, abrir_porta=None, ao_receber=None, leitor_id=None,
+                 decodificador=None, verboso=True):
+        super().__init__(daemon=True, name=f"leitor-{leitor_id}")
+        self.leitor_id = leitor_id
+        self.porta = porta
+        self.fila = fila
+        self.abrir_porta = abrir_porta  # Usada para reconectar após erro
+        self.ao_receber = ao_receber  # Avisa o consumidor (ex.: root.after)
+        self.decodificador = decodificador or DecodificadorLinhas()
+        self.verboso = verboso  # Imprime cada tag lida (desligar em testes de carga)
+        self.running = True
+        self.descartadas = 0
+
+    def run(self):
+        while self.running:
+            try:
+                if self.porta is None:
+                    raise OSError("porta não conectada")
+                # Bloqueia até chegar ao menos 1 byte; lê o que já estiver disponível
+                dados = self.porta.read(self.porta.in_waiting or 1)
+                if not dados:
+                    continue
+                t_fio = time.perf_counter()
+                self._entregar(self.decodificador.decodificar(dados), t_fio)
+            except OSError as e:
+                if not self.running:
+                    break
+                print(f"Erro na serial [{self.leitor_id}]: {e}")
+                self._reconectar()
+
+    def _entregar(self, tags, t_fio):
+        """Envia as tags decodificadas para a fila e avisa o consumidor"""
+        entregou = False
+        for tag in tags:
+            if self.verboso:
+                print(f"RFID lido [{self.leitor_id}]: {tag}")
+            try:
+                self.fila.put_nowait(Leitura(self.leitor_id, tag, t_fio))
+                entregou = True
+            except queue.Full:
+                self.descartadas += 1
+                print(f"Fila de leituras cheia, descartando: {tag}")
+        if entregou and self.ao_receber:
+            self.ao_receber()
+
+    def _reconectar(self):
+        """Fecha a porta e tenta abrir novamente após 2 segundos"""
+        self.decodificador.reiniciar()
+        try:
+            if self.porta:
+                self.porta.close()
+        except Exception:
+            pass
+        self.porta = None
+        time.sleep(2)
+        if not self.running or not self.abrir_porta:
+            return
+        try:
+            self.porta = self.abrir_porta()
+            print(f"Leitor {self.leitor_id} reconectado")
+        except Exception:
+            print(f"Falha ao reconectar o leitor {self.leitor_id}")
+
+    def enviar(self, dados):
+        """Envia dados do host para o leitor (comandos da lista de autorizados)"""
+        if self.porta is None:
+            raise OSError(f"leitor {self.leitor_id} desconectado")
+        self.porta.write(dados)
+
+    def parar(self):
+        """Encerra a thread, desbloqueando a leitura pendente"""
+        self.running = False
+        if self.porta is None:
+            return
+        try:
+            if hasattr(self.porta, 'cancel_read'):
+                self.porta.cancel_read()
+            self.porta.close()
+        except Exception:
+            pass
+
+
+def drenar_fila(fila, processar):
+    """Consome todas as leituras pendentes chamando processar(tag, t_fio, leitor)"""
+    while True:
+        try:
+            leitura = fila.get_nowait()
+        except queue.Empty:
+            return
+        processar(leitura.tag, leitura.t_fio, leitura.leitor)
+
+
+# ---------------- SERVIÇO DE INGESTÃO ----------------
+
+def carregar_config_leitores(caminho, padrao):
+    """Lê a lista de leitores ({"id", "porta", "baud", "protocolo"}) do arquivo JSON, se existir"""
+    if not os.path.exists(caminho):
+        return padrao
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            leitores = json.load(f)
+        ids = [cfg["id"] for cfg in leitores]
+        if len(ids) != len(set(ids)):
+            raise ValueError("IDs de leitor repetidos")
+        return leitores
+    except Exception as e:
+        print(f"Erro ao carregar {caminho}: {e}. Usando configuração padrão.")
+        return padrao
+
+
+class ServicoIngestao:
+    """Abre um LeitorSerial por porta configurada, todos numa fila compartilhada"""
+
+    def __init__(self, config_leitores, abrir_porta, ao_receber=None, tamanho_fila=TAMANHO_FILA,
+                 protocolo_padrao='texto', verboso=True):
+        self.config_leitores = config_leitores
+        self.abrir_porta = abrir_porta  # abrir_porta(cfg) -> objeto porta
+        self.ao_receber = ao_receber
+        self.protocolo_padrao = protocolo_padrao
+        self.verboso = verboso
+        self.fila = queue.Queue(maxsize=tamanho_fila)
+        self.leitores = {}
+
+    def iniciar(self):
+        """Abre as portas e inicia uma thread por leitor; retorna os IDs conectados"""
+        for cfg in self.config_leitores:
+            leitor_id = cfg["id"]
+            origem = cfg.get("porta") or cfg.get("transporte", "serial")
+            try:
+                porta = self.abrir_porta(cfg)
+            except OSError as e:
+                print(f"Não foi possível abrir o leitor {leitor_id} ({origem}): {e}")
+                continue
+            decodificador = criar_decodificador(cfg.get("protocolo", self.protocolo_padrao))
+            leitor = LeitorSerial(porta, self.fila,
+                                  abrir_porta=lambda c=cfg: self.abrir_porta(c),
+                                  ao_receber=self.ao_receber, leitor_id=leitor_id,
+                                  decodificador=decodificador, verboso=self.verboso)
+            leitor.start()
+            self.leitores[leitor_id] = leitor
+            print(f"Leitor {leitor_id} conectado ({origem})")
+        return list(self.leitores)
+
+    def descartadas(self):
+        """Total de leituras descartadas por fila cheia, por leitor"""
+        return {leitor_id: leitor.descartadas for leitor_id, leitor in self.leitores.items()}
+
+    def estatisticas_protocolo(self):
+        """Contadores dos decodificadores binários (quadros/s, erros de CRC...)"""
+        return {leitor_id: leitor.decodificador.estatisticas()
+                for leitor_id, leitor in self.leitores.items()
+                if hasattr(leitor.decodificador, 'estatisticas')}
+
+    def parar(self):
+        for leitor in self.leitores.values():
+            leitor.parar()
+        self.leitores = {}
+
+
+# ---------------- MEDIÇÃO COM PORTA FALSA ----------------
+
+def medir_latencia(total=2000, intervalo=0.001):
+    """Mede a latência fio→consumidor usando um pseudo-terminal como porta"""
+    porta = TransportePty()
+    fila = queue.Queue(maxsize=TAMANHO_FILA)
+    medidor = MedidorLatencia()
+    enviados = {}
+
+    leitor = LeitorSerial(porta, fila, verboso=False)
+    leitor.start()
+
+    # CPU gasta pela thread do leitor com a porta ociosa
+    cpu_inicio = time.process_time()
+    time.sleep(0.5)
+    cpu_ocioso = time.process_time() - cpu_inicio
+
+    def consumir():
+        recebidos = 0
+        while recebidos < total:
+            leitura = fila.get()
+            medidor.registrar(time.perf_counter() - enviados[leitura.tag])
+            recebidos += 1
+
+    consumidor = threading.Thread(target=consumir, daemon=True)
+    consumidor.start()
+    for i in range(total):
+        tag = f"{i:08X}"
+        enviados[tag] = time.perf_counter()
+        porta.injetar(tag.encode() + b'\r\n')
+        time.sleep(intervalo)
+    consumidor.join(timeout=5)
+    leitor.parar()
+    return cpu_ocioso, medidor.resumo()
+
+
+def medir_ingestao(n_leitores=8, por_leitor=500):
+    """Mede vazão e latência com vários leitores falsos numa única fila"""
+    portas = {f"estacao{i + 1}": TransportePty() for i in range(n_leitores)}
+    servico = ServicoIngestao([{"id": leitor_id} for leitor_id in portas],
+                              abrir_porta=lambda cfg: portas[cfg["id"]],
+                              tamanho_fila=n_leitores * por_leitor, verboso=False)
+    servico.iniciar()
+    medidor = MedidorLatencia()
+    por_estacao = {leitor_id: 0 for leitor_id in portas}
+
+    def enviar(porta):
+        for i in range(por_leitor):
+            porta.injetar(f"{i:08X}|{time.perf_counter()!r}\n".encode())
+
+    inicio = time.perf_counter()
+    escritores = [threading.Thread(target=enviar, args=(p,)) for p in portas.values()]
+    for t in escritores:
+        t.start()
+    for _ in range(n_leitores * por_leitor):
+        leitura = servico.fila.get(timeout=5)
+        medidor.registrar(time.perf_counter() - float(leitura.tag.split('|')[1]))
+        por_estacao[leitura.leitor] += 1
+    duracao = time.perf_counter() - inicio
+    servico.parar()
+    return n_leitores * por_leitor / duracao, por_estacao, medidor.resumo()
+
+
+if __name__ == "__main__":
+    cpu_ocioso, resumo = medir_latencia()
+    print(f"CPU ociosa (0,5 s): {cpu_ocioso * 1000:.2f} ms")
+    print(f"Leituras: {resumo['n']} | p50: {resumo['p50']:.3f} ms | "
+          f"p99: {resumo['p99']:.3f} ms | max: {resumo['max']:.3f} ms")
+    vazao, por_estacao, resumo = medir_ingestao()
+    print(f"Ingestão com {len(por_estacao)} leitores: {vazao:.0f} leituras/s | "
+          f"p50: {resumo['p50']:.3f} ms | p99: {resumo['p99']:.3f} ms")
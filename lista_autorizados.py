@@ -0,0 +1,176 @@
+import queue
+import struct
+import time
+import zlib
+
+from protocolo import (
+    montar_quadro, crc16,
+    TIPO_ACK, TIPO_RESP_VERSAO,
+    TIPO_CMD_VERSAO, TIPO_CMD_LISTA_INICIO, TIPO_CMD_LISTA_BLOCO, TIPO_CMD_LISTA_FIM,
+)
+
+# ---------------- LISTA DE AUTORIZADOS NO LEITOR ----------------
+# O host envia ao firmware os hashes (FNV-1a de 32 bits dos bytes do UID)
+# dos crachás cadastrados, ordenados, para o leitor decidir o bip sozinho
+# com busca binária, sem ida e volta ao host. A versão da lista é o CRC32
+# dos hashes, então uma lista igual à que o leitor já tem não é reenviada.
+#
+# Sincronização (cada comando recebe um TIPO_ACK antes do próximo, porque o
+# buffer de recepção do Arduino é de só 64 bytes):
+#   CMD_VERSAO -> RESP_VERSAO; se diferente:
+#   LISTA_INICIO -> ACK, LISTA_BLOCO... -> ACK, LISTA_FIM -> ACK
+# O firmware grava no banco inativo da EEPROM e só troca de banco no FIM
+# com o CRC conferido, então uma transferência interrompida não apaga a
+# lista anterior.
+#
+# O ACK traz o tipo do comando e a versão (INICIO, FIM) ou o offset (BLOCO):
+# cada comando só aceita o ACK com os seus, e as respostas que sobraram são
+# descartadas antes de cada tentativa. Assim o ACK atrasado de uma
+# tentativa que venceu o timeout não passa pelo ACK da seguinte.
+
+CAPACIDADE_LISTA = 120  # Mesmo CAPACIDADE_LISTA do arduino.ino
+HASHES_POR_BLOCO = 7
+
+STATUS_OK = 0
+STATUS_CAPACIDADE = 1
+STATUS_CHECKSUM = 2
+STATUS_SEQUENCIA = 3
+
+NOMES_STATUS = {
+    STATUS_OK: "ok",
+    STATUS_CAPACIDADE: "lista maior que a capacidade do leitor",
+    STATUS_CHECKSUM: "checksum da lista não confere",
+    STATUS_SEQUENCIA: "bloco fora de ordem ou sem início",
+}
+
+
+class ErroSincronizacao(Exception):
+    pass
+
+
+def hash_tag(tag):
+    """FNV-1a 32 bits dos bytes do UID (mesmo cálculo do firmware)"""
+    h = 0x811C9DC5
+    for byte in bytes.fromhex(tag.strip()):
+        h = ((h ^ byte) * 0x01000193) & 0xFFFFFFFF
+    return h
+
+
+def montar_lista(tags):
+    """Hashes ordenados e sem repetição, prontos para a busca binária do leitor
+
+    Tags que não são o UID em hexadecimal ficam de fora (o leitor nunca as lê).
+    """
+    hashes = set()
+    for tag in tags:
+        try:
+            hashes.add(hash_tag(tag))
+        except ValueError:
+            print(f"Crachá {tag!r} não é um UID em hexadecimal; fora da lista do leitor")
+    hashes = sorted(hashes)
+    if len(hashes) > CAPACIDADE_LISTA:
+        raise ErroSincronizacao(f"{len(hashes)} crachás excedem a capacidade do leitor ({CAPACIDADE_LISTA})")
+    return hashes
+
+
+def empacotar(hashes):
+    return struct.pack(f'<{len(hashes)}I', *hashes)
+
+
+def versao_lista(hashes):
+    return zlib.crc32(empacotar(hashes))
+
+
+def quadros_lista(hashes, versao, seq=0):
+    """Quadros INICIO, BLOCO... e FIM para enviar a lista ao leitor"""
+    quadros = [montar_quadro(TIPO_CMD_LISTA_INICIO, seq, struct.pack('<IH', versao, len(hashes)))]
+    for offset in range(0, len(hashes), HASHES_POR_BLOCO):
+        seq += 1
+        bloco = hashes[offset:offset + HASHES_POR_BLOCO]
+        quadros.append(montar_quadro(TIPO_CMD_LISTA_BLOCO, seq, struct.pack('<H', offset) + empacotar(bloco)))
+    seq += 1
+    quadros.append(montar_quadro(TIPO_CMD_LISTA_FIM, seq, struct.pack('<IH', versao, crc16(empacotar(hashes)))))
+    return quadros
+
+
+def acks_lista(hashes, versao):
+    """(comando, versão ou offset) do ACK esperado para cada quadro de quadros_lista"""
+    return ([(TIPO_CMD_LISTA_INICIO, versao)]
+            + [(TIPO_CMD_LISTA_BLOCO, offset) for offset in range(0, len(hashes), HASHES_POR_BLOCO)]
+            + [(TIPO_CMD_LISTA_FIM, versao)])
+
+
+def descartar_respostas(respostas):
+    """Esvazia a fila de respostas (sobras de comandos anteriores); retorna quantas"""
+    descartadas = 0
+    while True:
+        try:
+            respostas.get_nowait()
+        except queue.Empty:
+            return descartadas
+        descartadas += 1
+
+
+def esperar_ack(respostas, cmd, valor, timeout):
+    """Aguarda o ACK do comando cmd com a versão/offset valor; retorna (status, quadro)"""
+    limite = time.monotonic() + timeout
+    while True:
+        restante = limite - time.monotonic()
+        ack = esperar_resposta(respostas, TIPO_ACK, restante if restante > 0 else 0)
+        cmd_ack, status, valor_ack = struct.unpack('<BBI', ack.payload)
+        if (cmd_ack, valor_ack) == (cmd, valor):
+            return status, ack
+
+
+def esperar_resposta(respostas, tipo, timeout):
+    """Aguarda um quadro do tipo pedido, ignorando respostas atrasadas de outros comandos"""
+    limite = time.monotonic() + timeout
+    while True:
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            raise ErroSincronizacao(f"Leitor não respondeu (esperando tipo 0x{tipo:02X})")
+        try:
+            quadro = respostas.get(timeout=restante)
+        except queue.Empty:
+            continue
+        if quadro.tipo == tipo:
+            return quadro
+
+
+def consultar_versao(enviar, respostas, timeout=1.0):
+    """Retorna (versão, total) da lista gravada no leitor"""
+    enviar(montar_quadro(TIPO_CMD_VERSAO, 0))
+    quadro = esperar_resposta(respostas, TIPO_RESP_VERSAO, timeout)
+    return struct.unpack('<IH', quadro.payload)
+
+
+def sincronizar_lista(enviar, respostas, tags, timeout=1.0, tentativas=3):
+    """Envia a lista ao leitor se a versão dele for diferente; retorna um resumo"""
+    hashes = montar_lista(tags)
+    versao = versao_lista(hashes)
+    inicio = time.perf_counter()
+    descartar_respostas(respostas)
+    versao_leitor, _ = consultar_versao(enviar, respostas, timeout)
+    if versao_leitor == versao:
+        return {"versao": versao, "enviada": False, "tags": len(hashes),
+                "duracao_ms": (time.perf_counter() - inicio) * 1000}
+
+    ultimo_erro = None
+    for tentativa in range(tentativas):
+        bytes_enviados = 0
+        descartar_respostas(respostas)
+        try:
+            for quadro, (cmd, valor) in zip(quadros_lista(hashes, versao), acks_lista(hashes, versao)):
+                enviar(quadro)
+                bytes_enviados += len(quadro)
+                status, _ = esperar_ack(respostas, cmd, valor, timeout)
+                if status != STATUS_OK:
+                    raise ErroSincronizacao(f"Leitor recusou o comando 0x{cmd:02X}: "
+                                            f"{NOMES_STATUS.get(status, status)}")
+            return {"versao": versao, "enviada": True, "tags": len(hashes),
+                    "bytes": bytes_enviados, "tentativas": tentativa + 1,
+                    "duracao_ms": (time.perf_counter() - inicio) * 1000}
+        except ErroSincronizacao as e:
+            ultimo_erro = e
+            print(f"Falha ao sincronizar a lista (tentativa {tentativa + 1}): {e}")
+    raise ultimo_erro
@@ -1,257 +1,291 @@
-import serial
 import tkinter as tk
 from tkinter import ttk, messagebox
 import time
-import csv
-from datetime import datetime
 import math
 import threading
 from PIL import Image, ImageTk
 import os
-import json
-import tempfile
 import atexit
+from leitor_serial import ServicoIngestao, MedidorLatencia, drenar_fila, carregar_config_leitores
+from transportes import criar_transporte
+from simulador import GeradorCrachas, MonitorLoop
+from deduplicacao import FiltroDuplicatas
+from lista_autorizados import sincronizar_lista, ErroSincronizacao
+from identidade import (CacheIdentidade, ProvedorMemoria, ProvedorArquivo, ErroProvedor,
+                        criar_provedor, crachas_de_dicionarios, PENDENTE)
+from configuracao import ObservadorArquivos, salvar_catalogo, ler_catalogo
+from catalogo import Catalogo
+from estacao import Estacao
+from servico_estoque import ServicoEstoque
+from armazenamento import criar_armazenamento, copiar_estoques
+from executor_io import ExecutorIO
+from relatorios import criar_relatorios, DIMENSOES, periodo
 
 # ---------------- CONFIGURAÇÕES ----------------
 PORTA_SERIAL = 'COM6'  
-BAUD_RATE = 9600
+BAUD_RATE = 115200  # Deve ser o mesmo BAUD_RATE do arduino.ino
+PROTOCOLO = 'binario'  # 'binario' (quadros com CRC) ou 'texto' (firmware antigo, 9600)
 
-# IDs cadastrados
+# Leitores (um por estação). Se existir leitores.json, ele substitui esta lista:
+# [{"id": "estacao1", "porta": "COM6", "baud": 115200, "protocolo": "binario"}, ...]
+# "transporte" pode ser "serial" (padrão), "pty" ou "memoria".
+# Leitores com protocolo binário recebem a lista de crachás cadastrados para
+# bipar localmente; use "lista_autorizados": false para não enviar.
+ARQUIVO_LEITORES = 'leitores.json'
+LEITORES = [
+    {"id": "estacao1", "porta": PORTA_SERIAL, "baud": BAUD_RATE, "protocolo": PROTOCOLO},
+]
+# Cada leitor é uma estação (ver estacao.py), com sessão, telas e timers
+# próprios: a primeira usa a janela principal e cada uma das outras abre uma
+# janela sua. Leituras de um leitor sem estação (o simulador) vão para a primeira.
+
+# Simulador de crachás para teste de carga sem hardware (None = desligado).
+# Ex.: {"taxa": 50, "distribuicao": "zipf", "ruido": 0.01, "tags": ["AD88C801", "3A163602"]}
+SIMULADOR = None
+
+# Janela (s) em que o mesmo cartão no mesmo leitor é tratado como leitura duplicada
+JANELA_DUPLICATA = 3.0
+
+# Login rápido: identifica o crachá e abre a próxima tela no mesmo turno do loop do Tk.
+# Com False, volta às pausas cosméticas abaixo ("Cartão detectado..." e boas-vindas).
+LOGIN_RAPIDO = True
+ATRASO_DETECCAO_MS = 1000
+ATRASO_BOAS_VINDAS_MS = 800
+
+# Cadastro de crachás: {"tipo": "memoria" | "arquivo" | "sqlite" | "http", "caminho" ou "url": ...}
+# Arquivo e SQLite são criados na primeira execução com os IDs abaixo.
+# O arquivo de crachás é observado: editar o JSON vale sem reiniciar.
+IDENTIDADE = {"tipo": "arquivo", "caminho": "crachas.json"}
+TTL_CACHE_CRACHAS = 300  # Segundos que um crachá conhecido fica no cache
+TTL_CRACHA_DESCONHECIDO = 30  # Segundos que um ID não cadastrado fica no cache negativo
+
+# IDs cadastrados (iniciais)
 operadores = {
     "056B4A806403E9": "Operador Suporte",
     "AD88C801": "Raquel",
 }
 
-# IDs de administradores
+# IDs de administradores (iniciais)
 administradores = {
     "3A163602": "Admin Erick",
 }
 
-# Mapeamento de áreas para peças - Modelo 314
-areas_pecas_314 = {
-    "A1": "Eixos",
-    "A2": "Chassi",
-    "A3": "Lanternas",
-    "A4": "Parabrisas",
-    "A5": "Rodas",
-    "A6": "Teto"
+# Modelos padrão: usados só para criar catalogo.json na primeira execução
+MODELOS_PADRAO = {
+    "314": {
+        "A1": {"peca": "Eixos", "quantidade": 100, "minimo": 20},
+        "A2": {"peca": "Chassi", "quantidade": 50, "minimo": 10},
+        "A3": {"peca": "Lanternas", "quantidade": 200, "minimo": 30},
+        "A4": {"peca": "Parabrisas", "quantidade": 30, "minimo": 5},
+        "A5": {"peca": "Rodas", "quantidade": 80, "minimo": 15},
+        "A6": {"peca": "Teto", "quantidade": 25, "minimo": 5}
+    },
+    "313": {
+        "A1": {"peca": "Eixos", "quantidade": 100, "minimo": 20},
+        "A2": {"peca": "Chassi", "quantidade": 50, "minimo": 10},
+        "A3": {"peca": "Lanternas", "quantidade": 200, "minimo": 30},
+        "A4": {"peca": "Assoalho", "quantidade": 30, "minimo": 5},
+        "A5": {"peca": "Rodas", "quantidade": 80, "minimo": 15},
+        "A6": {"peca": "Teto", "quantidade": 25, "minimo": 5}
+    },
 }
 
-# Mapeamento de áreas para peças - Modelo 313
-areas_pecas_313 = {
-    "A1": "Eixos",
-    "A2": "Chassi",
-    "A3": "Lanternas",
-    "A4": "Assoalho",
-    "A5": "Rodas",
-    "A6": "Teto"
-}
+# Catálogo de modelos. catalogo.json é criado na primeira execução a partir
+# dos modelos padrão e, depois disso, é ele que vale: editar o arquivo
+# adiciona/remove modelos e áreas sem reiniciar o quiosque.
+# estoques é o Catalogo (catalogo.py): {modelo: {área: dados}} para o resto do
+# código, compartilhado por todas as estações; o modelo em uso é de cada
+# estação (estacao.atual, estacao.selecionar troca).
+ARQUIVO_CATALOGO = 'catalogo.json'
+estoques = Catalogo.de_dicionario(MODELOS_PADRAO)
+# Toda alteração de estoque passa pelo serviço (servico_estoque.py): conferir
+# e baixar é uma operação só, segura entre estações e threads
+servico_estoque = ServicoEstoque(estoques)
 
-# Estoque inicial (será carregado/salvo durante a execução)
-estoque_314 = {
-    "A1": {"peca": "Eixos", "quantidade": 100, "minimo": 20},
-    "A2": {"peca": "Chassi", "quantidade": 50, "minimo": 10},
-    "A3": {"peca": "Lanternas", "quantidade": 200, "minimo": 30},
-    "A4": {"peca": "Parabrisas", "quantidade": 30, "minimo": 5},
-    "A5": {"peca": "Rodas", "quantidade": 80, "minimo": 15},
-    "A6": {"peca": "Teto", "quantidade": 25, "minimo": 5}
-}
+# Cada alteração de estoque é acrescentada ao diário; os snapshots por modelo
+# (estoque_temp_<modelo>.json) são regravados a cada COMPACTAR_A_CADA alterações.
+ARQUIVO_DIARIO_ESTOQUE = 'estoque.diario'
+COMPACTAR_A_CADA = 1000
 
-estoque_313 = {
-    "A1": {"peca": "Eixos", "quantidade": 100, "minimo": 20},
-    "A2": {"peca": "Chassi", "quantidade": 50, "minimo": 10},
-    "A3": {"peca": "Lanternas", "quantidade": 200, "minimo": 30},
-    "A4": {"peca": "Assoalho", "quantidade": 30, "minimo": 5},
-    "A5": {"peca": "Rodas", "quantidade": 80, "minimo": 15},
-    "A6": {"peca": "Teto", "quantidade": 25, "minimo": 5}
-}
+# Onde ficam estoque e histórico de reposições:
+# {"tipo": "arquivos"} (diário/JSON + reposicoes.csv) ou {"tipo": "sqlite", "caminho": "estoque.db"}.
+# No SQLite a reposição e a baixa no estoque entram numa só transação; na
+# primeira execução os arquivos existentes são importados para o banco.
+# Em "arquivos", o CSV fica aberto e vai ao disco (fsync) a cada "fsync_a_cada"
+# linhas ou "fsync_ms" ms, o que vier primeiro; "rotacao_bytes"/"rotacao_diaria"
+# fecham o arquivo e começam outro (reposicoes-AAAA-MM-DD-NNN.csv).
+# durabilidade dos snapshots: 'nenhuma', 'arquivo' ou 'completa' (ver snapshot.py)
+# Arquivos rotacionados com mais de "arquivar_apos_dias" dias viram .col
+# (colunar e comprimido, ver arquivo_colunar.py) ao iniciar; None desliga.
+ARMAZENAMENTO = {"tipo": "arquivos", "fsync_a_cada": 32, "fsync_ms": 200,
+                 "rotacao_bytes": 10 * 1024 * 1024, "rotacao_diaria": False,
+                 "durabilidade": "completa", "arquivar_apos_dias": 30}
+ARQUIVO_REPOSICOES = 'reposicoes.csv'
+# Agregados já calculados do histórico (aba Relatórios e relatorios.py); com o
+# armazenamento SQLite os relatórios saem do banco e este cache não é usado
+ARQUIVO_CACHE_RELATORIOS = 'relatorios.cache.json'
+# Toda alteração de estoque, com checkpoints, para ver o estoque em qualquer
+# instante (aba Conciliação e historico_estoque.py); nunca é compactado
+ARQUIVO_HISTORICO_ESTOQUE = 'estoque.historico'
+
+# Threads que fazem o I/O de disco (a interface nunca espera pelo disco)
+TRABALHADORES_IO = 2
+
+# O estoque de um modelo vai para o snapshot quando fica este tempo sem
+# alterações: uma sequência de reposições ou ajustes vira uma gravação só
+ESPERA_GRAVACAO_ESTOQUE_MS = 3000
 
 # ---------------- VARIÁVEIS GLOBAIS ----------------
-area_var = None
-peca_var = None
-quantidade_entry = None
-form_frame = None
-ultimo_rfid_lido = None
-ultimo_tempo_leitura = 0
-bloquear_leitura = False
-wave_offset = 0  # Para animação
-ser = None
-serial_thread = None
+estacoes = {}  # leitor -> Estacao (sessão, telas e timers de cada quiosque)
+estacao_principal = None  # A da janela principal
+filtro_rfid = FiltroDuplicatas(ttl=JANELA_DUPLICATA)  # TTL por (leitor, tag)
+ingestao = None  # Serviço com uma thread por leitor e fila compartilhada
+drenagem_agendada = threading.Event()
+latencia_rfid = MedidorLatencia()  # Tempo do fio até o processar_rfid
+latencia_login = MedidorLatencia()  # Tempo da leitura até a tela de seleção de modelo
+identidades = None  # Cache de identidades na frente do provedor de crachás
+gerador_crachas = None  # Simulador de carga (quando SIMULADOR está configurado)
+monitor_loop = None  # Atraso do loop do Tk durante a simulação
+observador_config = None  # Recarrega catálogo e crachás quando os arquivos mudam
+armazenamento = None  # Backend de estoque e histórico (arquivos ou SQLite)
+executor_io = None  # Pool de I/O; o resultado volta ao Tk via root.after
+relatorios = None  # Agregados do histórico de reposições
+estoque_carregado = False  # Só libera a seleção de modelo depois da carga do disco
+gravacoes_agendadas = {}  # modelo -> id do root.after que grava o estoque dele
+fechando = False  # on_closing já rodou (ele também é chamado pelo atexit)
 running = True
-last_activity_time = time.time()
-wave_animation_active = False
-logout_timer = None
-status_label = None
-wave_canvas = None
-estoque_frame = None
-current_user = None
-current_user_role = None  # 'admin', 'operador'
-current_model = None  # '313' ou '314'
-areas_pecas = None  # Será definido dinamicamente
-estoque = None  # Será definido dinamicamente
-pending_callbacks = {}  # Para gerenciar callbacks agendados
 
 # Dicionário para manter referências das imagens (evita garbage collection)
 IMAGES = {}
 
 # ---------------- FUNÇÕES DE ESTOQUE ----------------
 
-def carregar_estoque():
-    """Carrega o estoque de um arquivo temporário se existir"""
-    global estoque_313, estoque_314
+def carregar_catalogo():
+    """Carrega o catálogo de modelos (cria o arquivo com os modelos padrão se não existir)"""
     try:
-        if os.path.exists('estoque_temp_313.json'):
-            with open('estoque_temp_313.json', 'r') as f:
-                loaded_data = json.load(f)
-                # Garantir que os valores sejam inteiros
-                for area, dados in loaded_data.items():
-                    if isinstance(dados, dict):
-                        dados["quantidade"] = int(dados.get("quantidade", 0))
-                        dados["minimo"] = int(dados.get("minimo", 0))
-                estoque_313 = loaded_data
-            print("Estoque 313 carregado do arquivo temporário")
-        
-        if os.path.exists('estoque_temp_314.json'):
-            with open('estoque_temp_314.json', 'r') as f:
-                loaded_data = json.load(f)
-                # Garantir que os valores sejam inteiros
-                for area, dados in loaded_data.items():
-                    if isinstance(dados, dict):
-                        dados["quantidade"] = int(dados.get("quantidade", 0))
-                        dados["minimo"] = int(dados.get("minimo", 0))
-                estoque_314 = loaded_data
-            print("Estoque 314 carregado do arquivo temporário")
-    except Exception as e:
-        print(f"Erro ao carregar estoque: {e}")
+        if not os.path.exists(ARQUIVO_CATALOGO):
+            salvar_catalogo(ARQUIVO_CATALOGO, MODELOS_PADRAO)
+        servico_estoque.aplicar(ler_catalogo(ARQUIVO_CATALOGO))
+    except (OSError, ValueError) as e:
+        print(f"Erro ao carregar o catálogo: {e}. Usando os modelos padrão.")
+
+def agendar_na_interface(callback, valor):
+    """Entrega o resultado de uma tarefa de I/O na thread do Tk"""
+    root.after(0, callback, valor)
+
+def avisar_erro_estoque(erro):
+    print(f"Erro ao salvar estoque: {erro}")
+
+def carregar_estoque():
+    """Carrega o estoque do armazenamento configurado (na thread de I/O)"""
+    executor_io.enviar('armazenamento', armazenamento.carregar,
+                       ao_concluir=aplicar_estoque_carregado,
+                       ao_falhar=falha_ao_carregar_estoque)
+
+def aplicar_estoque_carregado(resultado):
+    """Copia os valores lidos do disco para o estoque da interface"""
+    global estoque_carregado
+    resumo, valores = resultado
+    for modelo, areas in valores.items():
+        for area, dados in areas.items():
+            servico_estoque.ajustar(modelo, area, dados["quantidade"], dados["minimo"])
+    estoque_carregado = True
+    print(f"Estoque carregado ({resumo})")
+    if ARMAZENAMENTO.get("arquivar_apos_dias") is not None:
+        executor_io.enviar('armazenamento', armazenamento.arquivar_historico,
+                           ARMAZENAMENTO["arquivar_apos_dias"],
+                           ao_concluir=avisar_historico_arquivado,
+                           ao_falhar=lambda e: print(f"Erro ao arquivar o histórico: {e}"))
+
+def avisar_historico_arquivado(arquivados):
+    if arquivados:
+        print(f"Histórico arquivado no formato colunar: {', '.join(arquivados)}")
+
+def falha_ao_carregar_estoque(erro):
+    """Segue com o estoque inicial, como antes, se a carga falhar"""
+    global estoque_carregado
+    estoque_carregado = True
+    print(f"Erro ao carregar estoque: {erro}")
 
 def salvar_estoque():
-    """Salva o estoque em arquivos temporários de forma atômica"""
-    try:
-        # Salvar estoque 313
-        temp_file_313 = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json')
-        json.dump(estoque_313, temp_file_313)
-        temp_file_313.close()
-        os.replace(temp_file_313.name, 'estoque_temp_313.json')
-        print("Estoque 313 salvo no arquivo temporário")
-        
-        # Salvar estoque 314
-        temp_file_314 = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json')
-        json.dump(estoque_314, temp_file_314)
-        temp_file_314.close()
-        os.replace(temp_file_314.name, 'estoque_temp_314.json')
-        print("Estoque 314 salvo no arquivo temporário")
-    except Exception as e:
-        print(f"Erro ao salvar estoque: {e}")
-
-def atualizar_estoque(area, quantidade):
-    """Atualiza o estoque após uma reposição (SUBTRAI)"""
-    global estoque
-    
-    if area in estoque:
-        # Verificar se há estoque suficiente antes de subtrair
-        if estoque[area]["quantidade"] >= quantidade:
-            estoque[area]["quantidade"] -= quantidade
-            salvar_estoque()
-            return True
-        else:
-            print(f"Erro: Estoque insuficiente em {area}. Disponível: {estoque[area]['quantidade']}, Solicitado: {quantidade}")
-            return False
-    return False
-
-def verificar_estoque_minimo():
-    """Verifica se algum item está abaixo do estoque mínimo"""
-    alertas = []
-    for area, dados in estoque.items():
-        if dados["quantidade"] <= dados["minimo"]:
-            alertas.append(f"{area} ({dados['peca']}): {dados['quantidade']} unidades (mínimo: {dados['minimo']})")
-    return alertas
+    """Grava o estoque de todos os modelos (na thread de I/O)"""
+    executor_io.enviar('armazenamento', armazenamento.salvar_estoque, copiar_estoques(estoques),
+                       ao_falhar=avisar_erro_estoque)
+
+def registrar_alteracao_estoque(estacao, area, quantidade=None, minimo=None):
+    """Grava uma alteração no estoque do modelo em uso na estação (na thread de I/O)"""
+    executor_io.enviar('armazenamento', armazenamento.registrar_alteracao,
+                       estacao.modelo_atual, area, quantidade, minimo, estacao.usuario,
+                       ao_falhar=avisar_erro_estoque)
+    agendar_gravacao_estoque(estacao.modelo_atual)
+
+def agendar_gravacao_estoque(modelo):
+    """(Re)inicia a espera para gravar o estoque do modelo"""
+    if modelo in gravacoes_agendadas:
+        root.after_cancel(gravacoes_agendadas[modelo])
+    gravacoes_agendadas[modelo] = root.after(ESPERA_GRAVACAO_ESTOQUE_MS, gravar_estoque_modelo, modelo)
+
+def gravar_estoque_modelo(modelo):
+    """Grava o que estiver pendente do modelo (na thread de I/O)"""
+    gravacoes_agendadas.pop(modelo, None)
+    executor_io.enviar('armazenamento', armazenamento.descarregar, [modelo],
+                       ao_falhar=avisar_erro_estoque)
+
+def verificar_estoque_minimo(modelo):
+    """Alertas das áreas no mínimo ou abaixo, da mais abaixo do mínimo para a menos"""
+    return [f"{area} ({modelo.peca(area)}): {modelo.quantidade(area)} unidades (mínimo: {modelo.minimo(area)})"
+            for area in modelo.abaixo_do_minimo()]
+
+def avisar_cruzamento_minimo(modelo, area, abaixo):
+    """Registra quando uma área chega ao mínimo ou volta a ficar acima dele"""
+    estado = "chegou ao mínimo" if abaixo else "voltou a ficar acima do mínimo"
+    print(f"Modelo {modelo}, área {area}: {estado}")
 
 # ---------------- FUNÇÕES PRINCIPAIS ----------------
 
-def cancel_pending_callbacks():
-    """Cancela todos os callbacks pendentes"""
-    global pending_callbacks
-    for callback_id in list(pending_callbacks.keys()):
-        try:
-            root.after_cancel(callback_id)
-        except:
-            pass
-    pending_callbacks = {}
-
-def schedule_callback(delay_ms, callback, *args):
-    """Agenda um callback e retorna seu ID"""
-    callback_id = root.after(delay_ms, callback, *args)
-    pending_callbacks[callback_id] = True
-    return callback_id
-
-def cancel_callback(callback_id):
-    """Cancela um callback específico"""
-    if callback_id in pending_callbacks:
-        try:
-            root.after_cancel(callback_id)
-            del pending_callbacks[callback_id]
-        except:
-            pass
-
-def reset_inactivity_timer():
-    """Reinicia o timer de inatividade"""
-    global last_activity_time, logout_timer
-    last_activity_time = time.time()
-    
-    # Cancela o timer anterior se existir
-    if logout_timer:
-        try:
-            root.after_cancel(logout_timer)
-            if logout_timer in pending_callbacks:
-                del pending_callbacks[logout_timer]
-        except:
-            pass
-    
-    # Agenda novo logout para 60 segundos (apenas se estiver logado)
-    if current_user:
-        logout_timer = schedule_callback(60000, logout_by_inactivity)
-
-def logout_by_inactivity():
-    """Desloga por inatividade"""
-    global bloquear_leitura, current_user, current_user_role, current_model
-    if not current_user:
-        return  # Já está na tela inicial
-    
-    messagebox.showinfo("Sessão Expirada", "Sessão encerrada por inatividade.")
-    current_user = None
-    current_user_role = None
-    current_model = None
-    voltar_tela_inicial()
-
-def salvar_reposicao(nome, area, peca, quantidade, modelo):
-    """Salva os dados em CSV com tratamento de erro"""
-    try:
-        file_exists = os.path.exists('reposicoes.csv')
-        with open('reposicoes.csv', 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            if not file_exists:
-                writer.writerow(["Data/Hora", "Nome", "Área", "Peça", "Quantidade", "Modelo"])
-            writer.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S"), nome, area, peca, quantidade, modelo])
-        return True
-    except Exception as e:
+def logout_by_inactivity(estacao):
+    """Volta para a tela inicial depois do logout por inatividade (a sessão já foi encerrada)
+
+    O aviso fica na tela da estação, não numa messagebox: uma caixa modal
+    travaria as outras estações até alguém fechá-la.
+    """
+    voltar_tela_inicial(estacao)
+    estacao.status_label.config(text="Sessão encerrada por inatividade.", fg="#e67e22")
+    estacao.agendar(3000, restaurar_status, estacao)
+
+def restaurar_status(estacao):
+    """Volta a mensagem da tela inicial ao normal (se a estação ainda estiver nela)"""
+    if estacao.tela == 'inicial':
+        estacao.status_label.config(text="Aproxime o cartão do leitor...", fg="#3498db")
+
+def salvar_reposicao(estacao, nome, area, peca, quantidade, modelo):
+    """Grava na thread de I/O a reposição já baixada do estoque (Estacao.baixar)"""
+    def concluida(_):
+        messagebox.showinfo("Sucesso", f"Reposição registrada com sucesso!\n{quantidade} {peca} removidos do estoque.", parent=estacao.janela)
+    
+    def falhou(e):
+        servico_estoque.devolver(modelo, area, quantidade)  # A baixa não foi gravada
         print(f"Erro ao salvar reposição: {e}")
-        messagebox.showerror("Erro", f"Não foi possível salvar a reposição: {e}")
-        return False
+        messagebox.showerror("Erro", f"Não foi possível salvar a reposição: {e}", parent=estacao.janela)
+    
+    futuro = executor_io.enviar('armazenamento', armazenamento.registrar_reposicao,
+                                nome, area, peca, quantidade, modelo,
+                                ao_concluir=concluida, ao_falhar=falhou)
+    agendar_gravacao_estoque(modelo)
+    return futuro
 
-def mostrar_selecao_modelo(nome, role):
+def mostrar_selecao_modelo(estacao, nome, role):
     """Exibe a tela de seleção de modelo"""
-    global bloquear_leitura, wave_animation_active, current_user, current_user_role
-    
-    bloquear_leitura = True
-    wave_animation_active = False
-    current_user = nome
-    current_user_role = role
+    estacao.liberar_reserva()  # Voltar do formulário ou Registrar que não usou a reserva
+    estacao.bloquear_leitura = True
+    estacao.wave_ativa = False
+    estacao.tela = 'selecao_modelo'
     
-    for widget in root.winfo_children():
+    for widget in estacao.janela.winfo_children():
         widget.destroy()
     
     # Frame principal
-    main_frame = tk.Frame(root, bg='white')
+    main_frame = tk.Frame(estacao.janela, bg='white')
     main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
     
     # Título
@@ -267,66 +301,54 @@ def mostrar_selecao_modelo(nome, role):
     model_frame = tk.Frame(main_frame, bg='white')
     model_frame.pack(fill=tk.BOTH, expand=True, pady=50)
     
-    # Botão Modelo 313
-    btn_313 = tk.Button(model_frame, text="Modelo 313", 
-                        command=lambda: selecionar_modelo("313", nome, role),
-                        font=("Arial", 14), bg='#3498db', fg='white',
-                        width=20, height=2)
-    btn_313.pack(pady=20)
-    
-    # Botão Modelo 314
-    btn_314 = tk.Button(model_frame, text="Modelo 314", 
-                        command=lambda: selecionar_modelo("314", nome, role),
-                        font=("Arial", 14), bg='#3498db', fg='white',
-                        width=20, height=2)
-    btn_314.pack(pady=20)
+    # Um botão por modelo do catálogo
+    for modelo in sorted(estoques):
+        btn_modelo = tk.Button(model_frame, text=f"Modelo {modelo}", 
+                               command=lambda m=modelo: selecionar_modelo(estacao, m, nome, role),
+                               font=("Arial", 14), bg='#3498db', fg='white',
+                               width=20, height=2)
+        btn_modelo.pack(pady=20)
     
     # Botão Voltar
     back_btn = tk.Button(main_frame, text="Voltar", 
-                         command=voltar_tela_inicial,
+                         command=lambda: voltar_tela_inicial(estacao),
                          font=("Arial", 12), bg='#e74c3c', fg='white')
     back_btn.pack(side=tk.BOTTOM, pady=20)
     
-    reset_inactivity_timer()
+    estacao.reiniciar_inatividade()
 
-def selecionar_modelo(modelo, nome, role):
+def selecionar_modelo(estacao, modelo, nome, role):
     """Seleciona o modelo e redireciona para a tela apropriada"""
-    global current_model, areas_pecas, estoque
-    
-    current_model = modelo
+    if not estoque_carregado:
+        messagebox.showinfo("Aguarde", "Carregando o estoque, tente novamente em instantes.", parent=estacao.janela)
+        return
     
-    if modelo == "313":
-        areas_pecas = areas_pecas_313
-        estoque = estoque_313
-    else:
-        areas_pecas = areas_pecas_314
-        estoque = estoque_314
+    estacao.selecionar(modelo)
     
     if role == "admin":
-        mostrar_painel_administrativo(nome)
+        mostrar_painel_administrativo(estacao, nome)
     else:
-        mostrar_formulario(nome)
+        mostrar_formulario(estacao, nome)
 
-def mostrar_formulario(nome):
+def mostrar_formulario(estacao, nome):
     """Exibe o formulário de reposição"""
-    global area_var, peca_var, quantidade_entry, bloquear_leitura, wave_animation_active, current_user
+    estacao.liberar_reserva()  # O formulário começa sem área escolhida
+    estacao.bloquear_leitura = True
+    estacao.wave_ativa = False
+    estacao.tela = 'formulario'
     
-    bloquear_leitura = True
-    wave_animation_active = False
-    current_user = nome
-    
-    for widget in root.winfo_children():
+    for widget in estacao.janela.winfo_children():
         widget.destroy()
     
     # Frame principal
-    main_frame = tk.Frame(root, bg='white')
+    main_frame = tk.Frame(estacao.janela, bg='white')
     main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
     
     # Título
     title_frame = tk.Frame(main_frame, bg='white')
     title_frame.pack(fill=tk.X, pady=(0, 20))
     
-    modelo_text = f"Modelo {current_model}" if current_model else "Modelo não selecionado"
+    modelo_text = f"Modelo {estacao.modelo_atual}" if estacao.modelo_atual else "Modelo não selecionado"
     
     tk.Label(title_frame, text=f"Registro de Reposição", 
              font=("Arial", 18, "bold"), bg='white', fg='#2c3e50').pack(pady=(10, 5))
@@ -334,7 +356,7 @@ def mostrar_formulario(nome):
              font=("Arial", 12), bg='white', fg='#7f8c8d').pack()
     
     # Exibir alertas de estoque mínimo
-    alertas = verificar_estoque_minimo()
+    alertas = verificar_estoque_minimo(estacao.atual)
     if alertas:
         alert_frame = tk.Frame(main_frame, bg='#fff3cd', relief=tk.RAISED, bd=1)
         alert_frame.pack(fill=tk.X, pady=(0, 20))
@@ -353,13 +375,13 @@ def mostrar_formulario(nome):
     area_frame.pack(fill=tk.X, pady=10)
     tk.Label(area_frame, text="Área de reposição:", font=("Arial", 12), 
              bg='white', fg='#2c3e50').pack(anchor=tk.W)
-    area_var = tk.StringVar()
+    estacao.area_var = area_var = tk.StringVar()
     
     area_cb = ttk.Combobox(area_frame, textvariable=area_var, 
-                           values=list(areas_pecas.keys()), 
+                           values=list(estacao.atual), 
                            state="readonly", font=("Arial", 12))
     area_cb.pack(fill=tk.X, pady=(5, 0))
-    area_cb.bind('<<ComboboxSelected>>', atualizar_peca)
+    area_cb.bind('<<ComboboxSelected>>', lambda e: atualizar_peca(estacao, e))
     
     # Peça
     peca_frame = tk.Frame(form_frame, bg='white')
@@ -370,8 +392,8 @@ def mostrar_formulario(nome):
     peca_info_frame = tk.Frame(peca_frame, bg='white')
     peca_info_frame.pack(fill=tk.X, pady=(5, 0))
     
-    peca_var = tk.StringVar(value="Selecione uma área")
-    tk.Label(peca_info_frame, textvariable=peca_var, font=("Arial", 12, "bold"), 
+    estacao.peca_var = tk.StringVar(value="Selecione uma área")
+    tk.Label(peca_info_frame, textvariable=estacao.peca_var, font=("Arial", 12, "bold"), 
              foreground="#3498db", bg='white').pack(side=tk.LEFT)
     
     # Label para mostrar estoque atual e mínimo
@@ -379,18 +401,22 @@ def mostrar_formulario(nome):
                             foreground="#7f8c8d", bg='white')
     estoque_label.pack(side=tk.RIGHT)
     
-    def atualizar_estoque_display(event=None):
+    def atualizar_estoque_display(reservada=True):
         area = area_var.get()
-        if area in estoque:
-            estoque_atual = estoque[area]["quantidade"]
-            minimo = estoque[area]["minimo"]
-            cor = "#e74c3c" if estoque_atual <= minimo else "#27ae60"
-            estoque_label.config(
-                text=f"Estoque: {estoque_atual} | Mínimo: {minimo}",
-                fg=cor
-            )
-        else:
+        lido = servico_estoque.ler(estacao.modelo_atual, area)
+        if lido is None:
             estoque_label.config(text="")
+            return
+        estoque_atual, minimo, reservado, _ = lido
+        # O que está reservado em outras estações não está disponível para esta
+        disponivel = estoque_atual - reservado + estacao.reservado(area)
+        texto = f"Estoque: {estoque_atual} | Mínimo: {minimo}"
+        if disponivel < estoque_atual:
+            texto += f" | Reservado: {estoque_atual - disponivel}"
+        if not reservada:
+            texto = f"Estoque insuficiente! Disponível: {disponivel}"
+        cor = "#e74c3c" if not reservada or disponivel <= minimo else "#27ae60"
+        estoque_label.config(text=texto, fg=cor)
     
     area_var.trace('w', lambda *args: atualizar_estoque_display())
     
@@ -411,8 +437,8 @@ def mostrar_formulario(nome):
     
     def atualizar_minimo_display(event=None):
         area = area_var.get()
-        if area in estoque:
-            minimo = estoque[area]["minimo"]
+        if area in estacao.atual:
+            minimo = estacao.atual[area]["minimo"]
             minimo_label.config(text=f"Mínimo: {minimo} peças")
         else:
             minimo_label.config(text="")
@@ -426,88 +452,109 @@ def mostrar_formulario(nome):
     except:
         quantidade_entry = tk.Spinbox(quantidade_frame, from_=1, to=1000, 
                                      font=("Arial", 12), width=10)
+    estacao.quantidade_entry = quantidade_entry
     
     quantidade_entry.pack(anchor=tk.W, pady=(5, 0))
     quantidade_entry.delete(0, tk.END)
     quantidade_entry.insert(0, "1")
     
+    # Área e quantidade escolhidas ficam reservadas até o Registrar
+    def atualizar_reserva(event=None):
+        atualizar_estoque_display(reservar_formulario(estacao))
+    
+    area_cb.bind('<<ComboboxSelected>>', atualizar_reserva, add='+')
+    quantidade_entry.config(command=atualizar_reserva)
+    quantidade_entry.bind('<KeyRelease>', atualizar_reserva)
+    
     # Botões
     button_frame = tk.Frame(form_frame, bg='white')
     button_frame.pack(fill=tk.X, pady=(20, 0))
     
     # Botão Voltar
     cancel_btn = tk.Button(button_frame, text="Voltar", 
-               command=lambda: mostrar_selecao_modelo(nome, "operador"),
+               command=lambda: mostrar_selecao_modelo(estacao, nome, "operador"),
                font=("Arial", 12), bg='#e74c3c', fg='white')
     cancel_btn.pack(side=tk.LEFT, padx=(0, 10))
     
     register_btn = tk.Button(button_frame, text="Registrar",
-               command=lambda: registrar_reposicao(nome),
+               command=lambda: registrar_reposicao(estacao, nome),
                font=("Arial", 12), bg='#2ecc71', fg='white')
     register_btn.pack(side=tk.RIGHT)
     
     area_cb.focus()
-    reset_inactivity_timer()
+    estacao.reiniciar_inatividade()
 
-def atualizar_peca(event=None):
+def atualizar_peca(estacao, event=None):
     """Atualiza a peça de acordo com a área"""
-    area = area_var.get()
-    if area in areas_pecas:
-        peca_var.set(areas_pecas[area])
-    reset_inactivity_timer()
+    area = estacao.area_var.get()
+    if area in estacao.atual:
+        estacao.peca_var.set(estacao.atual.peca(area))
+    estacao.reiniciar_inatividade()
+
+def reservar_formulario(estacao):
+    """Reserva a quantidade do formulário na área escolhida; False se não houver estoque
 
-def registrar_reposicao(nome):
+    Com a reserva, outra estação não vê as mesmas últimas peças como
+    disponíveis. Voltar e logout cancelam a reserva e a atividade a renova;
+    se nada disso acontecer, ela vence sozinha (VALIDADE_RESERVA).
+    """
+    area = estacao.area_var.get()
+    try:
+        quantidade = int(estacao.quantidade_entry.get())
+    except ValueError:
+        quantidade = 0
+    estacao.reiniciar_inatividade()
+    if area not in estacao.atual or quantidade <= 0:
+        estacao.liberar_reserva()
+        return True
+    return estacao.reservar(area, quantidade)
+
+def registrar_reposicao(estacao, nome):
     """Registra reposição"""
-    area = area_var.get()
-    peca = peca_var.get()
+    area = estacao.area_var.get()
+    peca = estacao.peca_var.get()
     try:
-        quantidade = int(quantidade_entry.get())
+        quantidade = int(estacao.quantidade_entry.get())
         if quantidade <= 0:
             raise ValueError
     except ValueError:
-        messagebox.showerror("Erro", "Quantidade inválida!")
+        messagebox.showerror("Erro", "Quantidade inválida!", parent=estacao.janela)
         return
     if not area or peca == "Selecione uma área":
-        messagebox.showerror("Erro", "Selecione uma área!")
+        messagebox.showerror("Erro", "Selecione uma área!", parent=estacao.janela)
         return
     
-    # Verifica se há estoque suficiente
-    if area in estoque and estoque[area]["quantidade"] < quantidade:
-        messagebox.showerror("Erro", f"Estoque insuficiente! Disponível: {estoque[area]['quantidade']}")
+    # Confirma a reserva do formulário; sem ela (vencida ou outra quantidade),
+    # confere o saldo e baixa na mesma chamada
+    if not estacao.baixar(area, quantidade):
+        disponivel = servico_estoque.disponivel(estacao.modelo_atual, area)
+        messagebox.showerror("Erro", f"Estoque insuficiente! Disponível: {disponivel}", parent=estacao.janela)
         return
     
-    # Salva a reposição e atualiza o estoque
-    if salvar_reposicao(nome, area, peca, quantidade, current_model):
-        if atualizar_estoque(area, quantidade):
-            messagebox.showinfo("Sucesso", f"Reposição registrada com sucesso!\n{quantidade} {peca} removidos do estoque.")
-        else:
-            messagebox.showerror("Erro", "Não foi possível atualizar o estoque!")
-            return
+    # Grava em segundo plano; a confirmação aparece quando a gravação terminar
+    salvar_reposicao(estacao, nome, area, peca, quantidade, estacao.modelo_atual)
     
     # Volta para a seleção de modelo
-    mostrar_selecao_modelo(nome, "operador")
+    mostrar_selecao_modelo(estacao, nome, "operador")
 
-def mostrar_painel_administrativo(nome):
+def mostrar_painel_administrativo(estacao, nome):
     """Exibe o painel administrativo"""
-    global bloquear_leitura, wave_animation_active, current_user, current_user_role
+    estacao.bloquear_leitura = True
+    estacao.wave_ativa = False
+    estacao.tela = 'painel'
     
-    bloquear_leitura = True
-    wave_animation_active = False
-    current_user = nome
-    current_user_role = "admin"
-    
-    for widget in root.winfo_children():
+    for widget in estacao.janela.winfo_children():
         widget.destroy()
     
     # Frame principal
-    main_frame = tk.Frame(root, bg='white')
+    main_frame = tk.Frame(estacao.janela, bg='white')
     main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
     
     # Cabeçalho
     header_frame = tk.Frame(main_frame, bg='white')
     header_frame.pack(fill=tk.X, pady=(0, 20))
     
-    modelo_text = f"Modelo {current_model}" if current_model else "Modelo não selecionado"
+    modelo_text = f"Modelo {estacao.modelo_atual}" if estacao.modelo_atual else "Modelo não selecionado"
     
     tk.Label(header_frame, text="Painel Administrativo", 
              font=("Arial", 18, "bold"), bg='white', fg='#2c3e50').pack(pady=(10, 5))
@@ -520,7 +567,7 @@ def mostrar_painel_administrativo(nome):
     
     # Frame para o estoque do modelo selecionado
     estoque_frame = tk.Frame(notebook, bg='white')
-    notebook.add(estoque_frame, text=f"Estoque Modelo {current_model}")
+    notebook.add(estoque_frame, text=f"Estoque Modelo {estacao.modelo_atual}")
     
     # Tabela de estoque
     columns = ("Área", "Peça", "Quantidade", "Mínimo", "Status")
@@ -541,13 +588,13 @@ def mostrar_painel_administrativo(nome):
     scrollbar_table.pack(side=tk.RIGHT, fill=tk.Y)
     
     # Atualizar tabela
-    atualizar_tabela_estoque(tree, estoque)
+    atualizar_tabela_estoque(tree, estacao.atual)
     
     # Frame para adicionar/editar item
     novo_item_frame = tk.Frame(estoque_frame, bg='white')
     novo_item_frame.pack(fill=tk.X, pady=10)
     
-    tk.Label(novo_item_frame, text=f"Definir Estoque Mínimo - Modelo {current_model}:", 
+    tk.Label(novo_item_frame, text=f"Definir Estoque Mínimo - Modelo {estacao.modelo_atual}:", 
              font=("Arial", 10, "bold"), bg='white').pack(anchor=tk.W, pady=(10, 5))
     
     form_frame = tk.Frame(novo_item_frame, bg='white')
@@ -555,7 +602,7 @@ def mostrar_painel_administrativo(nome):
     
     # Linha 1: Área e Peça
     tk.Label(form_frame, text="Área:", bg='white', font=("Arial", 10)).grid(row=0, column=0, padx=5, pady=2, sticky=tk.W)
-    area_entry = ttk.Combobox(form_frame, values=list(areas_pecas.keys()), width=8, state="readonly", font=("Arial", 10))
+    area_entry = ttk.Combobox(form_frame, values=list(estacao.atual), width=8, state="readonly", font=("Arial", 10))
     area_entry.grid(row=0, column=1, padx=5, pady=2)
     
     tk.Label(form_frame, text="Peça:", bg='white', font=("Arial", 10)).grid(row=0, column=2, padx=5, pady=2, sticky=tk.W)
@@ -584,56 +631,201 @@ def mostrar_painel_administrativo(nome):
     
     min_entry.grid(row=1, column=3, padx=5, pady=2)
     
+    # Versão de cada área quando os valores foram carregados no formulário
+    versoes = {}
+    
     # Linha 3: Botão Salvar
     save_button = tk.Button(form_frame, text="Salvar Configuração", 
-              command=lambda: salvar_configuracao_admin(area_entry, quant_entry, min_entry, tree),
+              command=lambda: salvar_configuracao_admin(estacao, area_entry, quant_entry, min_entry, tree, versoes),
               font=("Arial", 10), bg='#3498db', fg='white')
     save_button.grid(row=2, column=0, columnspan=4, pady=10)
     
     def atualizar_peca_admin(event=None):
         area = area_entry.get()
-        if area in areas_pecas:
-            peca_var_admin.set(areas_pecas[area])
+        if area in estacao.atual:
+            peca_var_admin.set(estacao.atual.peca(area))
     
     area_entry.bind('<<ComboboxSelected>>', atualizar_peca_admin)
     
-    def carregar_dados_area():
-        area = area_entry.get()
-        if area in estoque:
-            quant_entry.delete(0, tk.END)
-            quant_entry.insert(0, str(estoque[area]["quantidade"]))
-            min_entry.delete(0, tk.END)
-            min_entry.insert(0, str(estoque[area]["minimo"]))
+    area_entry.bind('<<ComboboxSelected>>',
+                    lambda e: carregar_dados_area(estacao, area_entry.get(), quant_entry, min_entry, versoes))
     
-    area_entry.bind('<<ComboboxSelected>>', lambda e: carregar_dados_area())
+    criar_aba_relatorios(estacao, notebook)
+    criar_aba_conciliacao(estacao, notebook)
     
     # Botão Voltar
     button_frame = tk.Frame(main_frame, bg='white')
     button_frame.pack(fill=tk.X, pady=10)
     
     back_button = tk.Button(button_frame, text="Voltar", 
-              command=lambda: mostrar_selecao_modelo(nome, "admin"),
+              command=lambda: mostrar_selecao_modelo(estacao, nome, "admin"),
               font=("Arial", 12), bg='#e74c3c', fg='white')
     back_button.pack(side=tk.RIGHT)
     
-    reset_inactivity_timer()
+    estacao.reiniciar_inatividade()
+
+def criar_aba_relatorios(estacao, notebook):
+    """Aba com o consumo agregado do histórico de reposições"""
+    relatorio_frame = tk.Frame(notebook, bg='white')
+    notebook.add(relatorio_frame, text="Relatórios")
+    
+    filtros_frame = tk.Frame(relatorio_frame, bg='white')
+    filtros_frame.pack(fill=tk.X, pady=5)
+    
+    tk.Label(filtros_frame, text="Agrupar por:", bg='white', font=("Arial", 10)).pack(side=tk.LEFT, padx=5)
+    dimensao_entry = ttk.Combobox(filtros_frame, values=list(DIMENSOES.values()), width=10,
+                                  state="readonly", font=("Arial", 10))
+    dimensao_entry.set(DIMENSOES["operador"])
+    dimensao_entry.pack(side=tk.LEFT, padx=5)
+    
+    tk.Label(filtros_frame, text="Período:", bg='white', font=("Arial", 10)).pack(side=tk.LEFT, padx=5)
+    periodo_entry = ttk.Combobox(filtros_frame, values=["hoje", "7 dias", "30 dias", "tudo"], width=8,
+                                 state="readonly", font=("Arial", 10))
+    periodo_entry.set("30 dias")
+    periodo_entry.pack(side=tk.LEFT, padx=5)
+    
+    status_var = tk.StringVar()
+    tk.Label(filtros_frame, textvariable=status_var, bg='white', fg='#7f8c8d',
+             font=("Arial", 9)).pack(side=tk.RIGHT, padx=5)
+    
+    columns = ("Chave", "Reposições", "Quantidade")
+    tree = ttk.Treeview(relatorio_frame, columns=columns, show="headings", height=10)
+    for col in columns:
+        tree.heading(col, text=col)
+        tree.column(col, width=120, anchor=tk.CENTER)
+    scrollbar_table = ttk.Scrollbar(relatorio_frame, orient=tk.VERTICAL, command=tree.yview)
+    tree.configure(yscrollcommand=scrollbar_table.set)
+    tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
+    scrollbar_table.pack(side=tk.RIGHT, fill=tk.Y)
+    
+    def consultar(dimensao, inicio, fim):
+        relatorios.atualizar()
+        return dimensao, relatorios.consultar(dimensao, inicio, fim)
+    
+    def mostrar(resultado):
+        dimensao, linhas = resultado
+        if not tree.winfo_exists():
+            return  # O painel foi fechado enquanto o relatório era calculado
+        tree.heading("Chave", text=DIMENSOES[dimensao])
+        for item in tree.get_children():
+            tree.delete(item)
+        for linha in linhas:
+            tree.insert("", tk.END, values=linha)
+        status_var.set(f"{relatorios.ultima_atualizacao['linhas']} linhas novas "
+                       f"em {relatorios.ultima_atualizacao['ms']:.0f} ms")
+    
+    def falhou(e):
+        status_var.set(f"Erro ao gerar relatório: {e}")
+    
+    def atualizar(event=None):
+        dimensao = next(chave for chave, nome in DIMENSOES.items() if nome == dimensao_entry.get())
+        inicio, fim = periodo(periodo_entry.get())
+        status_var.set("Calculando...")
+        # Na thread de I/O: a primeira vez (sem cache) lê o histórico inteiro
+        executor_io.enviar('relatorios', consultar, dimensao, inicio, fim,
+                           ao_concluir=mostrar, ao_falhar=falhou)
+        estacao.reiniciar_inatividade()
+    
+    dimensao_entry.bind('<<ComboboxSelected>>', atualizar)
+    periodo_entry.bind('<<ComboboxSelected>>', atualizar)
+    tk.Button(filtros_frame, text="Atualizar", command=atualizar,
+              font=("Arial", 10), bg='#3498db', fg='white').pack(side=tk.LEFT, padx=10)
+    atualizar()
 
-def atualizar_tabela_estoque(tree, estoque_data):
+def criar_aba_conciliacao(estacao, notebook):
+    """Aba que compara o estoque do modelo em uso num instante passado com o de agora"""
+    conciliacao_frame = tk.Frame(notebook, bg='white')
+    notebook.add(conciliacao_frame, text="Conciliação")
+    
+    filtros_frame = tk.Frame(conciliacao_frame, bg='white')
+    filtros_frame.pack(fill=tk.X, pady=5)
+    
+    tk.Label(filtros_frame, text="Estoque em (AAAA-MM-DD HH:MM:SS):", bg='white',
+             font=("Arial", 10)).pack(side=tk.LEFT, padx=5)
+    data_entry = tk.Entry(filtros_frame, width=20, font=("Arial", 10))
+    data_entry.insert(0, time.strftime("%Y-%m-%d %H:%M:%S"))
+    data_entry.pack(side=tk.LEFT, padx=5)
+    
+    status_var = tk.StringVar()
+    tk.Label(filtros_frame, textvariable=status_var, bg='white', fg='#7f8c8d',
+             font=("Arial", 9)).pack(side=tk.RIGHT, padx=5)
+    
+    columns = ("Área", "Peça", "Qtd no instante", "Qtd atual", "Diferença")
+    tree = ttk.Treeview(conciliacao_frame, columns=columns, show="headings", height=10)
+    for col in columns:
+        tree.heading(col, text=col)
+        tree.column(col, width=110, anchor=tk.CENTER)
+    scrollbar_table = ttk.Scrollbar(conciliacao_frame, orient=tk.VERTICAL, command=tree.yview)
+    tree.configure(yscrollcommand=scrollbar_table.set)
+    tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
+    scrollbar_table.pack(side=tk.RIGHT, fill=tk.Y)
+    
+    modelo = estacao.modelo_atual
+    
+    def mostrar(resultado):
+        if not tree.winfo_exists():
+            return  # O painel foi fechado durante a consulta
+        for item in tree.get_children():
+            tree.delete(item)
+        if resultado is None:
+            status_var.set("Sem histórico do estoque antes desse instante")
+            return
+        estoques_em, info = resultado
+        anterior = estoques_em.get(modelo, {})
+        for area, dados in sorted(estoques.get(modelo, {}).items()):
+            quantidade = anterior.get(area, {}).get("quantidade")
+            tree.insert("", tk.END, values=(
+                area,
+                dados["peca"],
+                "-" if quantidade is None else quantidade,
+                dados["quantidade"],
+                "-" if quantidade is None else dados["quantidade"] - quantidade
+            ))
+        status_var.set(f"Checkpoint {info['checkpoint']} + {info['reaplicadas']} alterações")
+    
+    def falhou(e):
+        status_var.set(f"Erro ao consultar o histórico: {e}")
+    
+    def consultar():
+        data_hora = data_entry.get().strip()
+        try:
+            time.strptime(data_hora, "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            messagebox.showerror("Erro", "Data/hora inválida! Use AAAA-MM-DD HH:MM:SS", parent=estacao.janela)
+            return
+        status_var.set("Consultando...")
+        # Na fila do armazenamento: vê todas as alterações já enviadas antes
+        executor_io.enviar('armazenamento', armazenamento.estoque_em, data_hora,
+                           ao_concluir=mostrar, ao_falhar=falhou)
+        estacao.reiniciar_inatividade()
+    
+    tk.Button(filtros_frame, text="Consultar", command=consultar,
+              font=("Arial", 10), bg='#3498db', fg='white').pack(side=tk.LEFT, padx=10)
+
+def atualizar_tabela_estoque(tree, modelo):
     """Atualiza a tabela de estoque"""
     for item in tree.get_children():
         tree.delete(item)
     
-    for area, dados in sorted(estoque_data.items()):
-        status = "✅ Suficiente" if dados["quantidade"] > dados["minimo"] else "⚠️ Abaixo do mínimo"
-        tree.insert("", tk.END, values=(
-            area, 
-            dados["peca"], 
-            dados["quantidade"], 
-            dados["minimo"],
-            status
-        ))
-
-def salvar_configuracao_admin(area_entry, quant_entry, min_entry, tree):
+    for area in sorted(modelo):
+        tree.insert("", tk.END, iid=area, values=valores_linha_estoque(modelo, area))
+
+def valores_linha_estoque(modelo, area):
+    status = "⚠️ Abaixo do mínimo" if modelo.esta_abaixo(area) else "✅ Suficiente"
+    return (area, modelo.peca(area), modelo.quantidade(area), modelo.minimo(area), status)
+
+def carregar_dados_area(estacao, area, quant_entry, min_entry, versoes):
+    """Preenche quantidade e mínimo da área e guarda a versão lida junto"""
+    lido = servico_estoque.ler(estacao.modelo_atual, area)
+    if lido is None:
+        return
+    quantidade, minimo, _, versoes[area] = lido
+    quant_entry.delete(0, tk.END)
+    quant_entry.insert(0, str(quantidade))
+    min_entry.delete(0, tk.END)
+    min_entry.insert(0, str(minimo))
+
+def salvar_configuracao_admin(estacao, area_entry, quant_entry, min_entry, tree, versoes):
     """Salva la configuración del stock mínimo"""
     area = area_entry.get()
     try:
@@ -642,60 +834,56 @@ def salvar_configuracao_admin(area_entry, quant_entry, min_entry, tree):
         if quantidade < 0 or minimo < 0:
             raise ValueError
     except ValueError:
-        messagebox.showerror("Erro", "Valores inválidos!")
+        messagebox.showerror("Erro", "Valores inválidos!", parent=estacao.janela)
         return
     
     if not area:
-        messagebox.showerror("Erro", "Selecione uma área!")
+        messagebox.showerror("Erro", "Selecione uma área!", parent=estacao.janela)
         return
     
-    # Atualizar estoque
-    if current_model == "313":
-        estoque_313[area]["quantidade"] = quantidade
-        estoque_313[area]["minimo"] = minimo
-    else:
-        estoque_314[area]["quantidade"] = quantidade
-        estoque_314[area]["minimo"] = minimo
+    # Atualizar estoque, só se ninguém alterou a área depois que ela foi carregada
+    versao = versoes.get(area)
+    nova_versao = None if versao is None else servico_estoque.comparar_e_definir(estacao.modelo_atual, area,
+                                                                                 versao, quantidade, minimo)
+    if nova_versao is None:
+        tree.item(area, values=valores_linha_estoque(estacao.atual, area))
+        carregar_dados_area(estacao, area, quant_entry, min_entry, versoes)
+        messagebox.showerror("Erro", "O estoque da área mudou desde que foi carregado (outra estação). "
+                             "Confira os valores atualizados e salve de novo.", parent=estacao.janela)
+        return
+    versoes[area] = nova_versao
     
-    salvar_estoque()
-    atualizar_tabela_estoque(tree, estoque)
-    messagebox.showinfo("Sucesso", "Configuração salva com sucesso!")
-    reset_inactivity_timer()
+    registrar_alteracao_estoque(estacao, area, quantidade, minimo)
+    tree.item(area, values=valores_linha_estoque(estacao.atual, area))
+    messagebox.showinfo("Sucesso", "Configuração salva com sucesso!", parent=estacao.janela)
+    estacao.reiniciar_inatividade()
 
-def voltar_tela_inicial():
+def voltar_tela_inicial(estacao):
     """Volta para a tela inicial de login"""
-    global bloquear_leitura, ultimo_rfid_lido, ultimo_tempo_leitura, current_user, current_user_role, current_model
-    
-    # Resetar todas as variáveis de sessão
-    current_user = None
-    current_user_role = None
-    current_model = None
-    bloquear_leitura = False
-    ultimo_rfid_lido = None
-    ultimo_tempo_leitura = 0
-    
-    # Cancelar todos os callbacks pendentes
-    cancel_pending_callbacks()
+    # Resetar as variáveis da sessão e cancelar os callbacks pendentes da estação
+    estacao.encerrar_sessao()
+    filtro_rfid.limpar(estacao.leitor_id)
     
     # Limpar a interface
-    for widget in root.winfo_children():
+    for widget in estacao.janela.winfo_children():
         widget.destroy()
     
     # Recriar a tela inicial
-    setup_main_screen()
+    setup_main_screen(estacao)
     
     # Reiniciar animação
-    start_wave_animation()
+    start_wave_animation(estacao)
 
 # ---------------- FUNÇÕES DE ANIMAÇÃO E GUI ----------------
 
-def draw_wave_animation():
+def draw_wave_animation(estacao):
     """Desenha a animação de onda"""
-    global wave_offset, wave_animation_active
+    wave_canvas = estacao.wave_canvas
+    wave_offset = estacao.wave_offset
     
-    if not wave_animation_active or not wave_canvas:
+    if not estacao.wave_ativa or not wave_canvas:
         if running:
-            schedule_callback(100, draw_wave_animation)
+            estacao.agendar(100, draw_wave_animation, estacao)
         return
     
     wave_canvas.delete("all")
@@ -729,29 +917,26 @@ def draw_wave_animation():
         wave_canvas.create_line(points2, fill="#2980b9", smooth=True, width=2)
         wave_canvas.create_line(points3, fill="#1abc9c", smooth=True, width=2)
     
-    wave_offset += 2
-    if wave_animation_active and running:
-        schedule_callback(30, draw_wave_animation)
+    estacao.wave_offset += 2
+    if estacao.wave_ativa and running:
+        estacao.agendar(30, draw_wave_animation, estacao)
 
-def start_wave_animation():
+def start_wave_animation(estacao):
     """Inicia a animação das ondas"""
-    global wave_animation_active
-    wave_animation_active = True
-    draw_wave_animation()
+    estacao.wave_ativa = True
+    draw_wave_animation(estacao)
 
-def stop_wave_animation():
+def stop_wave_animation(estacao):
     """Para a animação das ondas"""
-    global wave_animation_active
-    wave_animation_active = False
+    estacao.wave_ativa = False
 
-def setup_main_screen():
+def setup_main_screen(estacao):
     """Configura a tela inicial"""
-    global status_label, wave_canvas, wave_animation_active
-    
-    wave_animation_active = True
+    estacao.wave_ativa = True
+    estacao.tela = 'inicial'
     
     # Frame principal
-    main_frame = tk.Frame(root, bg='white')
+    main_frame = tk.Frame(estacao.janela, bg='white')
     main_frame.pack(fill=tk.BOTH, expand=True)
     
     # Título
@@ -760,11 +945,12 @@ def setup_main_screen():
     
     # Adicionar logo do sistema
     try:
-        if os.path.exists("system_icon.png"):
+        if 'logo' not in IMAGES and os.path.exists("system_icon.png"):
             logo_image = Image.open("system_icon.png")
             logo_image = logo_image.resize((100, 100), Image.LANCZOS)
-            logo_photo = ImageTk.PhotoImage(logo_image)
-            IMAGES['logo'] = logo_photo  # Manter referência
+            IMAGES['logo'] = ImageTk.PhotoImage(logo_image)  # Manter referência (uma para todas as estações)
+        logo_photo = IMAGES.get('logo')
+        if logo_photo is not None:
             logo_label = tk.Label(title_frame, image=logo_photo, bg='white')
             logo_label.pack(pady=(0, 10))
     except Exception as e:
@@ -776,14 +962,14 @@ def setup_main_screen():
              font=("Arial", 16), bg='white', fg='#7f8c8d').pack(pady=(0, 40))
     
     # Status
-    status_label = tk.Label(main_frame, text="Aproxime o cartão do leitor...", 
-                           font=("Arial", 14), fg="#3498db", bg='white')
-    status_label.pack(pady=(0, 20))
+    estacao.status_label = tk.Label(main_frame, text="Aproxime o cartão do leitor...", 
+                                    font=("Arial", 14), fg="#3498db", bg='white')
+    estacao.status_label.pack(pady=(0, 20))
     
     # Animação de onda
-    wave_canvas = tk.Canvas(main_frame, width=400, height=100, 
-                           highlightthickness=0, bg='white')
-    wave_canvas.pack(pady=20)
+    estacao.wave_canvas = tk.Canvas(main_frame, width=400, height=100, 
+                                    highlightthickness=0, bg='white')
+    estacao.wave_canvas.pack(pady=20)
     
     # Botão de sair
     footer_frame = tk.Frame(main_frame, bg='white')
@@ -793,100 +979,265 @@ def setup_main_screen():
                         font=("Arial", 10), bg='#e74c3c', fg='white')
     exit_btn.pack()
     
-    draw_wave_animation()
+    draw_wave_animation(estacao)
+
+def criar_estacoes(config_leitores):
+    """Uma estação por leitor: a primeira na janela principal, cada outra numa janela própria"""
+    global estacao_principal
+    for i, cfg in enumerate(config_leitores or [{"id": "estacao1"}]):
+        if i == 0:
+            janela = root
+        else:
+            janela = tk.Toplevel(root)
+            janela.title(f"MDC System - Replenishment System ({cfg['id']})")
+            janela.geometry("800x600")
+            janela.configure(bg='white')
+            janela.protocol("WM_DELETE_WINDOW", on_closing)
+        estacao = Estacao(cfg["id"], servico_estoque, root, janela=janela, ao_expirar=logout_by_inactivity)
+        estacoes[estacao.leitor_id] = estacao
+        if estacao_principal is None:
+            estacao_principal = estacao
+        setup_main_screen(estacao)
 
-def processar_rfid(rfid_tag):
-    """Processa o RFID lido"""
-    global ultimo_rfid_lido, ultimo_tempo_leitura, bloquear_leitura
+def processar_rfid(rfid_tag, t_fio=None, leitor_id=None):
+    """Processa o RFID lido na estação do leitor (leitor_id; None = simulação na principal)"""
+    estacao = estacoes.get(leitor_id, estacao_principal)
+    
+    if t_fio is not None:
+        latencia_rfid.registrar(time.perf_counter() - t_fio)
     
-    if bloquear_leitura:
-        print("Leitura bloqueada - formulário aberto")
+    if estacao.bloquear_leitura:
+        print(f"Leitura bloqueada - formulário aberto ({leitor_id or 'simulação'})")
         return
     
-    tempo_atual = time.time()
-    if rfid_tag == ultimo_rfid_lido and (tempo_atual - ultimo_tempo_leitura) < 3:
+    if not filtro_rfid.aceitar(rfid_tag, leitor_id):
         print("Leitura duplicada ignorada")
         return
     
-    ultimo_rfid_lido = rfid_tag
-    ultimo_tempo_leitura = tempo_atual
+    t_inicio = t_fio if t_fio is not None else time.perf_counter()
+    
+    if LOGIN_RAPIDO:
+        processar_rfid_com_delay(estacao, rfid_tag, t_inicio)
+        return
     
     # Primeiro mostra que o cartão foi lido
-    status_label.config(text="Cartão detectado...", fg="#f39c12")
+    estacao.status_label.config(text="Cartão detectado...", fg="#f39c12")
     root.update()
     
-    # Delay de 1 segundo antes de mostrar o nome
-    schedule_callback(1000, processar_rfid_com_delay, rfid_tag)
+    # Delay antes de mostrar o nome
+    estacao.agendar(ATRASO_DETECCAO_MS, processar_rfid_com_delay, estacao, rfid_tag, t_inicio)
+
+def processar_rfid_com_delay(estacao, rfid_tag, t_inicio=None):
+    """Identifica o crachá (após o delay, ou direto no login rápido)"""
+    # Se a estação não está mais na tela inicial, ignora o callback
+    if estacao.usuario is not None or estacao.bloquear_leitura:
+        return
+    
+    # O provedor nunca é consultado aqui: um crachá fora do cache chega depois
+    identidade = identidades.buscar(rfid_tag.strip(),
+                                    ao_resolver=lambda identidade: identificar(estacao, identidade, t_inicio))
+    if identidade is PENDENTE:
+        estacao.status_label.config(text="Consultando crachá...", fg="#f39c12")
+        return
+    identificar(estacao, identidade, t_inicio)
 
-def processar_rfid_com_delay(rfid_tag):
-    """Processa o RFID após o delay"""
-    # Se não estamos mais na tela inicial, ignora o callback
-    if current_user is not None or bloquear_leitura:
+def identificar(estacao, identidade, t_inicio=None):
+    """Entra com a identidade do crachá ou avisa que ele não foi reconhecido"""
+    # Outro crachá pode ter entrado enquanto o provedor respondia
+    if estacao.usuario is not None or estacao.bloquear_leitura:
         return
     
     # Verifica se é administrador
-    if rfid_tag.strip() in administradores:
-        nome = administradores[rfid_tag.strip()]
-        status_label.config(text=f"Administrador detectado! Olá, {nome}", fg="#9b59b6")
-        start_wave_animation()
-        root.update()
-        schedule_callback(800, lambda n=nome: mostrar_selecao_modelo(n, "admin"))
+    if identidade and identidade.papel == "admin":
+        nome = identidade.nome
+        estacao.status_label.config(text=f"Administrador detectado! Olá, {nome}", fg="#9b59b6")
+        entrar(estacao, nome, "admin", t_inicio)
         return
     
     # Verifica se é operador normal
-    nome = operadores.get(rfid_tag.strip(), None)
+    nome = identidade.nome if identidade else None
     
     if nome:
-        status_label.config(text=f"Cartão reconhecido! Olá, {nome}", fg="#27ae60")
-        start_wave_animation()
-        root.update()
-        schedule_callback(800, lambda n=nome: mostrar_selecao_modelo(n, "operador"))
+        estacao.status_label.config(text=f"Cartão reconhecido! Olá, {nome}", fg="#27ae60")
+        entrar(estacao, nome, "operador", t_inicio)
     else:
-        status_label.config(text="ID não reconhecido!", fg="#e74c3c")
+        estacao.status_label.config(text="ID não reconhecido!", fg="#e74c3c")
+        if not LOGIN_RAPIDO:
+            root.update()
+        estacao.agendar(1200, restaurar_status, estacao)
+    
+    estacao.reiniciar_inatividade()
+
+def entrar(estacao, nome, role, t_inicio=None):
+    """Abre a seleção de modelo (com a pausa de boas-vindas se não for login rápido)"""
+    if not LOGIN_RAPIDO:
+        start_wave_animation(estacao)
         root.update()
-        schedule_callback(1200, lambda: status_label.config(text="Aproxime o cartão do leitor...", fg="#3498db"))
-    
-    reset_inactivity_timer()
-
-def ler_serial_continuamente():
-    """Lê continuamente da porta serial em uma thread separada"""
-    global ser, running, bloquear_leitura
-    while running:
-        if ser and ser.in_waiting > 0:
-            try:
-                rfid_data = ser.readline()
-                rfid_tag = rfid_data.decode('utf-8').strip()
-                if rfid_tag:
-                    print(f"RFID lido: {rfid_tag}")
-                    # Usar lambda com captura explícita para evitar late binding
-                    root.after(0, lambda tag=rfid_tag: processar_rfid(tag))
-            except (UnicodeDecodeError, serial.SerialException) as e:
-                print(f"Erro na serial: {e}")
-                # Tentar reconectar após um erro
-                try:
-                    if ser:
-                        ser.close()
-                    time.sleep(2)
-                    ser = serial.Serial(PORTA_SERIAL, BAUD_RATE, timeout=1)
-                    print(f"Reconectado à porta {PORTA_SERIAL}")
-                except:
-                    print("Falha ao reconectar à porta serial")
-        time.sleep(0.1)
+        estacao.agendar(ATRASO_BOAS_VINDAS_MS, concluir_login, estacao, nome, role, t_inicio)
+        return
+    concluir_login(estacao, nome, role, t_inicio)
+
+def concluir_login(estacao, nome, role, t_inicio=None):
+    """Abre a sessão na estação, mostra a seleção de modelo e registra a latência do login"""
+    estacao.entrar(nome, role)
+    mostrar_selecao_modelo(estacao, nome, role)
+    if t_inicio is not None:
+        latencia_login.registrar(time.perf_counter() - t_inicio)
+
+def avisar_leitura_serial():
+    """Chamada pelas threads dos leitores: agenda a drenagem da fila no loop do Tk"""
+    if not drenagem_agendada.is_set():
+        drenagem_agendada.set()
+        root.after(0, drenar_leituras_serial)
+
+def drenar_leituras_serial():
+    """Entrega ao processar_rfid todas as leituras que estão na fila"""
+    drenagem_agendada.clear()
+    drenar_fila(ingestao.fila, processar_rfid)
+
+def abrir_porta_serial(cfg):
+    """Abre o transporte de um leitor (serial com leitura bloqueante, pty ou memória)"""
+    return criar_transporte(cfg, BAUD_RATE)
+
+def criar_identidades():
+    """Cria o cache de identidades sobre o provedor configurado"""
+    padrao = crachas_de_dicionarios(administradores, operadores)
+    try:
+        provedor = criar_provedor(IDENTIDADE, padrao)
+    except (ErroProvedor, OSError) as e:
+        print(f"Erro ao abrir o cadastro de crachás: {e}. Usando os IDs iniciais.")
+        provedor = ProvedorMemoria(padrao)
+    # As consultas ao provedor vão para o executor de I/O, nunca para o Tk
+    return CacheIdentidade(provedor, ttl=TTL_CACHE_CRACHAS, ttl_negativo=TTL_CRACHA_DESCONHECIDO,
+                           executor=executor_io)
+
+def preparar_crachas():
+    """Carrega os crachás no cache e envia a lista aos leitores (fora da thread do Tk)"""
+    try:
+        crachas = identidades.aquecer()
+    except ErroProvedor as e:
+        print(f"Não foi possível carregar os crachás: {e}")
+        return
+    print(f"{len(crachas)} crachás carregados")
+    sincronizar_leitores(list(crachas))
+
+def sincronizar_leitores(tags):
+    """Envia a lista de crachás cadastrados aos leitores com protocolo binário"""
+    for cfg in ingestao.config_leitores:
+        leitor = ingestao.leitores.get(cfg["id"])
+        if not leitor or cfg.get("protocolo", PROTOCOLO) != 'binario' or not cfg.get("lista_autorizados", True):
+            continue
+        threading.Thread(target=sincronizar_leitor, args=(leitor, tags), daemon=True).start()
+
+def sincronizar_leitor(leitor, tags):
+    """Sincroniza a lista de um leitor (roda fora da thread do Tk)"""
+    try:
+        resumo = sincronizar_lista(leitor.enviar, leitor.decodificador.respostas, tags)
+        if resumo["enviada"]:
+            print(f"Lista de autorizados enviada ao leitor {leitor.leitor_id}: {resumo}")
+        else:
+            print(f"Leitor {leitor.leitor_id} já tem a lista atual (versão {resumo['versao']:08X})")
+    except (ErroSincronizacao, OSError) as e:
+        print(f"Não foi possível sincronizar a lista do leitor {leitor.leitor_id}: {e}")
+
+def observar_configuracao():
+    """Observa o catálogo e o arquivo de crachás para recarregá-los sem reiniciar"""
+    observador = ObservadorArquivos()
+    observador.observar(ARQUIVO_CATALOGO, ao_mudar_catalogo)
+    if isinstance(identidades.provedor, ProvedorArquivo):
+        observador.observar(identidades.provedor.caminho, ao_mudar_crachas)
+    observador.start()
+    return observador
+
+def ao_mudar_catalogo(caminho):
+    """Lê e valida o catálogo na thread do observador; o Tk só recebe o resultado"""
+    try:
+        catalogo = ler_catalogo(caminho)
+    except (OSError, ValueError) as e:
+        print(f"Catálogo inválido, mantendo o anterior: {e}")
+        return
+    root.after(0, aplicar_novo_catalogo, catalogo)
+
+def aplicar_novo_catalogo(catalogo):
+    """Troca o catálogo entre duas leituras e reconstrói só as telas afetadas, em cada estação"""
+    modelos_antes = set(estoques)
+    alterados = servico_estoque.aplicar(catalogo)
+    if not alterados:
+        return
+    print(f"Catálogo recarregado (modelos alterados: {', '.join(sorted(alterados))})")
+    salvar_estoque()
+    
+    for estacao in estacoes.values():
+        if estacao.tela == 'selecao_modelo':
+            if set(estoques) != modelos_antes:
+                mostrar_selecao_modelo(estacao, estacao.usuario, estacao.papel)
+        elif estacao.tela in ('formulario', 'painel') and estacao.modelo_atual in alterados:
+            if estacao.atual is None:
+                # O modelo em uso saiu do catálogo: volta para a escolha de modelo
+                estacao.selecionar(None)
+                mostrar_selecao_modelo(estacao, estacao.usuario, estacao.papel)
+            elif estacao.tela == 'painel':
+                mostrar_painel_administrativo(estacao, estacao.usuario)
+            else:
+                mostrar_formulario(estacao, estacao.usuario)
+
+def ao_mudar_crachas(caminho):
+    """Lê o arquivo de crachás na thread do observador"""
+    try:
+        crachas = identidades.provedor.ler()
+    except ErroProvedor as e:
+        print(f"Arquivo de crachás inválido, mantendo o anterior: {e}")
+        return
+    root.after(0, aplicar_novos_crachas, crachas)
+
+def aplicar_novos_crachas(crachas):
+    """Troca os crachás entre duas leituras e reenvia a lista aos leitores"""
+    identidades.provedor.crachas = crachas
+    identidades.invalidar()
+    print(f"Crachás recarregados: {len(crachas)}")
+    threading.Thread(target=preparar_crachas, daemon=True).start()
 
 def on_closing():
     """Função chamada ao fechar a aplicação"""
-    global running, ser, logout_timer
+    global running, fechando
+    if fechando:
+        return  # Já rodou pela janela; o atexit não repete
+    fechando = True
     running = False
     
-    # Cancelar todos os callbacks pendentes
-    cancel_pending_callbacks()
-    
-    if ser:
-        try:
-            ser.close()
-        except:
-            pass
-    salvar_estoque()
+    # Cancelar os callbacks pendentes de todas as estações
+    for estacao in estacoes.values():
+        estacao.cancelar_agendados()
+    
+    if observador_config:
+        observador_config.parar()
+    resumo = latencia_login.resumo()
+    if resumo["n"]:
+        print(f"Latência de login: p50 {resumo['p50']:.1f} ms | p99 {resumo['p99']:.1f} ms ({resumo['n']} logins)")
+    if ingestao:
+        resumo = latencia_rfid.resumo()
+        if resumo["n"]:
+            print(f"Latência fio→processar_rfid: p50 {resumo['p50']:.2f} ms | p99 {resumo['p99']:.2f} ms ({resumo['n']} leituras)")
+        for leitor_id, estatisticas in ingestao.estatisticas_protocolo().items():
+            print(f"Protocolo {leitor_id}: {estatisticas}")
+        print(f"Filtro de duplicatas: {filtro_rfid.estatisticas()}")
+        print(f"Cache de crachás: {identidades.estatisticas()}")
+        ingestao.parar()
+    if gerador_crachas:
+        gerador_crachas.parar()
+        monitor_loop.parar()
+        resumo = monitor_loop.resumo()
+        print(f"Simulação: {gerador_crachas.enviados} leituras | atraso do loop Tk: p50 {resumo['p50']:.2f} ms | p99 {resumo['p99']:.2f} ms")
+    for callback_id in gravacoes_agendadas.values():
+        root.after_cancel(callback_id)  # fechar() grava os modelos que ainda estão sujos
+    gravacoes_agendadas.clear()
+    if executor_io and not executor_io.encerrando:
+        # Aqui sim espera o disco: as gravações pendentes terminam antes de sair
+        executor_io.enviar('armazenamento', armazenamento.fechar, ao_falhar=avisar_erro_estoque)
+        if not executor_io.parar(timeout=10):
+            print("Gravações pendentes não terminaram em 10 s")
+        print(f"Executor de I/O: {executor_io.estatisticas()}")
+        print(f"Armazenamento: {armazenamento.estatisticas()}")
     root.destroy()
 
 # ---------------- INICIALIZAÇÃO ----------------
@@ -900,37 +1251,55 @@ root.protocol("WM_DELETE_WINDOW", on_closing)
 # Registrar função de limpeza ao sair
 atexit.register(on_closing)
 
-# Carregar estoque
+# Carregar catálogo e estoque
+carregar_catalogo()
+estoques.inscrever(avisar_cruzamento_minimo)
+executor_io = ExecutorIO(TRABALHADORES_IO, agendar=agendar_na_interface)
+armazenamento = criar_armazenamento(ARMAZENAMENTO, estoques, ARQUIVO_REPOSICOES,
+                                    ARQUIVO_DIARIO_ESTOQUE, COMPACTAR_A_CADA,
+                                    ARQUIVO_HISTORICO_ESTOQUE)
 carregar_estoque()
+relatorios = criar_relatorios(armazenamento, ARQUIVO_REPOSICOES, ARQUIVO_CACHE_RELATORIOS)
 
-# Configurar a interface inicial
-setup_main_screen()
+# Configurar a interface inicial: uma estação (e uma tela) por leitor
+config_leitores = carregar_config_leitores(ARQUIVO_LEITORES, LEITORES)
+criar_estacoes(config_leitores)
 
 # ---------------- SERIAL ----------------
-try:
-    ser = serial.Serial(PORTA_SERIAL, BAUD_RATE, timeout=1)
-    print(f"Conectado à porta {PORTA_SERIAL}")
-    
-    serial_thread = threading.Thread(target=ler_serial_continuamente, daemon=True)
-    serial_thread.start()
-except serial.SerialException:
-    messagebox.showwarning("Aviso", f"Não foi possível conectar à porta {PORTA_SERIAL}\nModo simulação ativado.")
-    ser = None
-    
-    def simular_leitura(event):
-        if not bloquear_leitura:
-            # Clique direito = Admin, Clique esquerdo = Operador
+if SIMULADOR:
+    config_leitores = config_leitores + [{"id": "simulador", "transporte": "memoria",
+                                          "protocolo": PROTOCOLO, "lista_autorizados": False}]
+ingestao = ServicoIngestao(config_leitores,
+                           abrir_porta=abrir_porta_serial,
+                           ao_receber=avisar_leitura_serial,
+                           protocolo_padrao=PROTOCOLO,
+                           verboso=not SIMULADOR)
+conectados = ingestao.iniciar()
+identidades = criar_identidades()
+threading.Thread(target=preparar_crachas, daemon=True).start()
+observador_config = observar_configuracao()
+if SIMULADOR:
+    gerador_crachas = GeradorCrachas(ingestao.leitores["simulador"].porta.injetar,
+                                     protocolo=PROTOCOLO, **SIMULADOR)
+    gerador_crachas.start()
+    monitor_loop = MonitorLoop(root)
+    monitor_loop.iniciar()
+elif not conectados:
+    portas = ", ".join(str(cfg.get("porta")) for cfg in ingestao.config_leitores)
+    messagebox.showwarning("Aviso", f"Não foi possível conectar às portas {portas}\nModo simulação ativado.")
+    
+    def simular_leitura(estacao, event):
+        if not estacao.bloquear_leitura:
+            # Clique direito = Admin, Clique esquerdo = Operador (no leitor da janela clicada)
             if event.num == 3:  # Botão direito
-                processar_rfid("3A163602")  # Admin
+                processar_rfid("3A163602", leitor_id=estacao.leitor_id)  # Admin
             else:  # Botão esquerdo
-                processar_rfid("AD88C801")  # Operador
+                processar_rfid("AD88C801", leitor_id=estacao.leitor_id)  # Operador
     
-    root.bind('<Button-1>', simular_leitura)
-    root.bind('<Button-3>', simular_leitura)  # Botão direito
-    status_label.config(text="Modo simulação - Clique: esq=Operador, dir=Admin")
-
-# Inicia o timer de inatividade
-reset_inactivity_timer()
+    for estacao in estacoes.values():
+        estacao.janela.bind('<Button-1>', lambda event, estacao=estacao: simular_leitura(estacao, event))
+        estacao.janela.bind('<Button-3>', lambda event, estacao=estacao: simular_leitura(estacao, event))  # Botão direito
+        estacao.status_label.config(text="Modo simulação - Clique: esq=Operador, dir=Admin")
 
 root.mainloop()
 
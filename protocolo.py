@@ -0,0 +1,269 @@
+import binascii
+import queue
+import struct
+import time
+from collections import namedtuple
+
+# ---------------- PROTOCOLO LEITOR <-> HOST ----------------
+# Quadro binário (versão 1), usado no lugar das linhas de texto:
+#
+#   A5 5A | versão | tipo | seq (uint16 LE) | tamanho | payload | CRC16 (LE)
+#
+# O CRC é CRC-16/CCITT-FALSE (poly 0x1021, início 0xFFFF) calculado de
+# "versão" até o fim do payload. O parser descarta qualquer byte fora de
+# um quadro válido (banner, ruído de linha) e se ressincroniza no próximo
+# marcador A5 5A. Os comandos do host para o leitor (lista de autorizados,
+# ver lista_autorizados.py) usam o mesmo formato de quadro.
+
+MARCADOR = b'\xA5\x5A'
+VERSAO = 1
+TAMANHO_CABECALHO = 7  # marcador(2) + versão + tipo + seq(2) + tamanho
+TAMANHO_CRC = 2
+PAYLOAD_MAXIMO = 32
+
+# Leitor -> host
+TIPO_UID = 0x01  # payload = bytes crus do UID
+TIPO_INICIADO = 0x02  # payload = versão do firmware (texto)
+TIPO_RESP_VERSAO = 0x11  # payload = versão da lista (uint32) + total de tags (uint16)
+TIPO_ACK = 0x15  # payload = tipo do comando + status + versão/offset (uint32)
+
+# Host -> leitor
+TIPO_CMD_VERSAO = 0x10  # pede a versão da lista de autorizados
+TIPO_CMD_LISTA_INICIO = 0x12  # versão (uint32) + total (uint16)
+TIPO_CMD_LISTA_BLOCO = 0x13  # offset (uint16) + até 7 hashes (uint32)
+TIPO_CMD_LISTA_FIM = 0x14  # versão (uint32) + CRC16 dos hashes (uint16)
+
+Quadro = namedtuple('Quadro', ['tipo', 'seq', 'payload'])
+
+
+def crc16(dados, crc=0xFFFF):
+    """CRC-16/CCITT-FALSE"""
+    return binascii.crc_hqx(dados, crc)
+
+
+def montar_quadro(tipo, seq, payload=b''):
+    """Monta um quadro completo pronto para ser enviado"""
+    if len(payload) > PAYLOAD_MAXIMO:
+        raise ValueError(f"Payload maior que {PAYLOAD_MAXIMO} bytes")
+    corpo = struct.pack('<BBHB', VERSAO, tipo, seq & 0xFFFF, len(payload)) + bytes(payload)
+    return MARCADOR + corpo + struct.pack('<H', crc16(corpo))
+
+
+def uid_para_tag(uid):
+    """Converte os bytes do UID no formato usado pelo sistema ("AD88C801")"""
+    return bytes(uid).hex().upper()
+
+
+class DecodificadorLinhas:
+    """Protocolo legado: uma tag em hexadecimal por linha de texto"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.descartadas = 0
+
+    def decodificar(self, dados):
+        """Recebe bytes da porta e retorna as tags das linhas completas"""
+        self.buffer += dados
+        tags = []
+        while True:
+            fim = self.buffer.find(b'\n')
+            if fim < 0:
+                break
+            linha = bytes(self.buffer[:fim]).decode('utf-8', errors='replace').strip()
+            del self.buffer[:fim + 1]
+            if linha:
+                tags.append(linha)
+        return tags
+
+    def reiniciar(self):
+        self.buffer.clear()
+
+
+class ParserQuadros:
+    """Extrai quadros de um buffer reutilizável, com ressincronização e contadores"""
+
+    def __init__(self, capacidade=4096):
+        self.buf = bytearray(capacidade)
+        self.view = memoryview(self.buf)
+        self.inicio = 0
+        self.fim = 0
+        self.quadros = 0
+        self.erros_crc = 0
+        self.bytes_descartados = 0
+        self.seq_perdidas = 0
+        self.ultima_seq = None
+        self.t_inicio = time.monotonic()
+        # Respostas a comandos do host (ACK, versão da lista...)
+        self.respostas = queue.Queue(maxsize=64)
+
+    def alimentar(self, dados):
+        """Adiciona bytes recebidos e retorna a lista de quadros válidos"""
+        n = len(dados)
+        if self.fim + n > len(self.buf):
+            self._compactar()
+            if self.fim + n > len(self.buf):
+                # Mais dados do que cabe: descarta o que estava pendente
+                self.bytes_descartados += self.fim - self.inicio
+                self.inicio = self.fim = 0
+                if n > len(self.buf):
+                    self.bytes_descartados += n - len(self.buf)
+                    dados = dados[-len(self.buf):]
+                    n = len(dados)
+        self.view[self.fim:self.fim + n] = dados
+        self.fim += n
+        return self._extrair()
+
+    def _compactar(self):
+        """Move os bytes pendentes para o início do buffer"""
+        pendentes = self.fim - self.inicio
+        if self.inicio and pendentes:
+            self.view[:pendentes] = self.view[self.inicio:self.fim]
+        self.inicio, self.fim = 0, pendentes
+
+    def _extrair(self):
+        quadros = []
+        buf, view = self.buf, self.view
+        while True:
+            pos = buf.find(MARCADOR, self.inicio, self.fim)
+            if pos < 0:
+                # Guarda um possível primeiro byte do marcador no fim do buffer
+                resto = 1 if self.fim > self.inicio and buf[self.fim - 1] == MARCADOR[0] else 0
+                self.bytes_descartados += self.fim - self.inicio - resto
+                self.inicio = self.fim - resto
+                break
+            self.bytes_descartados += pos - self.inicio
+            self.inicio = pos
+            if self.fim - pos < TAMANHO_CABECALHO:
+                break
+            versao, tipo, seq, tamanho = struct.unpack_from('<BBHB', buf, pos + 2)
+            if versao != VERSAO or tamanho > PAYLOAD_MAXIMO:
+                self._pular_byte()
+                continue
+            total = TAMANHO_CABECALHO + tamanho + TAMANHO_CRC
+            if self.fim - pos < total:
+                break
+            fim_payload = pos + TAMANHO_CABECALHO + tamanho
+            crc_recebido = buf[fim_payload] | (buf[fim_payload + 1] << 8)
+            if crc16(view[pos + 2:fim_payload]) != crc_recebido:
+                self.erros_crc += 1
+                self._pular_byte()
+                continue
+            self._contar_seq(seq)
+            quadros.append(Quadro(tipo, seq, bytes(view[pos + TAMANHO_CABECALHO:fim_payload])))
+            self.quadros += 1
+            self.inicio = pos + total
+        if self.inicio == self.fim:
+            self.inicio = self.fim = 0
+        return quadros
+
+    def _pular_byte(self):
+        """Quadro inválido: procura o próximo marcador a partir do byte seguinte"""
+        self.bytes_descartados += 1
+        self.inicio += 1
+
+    def _contar_seq(self, seq):
+        if self.ultima_seq is not None:
+            salto = (seq - self.ultima_seq) & 0xFFFF
+            if 1 < salto < 0x8000:
+                self.seq_perdidas += salto - 1
+        self.ultima_seq = seq
+
+    def decodificar(self, dados):
+        """Interface de decodificador: retorna só as tags dos quadros de UID"""
+        tags = []
+        for quadro in self.alimentar(dados):
+            if quadro.tipo == TIPO_UID:
+                tags.append(uid_para_tag(quadro.payload))
+            elif quadro.tipo == TIPO_INICIADO:
+                print(f"Leitor iniciado (firmware {quadro.payload.decode('ascii', errors='replace')})")
+                self.ultima_seq = quadro.seq
+            else:
+                try:
+                    self.respostas.put_nowait(quadro)
+                except queue.Full:
+                    print(f"Resposta do leitor descartada (tipo 0x{quadro.tipo:02X})")
+        return tags
+
+    def reiniciar(self):
+        self.inicio = self.fim = 0
+        self.ultima_seq = None
+
+    def quadros_por_segundo(self):
+        decorrido = time.monotonic() - self.t_inicio
+        return self.quadros / decorrido if decorrido > 0 else 0.0
+
+    def estatisticas(self):
+        return {
+            "quadros": self.quadros,
+            "quadros_s": self.quadros_por_segundo(),
+            "erros_crc": self.erros_crc,
+            "bytes_descartados": self.bytes_descartados,
+            "seq_perdidas": self.seq_perdidas,
+        }
+
+
+def criar_decodificador(protocolo):
+    """Cria o decodificador para o protocolo configurado no leitor"""
+    if protocolo == 'binario':
+        return ParserQuadros()
+    if protocolo == 'texto':
+        return DecodificadorLinhas()
+    raise ValueError(f"Protocolo desconhecido: {protocolo}")
+
+
+# ---------------- EMULADOR DO FIRMWARE ----------------
+
+class CodificadorFirmware:
+    """Gera os bytes que o arduino.ino envia, com o número de sequência"""
+
+    VERSAO_FIRMWARE = b'2.0'
+
+    def __init__(self, protocolo='binario'):
+        self.protocolo = protocolo
+        self.seq = 0
+
+    def quadro(self, tipo, payload):
+        quadro = montar_quadro(tipo, self.seq, payload)
+        self.seq = (self.seq + 1) & 0xFFFF
+        return quadro
+
+    def iniciado(self):
+        """Equivalente ao setup(): aviso de leitor iniciado"""
+        if self.protocolo == 'binario':
+            return self.quadro(TIPO_INICIADO, self.VERSAO_FIRMWARE)
+        return b'RFID leitor iniciado\r\n'
+
+    def cartao(self, tag):
+        """Bytes que o firmware envia ao ler o cartão tag (hex)"""
+        if self.protocolo == 'binario':
+            return self.quadro(TIPO_UID, bytes.fromhex(tag))
+        return tag.upper().encode('ascii') + b'\r\n'
+
+
+def medir_parser(total=100000, taxa_ruido=0.01):
+    """Mede quadros/s do parser com ruído e corrupção aleatórios"""
+    import random
+    rnd = random.Random(1)
+    codificador = CodificadorFirmware()
+    fluxo = bytearray(codificador.iniciado())
+    corrompidos = 0
+    for i in range(total):
+        quadro = bytearray(codificador.cartao(f"{rnd.getrandbits(32):08X}"))
+        if rnd.random() < taxa_ruido:
+            quadro[rnd.randrange(2, len(quadro))] ^= 0xFF
+            corrompidos += 1
+        if rnd.random() < taxa_ruido:
+            fluxo += bytes(rnd.getrandbits(8) for _ in range(rnd.randrange(1, 20)))
+        fluxo += quadro
+    parser = ParserQuadros()
+    inicio = time.perf_counter()
+    tags = 0
+    for pos in range(0, len(fluxo), 64):
+        tags += len(parser.decodificar(fluxo[pos:pos + 64]))
+    duracao = time.perf_counter() - inicio
+    return tags / duracao, corrompidos, parser.estatisticas()
+
+
+if __name__ == "__main__":
+    quadros_s, corrompidos, estatisticas = medir_parser()
+    print(f"Parser: {quadros_s:.0f} quadros/s | corrompidos: {corrompidos} | {estatisticas}")
@@ -0,0 +1,428 @@
+import argparse
+import csv
+import io
+import json
+import os
+import time
+import zlib
+from datetime import date, timedelta
+
+from armazenamento import CABECALHO_CSV, ArmazenamentoSQLite
+from arquivo_colunar import ArquivoColunar, dia_e_hora
+from historico import EXTENSAO_ARQUIVADO, arquivos_historico
+from snapshot import gravar_atomico
+
+# ---------------- RELATÓRIOS DE CONSUMO ----------------
+# Agregados de reposições (quantas e quanto) por operador, área, peça,
+# modelo, hora, turno e dia, sempre separados por dia para poder filtrar um
+# período. O histórico é lido em blocos, só até a última linha completa, em
+# memória constante. O que já foi lido fica num cache (relatorios.cache.json)
+# com os agregados e, para cada arquivo, até onde ele foi processado: abrir
+# o relatório de novo só lê as linhas acrescentadas depois disso.
+#
+# Os arquivos são identificados pelo inode (a rotação do historico.py só
+# renomeia o arquivo) e pelo CRC32 do começo deles. Se um arquivo já
+# processado sumir, encolher ou mudar de conteúdo, o cache é refeito do zero
+# (inclusive quando um CSV rotacionado é arquivado no formato colunar; os
+# arquivados são somados pelas colunas, sem voltar a texto).
+#
+# Com o armazenamento SQLite as reposições só vão para a tabela reposicoes,
+# não para o CSV: RelatoriosSQLite responde as mesmas consultas com GROUP BY
+# no banco (ArmazenamentoSQLite.agregar_reposicoes), sem cache, porque o
+# banco está sempre em dia. criar_relatorios escolhe pelo armazenamento.
+
+DIMENSOES = {
+    "operador": "Operador",
+    "area": "Área",
+    "peca": "Peça",
+    "modelo": "Modelo",
+    "hora": "Hora",
+    "turno": "Turno",
+    "dia": "Dia",
+}
+# (nome, hora de início, hora de fim); o turno que passa da meia-noite conta no dia em que a linha foi gravada
+TURNOS = [("1º turno", 6, 14), ("2º turno", 14, 22), ("3º turno", 22, 6)]
+VERSAO_CACHE = 1
+BYTES_ASSINATURA = 4096  # Começo do arquivo conferido pelo CRC32
+TAMANHO_BLOCO = 1 << 20
+
+
+class Relatorios:
+    """Agregados do histórico de reposições, atualizados de forma incremental"""
+
+    def __init__(self, caminho_csv='reposicoes.csv', caminho_cache='relatorios.cache.json', turnos=TURNOS):
+        self.caminho_csv = caminho_csv
+        self.caminho_cache = caminho_cache  # None = sem cache em disco
+        self.turnos = turnos
+        self.turno_da_hora = _turnos_por_hora(turnos)
+        self.estado = None  # Carregado do cache na primeira atualização
+        self.linhas_invalidas = 0
+        self.reconstrucoes = 0
+        self.ultima_atualizacao = {"linhas": 0, "bytes": 0, "ms": 0.0}
+
+    # ---- cache ----
+
+    def _estado_vazio(self):
+        return {"versao": VERSAO_CACHE, "turnos": [list(t) for t in self.turnos],
+                "arquivos": {}, "agregados": {dimensao: {} for dimensao in DIMENSOES}}
+
+    def _ler_cache(self):
+        if self.caminho_cache and os.path.exists(self.caminho_cache):
+            try:
+                with open(self.caminho_cache, 'r', encoding='utf-8') as f:
+                    estado = json.load(f)
+                if (estado.get("versao") == VERSAO_CACHE
+                        and estado.get("turnos") == [list(t) for t in self.turnos]):
+                    return estado
+            except (OSError, ValueError) as e:
+                print(f"Cache de relatórios inválido, refazendo: {e}")
+        return self._estado_vazio()
+
+    def _gravar_cache(self):
+        if self.caminho_cache:
+            # É só um cache: se se perder, é refeito a partir do histórico
+            gravar_atomico(self.caminho_cache, json.dumps(self.estado, ensure_ascii=False).encode('utf-8'),
+                           'nenhuma')
+
+    # ---- atualização ----
+
+    def atualizar(self):
+        """Processa as linhas novas do histórico; retorna quantas foram processadas"""
+        inicio = time.perf_counter()
+        if self.estado is None:
+            self.estado = self._ler_cache()
+        arquivos = self._arquivos()
+        if not self._cache_confere(arquivos):
+            self.estado = self._estado_vazio()
+            self.reconstrucoes += 1
+        linhas = lidos = 0
+        for identidade, caminho, tamanho in arquivos:
+            info = self.estado["arquivos"].setdefault(identidade, {"offset": 0})
+            info["nome"] = os.path.basename(caminho)
+            if tamanho > info["offset"]:
+                n, novo_offset = self._processar(caminho, info["offset"])
+                linhas += n
+                lidos += novo_offset - info["offset"]
+                info["offset"] = novo_offset
+                info["assinatura"] = _assinatura(caminho, min(novo_offset, BYTES_ASSINATURA))
+        if lidos:
+            self._gravar_cache()
+        self.ultima_atualizacao = {"linhas": linhas, "bytes": lidos,
+                                   "ms": (time.perf_counter() - inicio) * 1000}
+        return linhas
+
+    def _arquivos(self):
+        """[(identidade, caminho, tamanho)] dos arquivos do histórico que existem"""
+        arquivos = []
+        for caminho in arquivos_historico(self.caminho_csv):
+            try:
+                st = os.stat(caminho)
+            except FileNotFoundError:
+                continue
+            identidade = str(st.st_ino) if st.st_ino else os.path.basename(caminho)
+            arquivos.append((identidade, caminho, st.st_size))
+        return arquivos
+
+    def _cache_confere(self, arquivos):
+        """True se tudo o que o cache já contou continua igual no disco"""
+        existentes = {identidade: (caminho, tamanho) for identidade, caminho, tamanho in arquivos}
+        for identidade, info in self.estado["arquivos"].items():
+            if identidade not in existentes:
+                return False
+            caminho, tamanho = existentes[identidade]
+            if tamanho < info["offset"]:
+                return False
+            bytes_assinatura = min(info["offset"], BYTES_ASSINATURA)
+            if _assinatura(caminho, bytes_assinatura) != info.get("assinatura"):
+                return False
+        return True
+
+    def _processar(self, caminho, offset):
+        """Acumula as linhas completas a partir de offset; retorna (linhas, novo offset)"""
+        if caminho.endswith(EXTENSAO_ARQUIVADO):
+            return self._processar_arquivado(caminho), os.path.getsize(caminho)
+        linhas = 0
+        with open(caminho, 'rb') as f:
+            f.seek(offset)
+            resto = b''
+            while True:
+                bloco = f.read(TAMANHO_BLOCO)
+                if not bloco:
+                    break
+                bloco = resto + bloco
+                corte = bloco.rfind(b'\n') + 1
+                resto = bloco[corte:]  # Linha ainda sendo escrita: fica para a próxima vez
+                if corte == 0:
+                    continue
+                offset += corte
+                texto = bloco[:corte].decode('utf-8', errors='replace')
+                for linha in csv.reader(io.StringIO(texto, newline='')):
+                    linhas += self._acumular(linha)
+        return linhas, offset
+
+    def _processar_arquivado(self, caminho):
+        """Acumula um arquivo colunar inteiro (não muda depois de gravado)"""
+        arquivo = ArquivoColunar(caminho)
+        grupos = {}  # (hora desde 1970, nome, área, peça, modelo) -> [reposições, quantidade]
+        for i in range(len(arquivo.blocos)):
+            colunas = arquivo.colunas(i)
+            for t, nome, area, peca, quantidade, modelo in zip(
+                    colunas["t"], colunas["nome"], colunas["area"], colunas["peca"],
+                    colunas["quantidade"], colunas["modelo"]):
+                par = grupos.get((t // 3600, nome, area, peca, modelo))
+                if par is None:
+                    grupos[(t // 3600, nome, area, peca, modelo)] = [1, quantidade]
+                else:
+                    par[0] += 1
+                    par[1] += quantidade
+        nomes, areas, pecas, modelos = (arquivo.dicionarios[campo] for campo in ("nome", "area", "peca", "modelo"))
+        agregados = self.estado["agregados"]
+        for (hora_absoluta, nome, area, peca, modelo), (reposicoes, quantidade) in grupos.items():
+            dia, hora = dia_e_hora(hora_absoluta * 3600)
+            for dimensao, chave in (("operador", nomes[nome]), ("area", areas[area]), ("peca", pecas[peca]),
+                                    ("modelo", modelos[modelo]), ("hora", f"{hora:02d}h"),
+                                    ("turno", self.turno_da_hora[hora]), ("dia", dia)):
+                par = agregados[dimensao].setdefault(dia, {}).setdefault(chave, [0, 0])
+                par[0] += reposicoes
+                par[1] += quantidade
+        return arquivo.linhas
+
+    def _acumular(self, linha):
+        if len(linha) < 6 or linha == CABECALHO_CSV:
+            return 0
+        data_hora, nome, area, peca, quantidade, modelo = linha[:6]
+        try:
+            quantidade = int(quantidade)
+            hora = int(data_hora[11:13])
+        except ValueError:
+            self.linhas_invalidas += 1
+            return 0
+        dia = data_hora[:10]
+        agregados = self.estado["agregados"]
+        for dimensao, chave in (("operador", nome), ("area", area), ("peca", peca), ("modelo", modelo),
+                                ("hora", f"{hora:02d}h"), ("turno", self.turno_da_hora[hora % 24]),
+                                ("dia", dia)):
+            par = agregados[dimensao].setdefault(dia, {}).setdefault(chave, [0, 0])
+            par[0] += 1
+            par[1] += quantidade
+        return 1
+
+    # ---- consulta ----
+
+    def consultar(self, dimensao, inicio=None, fim=None):
+        """[(chave, reposições, quantidade)] dos dias em [inicio, fim) ('AAAA-MM-DD')
+
+        Operador, área, peça e modelo vêm do maior consumo para o menor;
+        hora, dia e turno em ordem cronológica.
+        """
+        if self.estado is None:
+            self.atualizar()
+        totais = {}
+        for dia, chaves in self.estado["agregados"][dimensao].items():
+            if (inicio is not None and dia < inicio) or (fim is not None and dia >= fim):
+                continue
+            for chave, (reposicoes, quantidade) in chaves.items():
+                total = totais.setdefault(chave, [0, 0])
+                total[0] += reposicoes
+                total[1] += quantidade
+        linhas = [(chave, reposicoes, quantidade) for chave, (reposicoes, quantidade) in totais.items()]
+        return _ordenar(linhas, dimensao, self.turnos)
+
+    def estatisticas(self):
+        return {
+            "arquivos": len(self.estado["arquivos"]) if self.estado else 0,
+            "linhas_invalidas": self.linhas_invalidas,
+            "reconstrucoes": self.reconstrucoes,
+            "ultima_atualizacao": self.ultima_atualizacao,
+        }
+
+
+class RelatoriosSQLite:
+    """Os mesmos agregados de Relatorios, calculados pelo banco do ArmazenamentoSQLite"""
+
+    # Dimensão -> campo de agregar_reposicoes (turno sai das horas)
+    CAMPOS = {"operador": "nome", "area": "area", "peca": "peca", "modelo": "modelo",
+              "hora": "hora", "turno": "hora", "dia": "dia"}
+
+    def __init__(self, armazenamento, turnos=TURNOS):
+        self.armazenamento = armazenamento
+        self.turnos = turnos
+        self.turno_da_hora = _turnos_por_hora(turnos)
+        self.ultima_atualizacao = {"linhas": 0, "bytes": 0, "ms": 0.0}
+
+    def atualizar(self):
+        """Nada a processar: o banco já tem todas as reposições"""
+        return 0
+
+    def consultar(self, dimensao, inicio=None, fim=None):
+        """[(chave, reposições, quantidade)] dos dias em [inicio, fim), na ordem de Relatorios.consultar"""
+        comeco = time.perf_counter()
+        grupos = self.armazenamento.agregar_reposicoes(self.CAMPOS[dimensao], inicio, fim)
+        if dimensao in ("hora", "turno"):
+            totais = {}
+            for hora, reposicoes, quantidade in grupos:
+                chave = f"{hora:02d}h" if dimensao == "hora" else self.turno_da_hora[hora % 24]
+                total = totais.setdefault(chave, [0, 0])
+                total[0] += reposicoes
+                total[1] += quantidade
+            grupos = [(chave, reposicoes, quantidade) for chave, (reposicoes, quantidade) in totais.items()]
+        self.ultima_atualizacao = {"linhas": 0, "bytes": 0, "ms": (time.perf_counter() - comeco) * 1000}
+        return _ordenar([tuple(linha) for linha in grupos], dimensao, self.turnos)
+
+    def estatisticas(self):
+        return {"banco": self.armazenamento.caminho, "ultima_atualizacao": self.ultima_atualizacao}
+
+
+def criar_relatorios(armazenamento, caminho_csv='reposicoes.csv', caminho_cache='relatorios.cache.json'):
+    """Relatórios sobre onde o armazenamento grava as reposições (CSV ou banco SQLite)"""
+    if isinstance(armazenamento, ArmazenamentoSQLite):
+        return RelatoriosSQLite(armazenamento)
+    return Relatorios(caminho_csv, caminho_cache)
+
+
+def _turnos_por_hora(turnos):
+    """Nome do turno de cada hora do dia (0 a 23)"""
+    nomes = []
+    for hora in range(24):
+        for nome, inicio, fim in turnos:
+            if (inicio <= hora < fim) if inicio < fim else (hora >= inicio or hora < fim):
+                nomes.append(nome)
+                break
+        else:
+            nomes.append("Sem turno")
+    return nomes
+
+
+def _ordenar(linhas, dimensao, turnos):
+    """Operador, área, peça e modelo do maior consumo para o menor; hora, dia e turno em ordem cronológica"""
+    if dimensao == "turno":
+        ordem = [nome for nome, _, _ in turnos]
+        linhas.sort(key=lambda l: ordem.index(l[0]) if l[0] in ordem else len(ordem))
+    elif dimensao in ("hora", "dia"):
+        linhas.sort()
+    else:
+        linhas.sort(key=lambda l: (-l[2], l[0]))
+    return linhas
+
+
+def _assinatura(caminho, n_bytes):
+    with open(caminho, 'rb') as f:
+        return zlib.crc32(f.read(n_bytes))
+
+
+def periodo(nome, hoje=None):
+    """(inicio, fim) de 'hoje', '7 dias', '30 dias' ou 'tudo' para Relatorios.consultar"""
+    hoje = hoje or date.today()
+    amanha = (hoje + timedelta(days=1)).isoformat()
+    dias = {"hoje": 1, "7 dias": 7, "30 dias": 30}.get(nome)
+    if dias is None:
+        return None, None
+    return (hoje - timedelta(days=dias - 1)).isoformat(), amanha
+
+
+def medir_relatorios(dias=365, reposicoes_por_dia=300):
+    """Tempo de um relatório sobre um ano de histórico: varredura completa x cache incremental x SQLite
+
+    As mesmas reposições vão também para um banco do ArmazenamentoSQLite;
+    todas as dimensões e períodos têm de dar o mesmo resultado nos dois.
+    """
+    import random
+    import tempfile
+    rnd = random.Random(1)
+    operadores = [f"Operador {i}" for i in range(50)]
+    areas = [(f"A{i}", f"Peça {i}") for i in range(1, 7)]
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "reposicoes.csv")
+        cache = os.path.join(pasta, "relatorios.cache.json")
+        inicio_dados = date.today() - timedelta(days=dias)
+        with open(caminho, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(CABECALHO_CSV)
+            for d in range(dias):
+                dia = (inicio_dados + timedelta(days=d)).isoformat()
+                for _ in range(reposicoes_por_dia):
+                    area, peca = rnd.choice(areas)
+                    writer.writerow([f"{dia} {rnd.randrange(24):02d}:{rnd.randrange(60):02d}:00",
+                                     rnd.choice(operadores), area, peca, rnd.randint(1, 10),
+                                     rnd.choice(("313", "314"))])
+        resultados["linhas"] = dias * reposicoes_por_dia
+        resultados["tamanho_mb"] = round(os.path.getsize(caminho) / 1e6, 1)
+
+        inicio = time.perf_counter()
+        completo = Relatorios(caminho, cache)
+        completo.atualizar()
+        por_operador = completo.consultar("operador")
+        resultados["varredura_completa_ms"] = (time.perf_counter() - inicio) * 1000
+
+        # Reabrir (processo novo) com 20 reposições novas desde a última vez
+        with open(caminho, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            for _ in range(20):
+                writer.writerow([f"{date.today().isoformat()} 10:00:00", operadores[0], "A1", "Peça 1", 1, "313"])
+        inicio = time.perf_counter()
+        incremental = Relatorios(caminho, cache)
+        novas = incremental.atualizar()
+        por_operador_novo = incremental.consultar("operador")
+        resultados["reabrir_com_cache_ms"] = (time.perf_counter() - inicio) * 1000
+        assert novas == 20
+        assert (sum(l[2] for l in por_operador_novo) == sum(l[2] for l in por_operador) + 20)
+
+        inicio = time.perf_counter()
+        incremental.consultar("turno", *periodo("30 dias"))
+        resultados["consulta_30_dias_ms"] = (time.perf_counter() - inicio) * 1000
+
+        banco = ArmazenamentoSQLite({}, os.path.join(pasta, "estoque.db"), sincrono='OFF',
+                                    caminho_historico_estoque=os.path.join(pasta, "estoque.historico"))
+        with banco.lock, banco.conexao:
+            banco.conexao.executemany(
+                "INSERT INTO reposicoes (data_hora, nome, area, peca, quantidade, modelo) "
+                "VALUES (?, ?, ?, ?, ?, ?)", _linhas_csv(caminho))
+        sqlite = criar_relatorios(banco)
+        for dimensao in DIMENSOES:
+            for nome_periodo in ("hoje", "30 dias", "tudo"):
+                assert sqlite.consultar(dimensao, *periodo(nome_periodo)) == \
+                    incremental.consultar(dimensao, *periodo(nome_periodo)), (dimensao, nome_periodo)
+        for nome_periodo in ("30 dias", "tudo"):
+            inicio = time.perf_counter()
+            sqlite.consultar("operador", *periodo(nome_periodo))
+            resultados[f"sqlite_operador_{nome_periodo.replace(' ', '_')}_ms"] = (time.perf_counter() - inicio) * 1000
+        banco.fechar()
+    return resultados
+
+
+def _linhas_csv(caminho):
+    with open(caminho, 'r', newline='', encoding='utf-8') as f:
+        linhas = csv.reader(f)
+        next(linhas)
+        for data_hora, nome, area, peca, quantidade, modelo in linhas:
+            yield data_hora, nome, area, peca, int(quantidade), modelo
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Relatórios de consumo do histórico de reposições")
+    parser.add_argument("--por", choices=DIMENSOES, default="operador", help="agrupar por")
+    parser.add_argument("--de", help="primeiro dia (AAAA-MM-DD)")
+    parser.add_argument("--ate", help="dia seguinte ao último (AAAA-MM-DD)")
+    parser.add_argument("--periodo", choices=("hoje", "7 dias", "30 dias", "tudo"),
+                        help="atalho para --de/--ate")
+    parser.add_argument("--csv", default="reposicoes.csv", help="histórico de reposições")
+    parser.add_argument("--banco", help="banco do armazenamento SQLite (no lugar do CSV)")
+    parser.add_argument("--cache", default="relatorios.cache.json")
+    parser.add_argument("--sem-cache", action="store_true", help="lê o histórico inteiro sem usar o cache")
+    parser.add_argument("--medir", action="store_true", help="mede varredura completa x cache")
+    args = parser.parse_args()
+    if args.medir:
+        print(f"Relatórios: {medir_relatorios()}")
+    else:
+        if args.banco:
+            relatorios = RelatoriosSQLite(ArmazenamentoSQLite({}, args.banco))
+        else:
+            relatorios = Relatorios(args.csv, None if args.sem_cache else args.cache)
+        novas = relatorios.atualizar()
+        inicio, fim = periodo(args.periodo) if args.periodo else (args.de, args.ate)
+        linhas = relatorios.consultar(args.por, inicio, fim)
+        print(f"{DIMENSOES[args.por]:<20} {'Reposições':>10} {'Quantidade':>10}")
+        for chave, reposicoes, quantidade in linhas:
+            print(f"{chave:<20} {reposicoes:>10} {quantidade:>10}")
+        print(f"({novas} linhas novas processadas em {relatorios.ultima_atualizacao['ms']:.1f} ms)")
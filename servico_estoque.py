@@ -0,0 +1,467 @@
+import itertools
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# ---------------- SERVIÇO DE ESTOQUE ----------------
+# Toda alteração do estoque do catálogo passa por aqui, de qualquer thread
+# (o Tk, estações sem tela, escritores em segundo plano). Cada operação
+# confere e altera dentro da trava do modelo, então "conferir o saldo e
+# depois baixar" nunca se intercala com outra alteração da mesma área.
+#
+# A trava é por modelo, não por área: o índice de áreas abaixo do mínimo
+# (Modelo.ordem, ver catalogo.py) é uma lista só para as áreas do modelo.
+# Modelos diferentes não disputam a mesma trava.
+#
+# Cada área tem uma versão, que sobe a cada alteração. Quem mostra um valor
+# e grava depois (o painel do administrador) lê a versão junto e grava com
+# comparar_e_definir: se outra estação alterou a área no meio, a gravação é
+# recusada em vez de apagar a alteração da outra.
+#
+# Reservas: reservar separa uma quantidade do saldo disponível (quantidade
+# menos reservado) sem baixar; confirmar baixa, cancelar devolve ao
+# disponível. Cada reserva vence validade_reserva segundos depois de criada
+# ou renovada. Como a validade é a mesma para todas, a ordem do
+# OrderedDict de vencimentos já é a ordem em que vencem (como no
+# FiltroDuplicatas): criar, renovar e cancelar são O(1) e a expiração só
+# olha o início da fila, sem um timer por reserva. Ela roda no começo de
+# ler, baixar e reservar, então as peças de uma reserva vencida voltam ao
+# disponível antes de alguém conferir o saldo.
+#
+# Os inscritos do catálogo (Catalogo.inscrever) são avisados com a trava do
+# modelo tomada: não devem chamar o serviço.
+
+
+class _EstadoModelo:
+    __slots__ = ("trava", "versoes", "reservado", "baixas", "recusadas", "conflitos")
+
+    def __init__(self):
+        self.trava = threading.Lock()
+        self.versoes = {}  # área -> versão
+        self.reservado = {}  # área -> quantidade reservada
+        self.baixas = 0
+        self.recusadas = 0
+        self.conflitos = 0  # comparar_e_definir com versão vencida
+
+
+VALIDADE_RESERVA = 30.0  # Segundos que uma reserva dura sem ser renovada
+
+
+class ServicoEstoque:
+    """Operações atômicas sobre o estoque do catálogo, seguras entre threads"""
+
+    def __init__(self, catalogo, validade_reserva=VALIDADE_RESERVA, relogio=time.monotonic):
+        self.catalogo = catalogo
+        self.validade_reserva = validade_reserva
+        self.relogio = relogio
+        self.trava_catalogo = threading.Lock()  # Criação de estados e troca de catálogo
+        self.estados = {}  # modelo -> _EstadoModelo
+        self.reservas = {}  # id -> (modelo, área, quantidade)
+        self.trava_reservas = threading.Lock()  # Fila de vencimentos
+        self.vencimentos = OrderedDict()  # id -> instante em que vence, na ordem de vencimento
+        self.expiradas = 0
+        self._ids = itertools.count(1)
+
+    def _estado(self, modelo):
+        estado = self.estados.get(modelo)
+        if estado is None:
+            with self.trava_catalogo:
+                estado = self.estados.setdefault(modelo, _EstadoModelo())
+        return estado
+
+    def _modelo(self, modelo, area):
+        """Modelo do catálogo se a área existir (chamar com a trava do modelo)"""
+        atual = self.catalogo.get(modelo)
+        return atual if atual is not None and area in atual else None
+
+    # ---- leitura ----
+
+    def ler(self, modelo, area):
+        """(quantidade, mínimo, reservado, versão) da área, ou None se ela não existir"""
+        self.expirar_reservas()
+        estado = self._estado(modelo)
+        with estado.trava:
+            atual = self._modelo(modelo, area)
+            if atual is None:
+                return None
+            return (atual.quantidade(area), atual.minimo(area), estado.reservado.get(area, 0),
+                    estado.versoes.get(area, 0))
+
+    def disponivel(self, modelo, area):
+        """Quantidade que ainda pode ser baixada ou reservada (0 se a área não existir)"""
+        lido = self.ler(modelo, area)
+        return 0 if lido is None else lido[0] - lido[2]
+
+    # ---- alterações ----
+
+    def _definir(self, estado, atual, area, quantidade=None, minimo=None):
+        atual.definir(area, quantidade=quantidade, minimo=minimo)
+        estado.versoes[area] = estado.versoes.get(area, 0) + 1
+        return estado.versoes[area]
+
+    def baixar(self, modelo, area, quantidade):
+        """Confere o disponível e baixa numa operação só; False se não houver"""
+        self.expirar_reservas()
+        estado = self._estado(modelo)
+        with estado.trava:
+            atual = self._modelo(modelo, area)
+            if atual is None or atual.quantidade(area) - estado.reservado.get(area, 0) < quantidade:
+                estado.recusadas += 1
+                return False
+            self._definir(estado, atual, area, quantidade=atual.quantidade(area) - quantidade)
+            estado.baixas += 1
+            return True
+
+    def devolver(self, modelo, area, quantidade):
+        """Soma a quantidade à área (baixa desfeita ou entrada de peças); False se ela não existir"""
+        estado = self._estado(modelo)
+        with estado.trava:
+            atual = self._modelo(modelo, area)
+            if atual is None:
+                return False
+            self._definir(estado, atual, area, quantidade=atual.quantidade(area) + quantidade)
+            return True
+
+    def ajustar(self, modelo, area, quantidade=None, minimo=None):
+        """Define quantidade e/ou mínimo sem conferir a versão (carga, troca de catálogo)"""
+        estado = self._estado(modelo)
+        with estado.trava:
+            atual = self._modelo(modelo, area)
+            if atual is None:
+                return False
+            self._definir(estado, atual, area, quantidade, minimo)
+            return True
+
+    def comparar_e_definir(self, modelo, area, versao, quantidade=None, minimo=None):
+        """Define quantidade e/ou mínimo só se a área ainda estiver na versão lida
+
+        Retorna a nova versão da área, ou None (e não altera nada) se outra
+        alteração veio antes.
+        """
+        estado = self._estado(modelo)
+        with estado.trava:
+            atual = self._modelo(modelo, area)
+            if atual is None or estado.versoes.get(area, 0) != versao:
+                estado.conflitos += 1
+                return None
+            return self._definir(estado, atual, area, quantidade, minimo)
+
+    # ---- reservas ----
+
+    def reservar(self, modelo, area, quantidade):
+        """Separa a quantidade do disponível; retorna o ID da reserva, ou None se não houver"""
+        self.expirar_reservas()
+        estado = self._estado(modelo)
+        with estado.trava:
+            atual = self._modelo(modelo, area)
+            reservado = estado.reservado.get(area, 0)
+            if atual is None or atual.quantidade(area) - reservado < quantidade:
+                estado.recusadas += 1
+                return None
+            estado.reservado[area] = reservado + quantidade
+            reserva_id = next(self._ids)
+            self.reservas[reserva_id] = (modelo, area, quantidade)
+            with self.trava_reservas:
+                self.vencimentos[reserva_id] = self.relogio() + self.validade_reserva
+            return reserva_id
+
+    def renovar(self, reserva_id):
+        """Conta a validade da reserva de novo a partir de agora; False se ela já venceu ou acabou"""
+        agora = self.relogio()
+        with self.trava_reservas:
+            vence = self.vencimentos.get(reserva_id)
+            if vence is None or vence <= agora:
+                return False
+            self.vencimentos[reserva_id] = agora + self.validade_reserva
+            self.vencimentos.move_to_end(reserva_id)
+            return True
+
+    def expirar_reservas(self):
+        """Cancela as reservas vencidas (só olha o início da fila); retorna quantas"""
+        if not self.vencimentos:
+            return 0
+        agora = self.relogio()
+        vencidas = []
+        with self.trava_reservas:
+            vencimentos = self.vencimentos
+            while vencimentos:
+                reserva_id, vence = next(iter(vencimentos.items()))
+                if vence > agora:
+                    break
+                del vencimentos[reserva_id]
+                vencidas.append(reserva_id)
+        for reserva_id in vencidas:
+            if self.cancelar(reserva_id):
+                self.expiradas += 1
+        return len(vencidas)
+
+    def _tirar_reserva(self, reserva_id):
+        reserva = self.reservas.pop(reserva_id, None)
+        if reserva is not None:
+            with self.trava_reservas:
+                self.vencimentos.pop(reserva_id, None)
+        return reserva
+
+    def _liberar(self, estado, area, quantidade):
+        restante = estado.reservado.get(area, 0) - quantidade
+        if restante > 0:
+            estado.reservado[area] = restante
+        else:
+            estado.reservado.pop(area, None)
+
+    def confirmar(self, reserva_id):
+        """Baixa a quantidade reservada; False se a reserva não existir mais
+
+        Também False se um ajuste deixou a área com menos que o reservado:
+        a reserva é liberada sem baixar.
+        """
+        reserva = self._tirar_reserva(reserva_id)
+        if reserva is None:
+            return False
+        modelo, area, quantidade = reserva
+        estado = self._estado(modelo)
+        with estado.trava:
+            self._liberar(estado, area, quantidade)
+            atual = self._modelo(modelo, area)
+            if atual is None or atual.quantidade(area) < quantidade:
+                estado.recusadas += 1
+                return False
+            self._definir(estado, atual, area, quantidade=atual.quantidade(area) - quantidade)
+            estado.baixas += 1
+            return True
+
+    def cancelar(self, reserva_id):
+        """Devolve a quantidade reservada ao disponível; False se a reserva não existir mais"""
+        reserva = self._tirar_reserva(reserva_id)
+        if reserva is None:
+            return False
+        modelo, area, quantidade = reserva
+        estado = self._estado(modelo)
+        with estado.trava:
+            self._liberar(estado, area, quantidade)
+        return True
+
+    # ---- catálogo ----
+
+    def aplicar(self, catalogo):
+        """Catalogo.aplicar com todas as travas tomadas; retorna os modelos alterados
+
+        Reservas de modelos ou áreas que saíram do catálogo são canceladas.
+        """
+        with self.trava_catalogo:
+            travas = [self.estados[modelo].trava for modelo in sorted(self.estados)]
+            for trava in travas:
+                trava.acquire()
+            try:
+                alterados = self.catalogo.aplicar(catalogo)
+                for reserva_id, (modelo, area, quantidade) in list(self.reservas.items()):
+                    if self._modelo(modelo, area) is None:
+                        self._tirar_reserva(reserva_id)
+                        self._liberar(self.estados[modelo], area, quantidade)
+            finally:
+                for trava in reversed(travas):
+                    trava.release()
+        return alterados
+
+    def estatisticas(self):
+        estados = list(self.estados.values())
+        return {"baixas": sum(estado.baixas for estado in estados),
+                "recusadas": sum(estado.recusadas for estado in estados),
+                "conflitos": sum(estado.conflitos for estado in estados),
+                "reservas_abertas": len(self.reservas),
+                "reservas_expiradas": self.expiradas}
+
+
+def medir_servico_estoque(threads=(1, 4, 16), operacoes=200_000, areas=8, semente=1):
+    """Estresse com várias threads: conferir e baixar sem trava (como antes) x o serviço
+
+    Cada thread baixa de 1 a 3 peças de áreas sorteadas e às vezes devolve
+    uma baixa sua (como uma gravação que falhou), até o estoque acabar. No
+    fim, para cada modo: estoque final = inicial - baixado + devolvido,
+    nenhuma área negativa e o índice de mínimos igual a uma varredura. O
+    intervalo de troca de threads do interpretador é reduzido para que as
+    trocas caiam no meio das operações.
+    """
+    import random
+    from catalogo import Catalogo
+
+    def baixar_sem_trava(servico, modelo, area, quantidade):
+        atual = servico.catalogo[modelo]
+        disponivel = atual.quantidade(area)
+        if disponivel < quantidade:
+            return False
+        atual.definir(area, quantidade=disponivel - quantidade)
+        return True
+
+    def devolver_sem_trava(servico, modelo, area, quantidade):
+        atual = servico.catalogo[modelo]
+        atual.definir(area, quantidade=atual.quantidade(area) + quantidade)
+
+    def baixar_cas(servico, modelo, area, quantidade):
+        while True:
+            quantidade_lida, _, reservado, versao = servico.ler(modelo, area)
+            if quantidade_lida - reservado < quantidade:
+                return False
+            if servico.comparar_e_definir(modelo, area, versao, quantidade=quantidade_lida - quantidade) is not None:
+                return True
+
+    def baixar_reservando(servico, modelo, area, quantidade):
+        reserva_id = servico.reservar(modelo, area, quantidade)
+        return reserva_id is not None and servico.confirmar(reserva_id)
+
+    modos = {
+        "sem_trava": (baixar_sem_trava, devolver_sem_trava),
+        "baixar": (ServicoEstoque.baixar, ServicoEstoque.devolver),
+        "cas": (baixar_cas, ServicoEstoque.devolver),
+        "reserva": (baixar_reservando, ServicoEstoque.devolver),
+    }
+    inicial = operacoes // areas  # Cerca de metade dos pedidos encontra estoque
+    resultados = {"operacoes": operacoes, "areas": areas}
+    intervalo = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for n in threads:
+            for modo, (baixar, devolver) in modos.items():
+                catalogo = Catalogo.de_dicionario({"313": {f"A{i}": {"peca": f"Peça {i}", "quantidade": inicial,
+                                                                     "minimo": inicial // 2}
+                                                           for i in range(areas)}})
+                servico = ServicoEstoque(catalogo)
+                baixado = [0] * n
+                devolvido = [0] * n
+                erros = []
+                largada = threading.Barrier(n + 1)
+
+                def trabalhar(t):
+                    rnd = random.Random(semente * 1000 + t)
+                    minhas = []
+                    largada.wait()
+                    try:
+                        for _ in range(operacoes // n):
+                            area = f"A{rnd.randrange(areas)}"
+                            if minhas and rnd.random() < 0.1:
+                                area, quantidade = minhas.pop()
+                                devolver(servico, "313", area, quantidade)
+                                devolvido[t] += quantidade
+                                continue
+                            quantidade = rnd.randint(1, 3)
+                            if baixar(servico, "313", area, quantidade):
+                                baixado[t] += quantidade
+                                minhas.append((area, quantidade))
+                    except Exception as e:
+                        erros.append(e)  # Índice de mínimos corrompido por escritas concorrentes
+
+                trabalhadores = [threading.Thread(target=trabalhar, args=(t,)) for t in range(n)]
+                for trabalhador in trabalhadores:
+                    trabalhador.start()
+                largada.wait()
+                inicio = time.perf_counter()
+                for trabalhador in trabalhadores:
+                    trabalhador.join()
+                duracao = time.perf_counter() - inicio
+
+                modelo = catalogo["313"]
+                final = sum(modelo.quantidade(area) for area in modelo)
+                # Baixas que não chegaram ao estoque (perdidas por outra escrita no meio)
+                perdidas = final - (inicial * areas - sum(baixado) + sum(devolvido))
+                indice_ok = modelo.abaixo_do_minimo() == sorted(
+                    (area for area in modelo if modelo.quantidade(area) <= modelo.minimo(area)),
+                    key=lambda area: (modelo.quantidade(area) - modelo.minimo(area), area))
+                chave = f"{modo}_{n}t"
+                resultados[f"{chave}_ops_s"] = round(operacoes / duracao)
+                resultados[f"{chave}_baixas_perdidas"] = perdidas
+                if modo == "sem_trava":
+                    resultados[f"{chave}_erros"] = len(erros)
+                    resultados[f"{chave}_indice_ok"] = indice_ok
+                    continue
+                assert not erros, erros
+                assert perdidas == 0 and indice_ok
+                assert min(modelo.quantidade(area) for area in modelo) >= 0
+                assert not servico.reservas and servico.estatisticas()["reservas_abertas"] == 0
+                if modo == "cas":
+                    resultados[f"{chave}_conflitos"] = servico.estatisticas()["conflitos"]
+    finally:
+        sys.setswitchinterval(intervalo)
+    return resultados
+
+
+def medir_reservas(reservas=200_000, por_segundo=200, abandonadas=0.1, areas=8, semente=1):
+    """Expiração de reservas: um callback por reserva (after/after_cancel) x fila de vencimentos
+
+    Num relógio virtual, chega uma reserva a cada 1/por_segundo s. A maioria
+    é confirmada ou cancelada em 1 a 20 s; a fração abandonada fica até
+    vencer. Com um callback por reserva, cada uma agenda o seu vencimento e
+    cancela ao terminar (o cancelado fica no heap até a hora dele, como no
+    Tk). Com a fila, o serviço expira sozinho. Os dois modos terminam com o
+    mesmo estoque, as mesmas reservas vencidas e nada reservado.
+    """
+    import heapq
+    import random
+    from catalogo import Catalogo
+    from estacao import LoopSimulado
+    validade_ms = int(VALIDADE_RESERVA * 1000)
+    passo_ms = 1000 / por_segundo
+    resultados = {"reservas": reservas, "validade_s": VALIDADE_RESERVA}
+    finais = {}
+    for modo in ("callback_por_reserva", "fila_vencimentos"):
+        rnd = random.Random(semente)
+        catalogo = Catalogo.de_dicionario({"313": {f"A{i}": {"peca": f"Peça {i}", "quantidade": 10 ** 9,
+                                                             "minimo": 0}
+                                                   for i in range(areas)}})
+        loop = LoopSimulado()
+        if modo == "fila_vencimentos":
+            servico = ServicoEstoque(catalogo, relogio=lambda: loop.agora_ms / 1000)
+        else:
+            servico = ServicoEstoque(catalogo, validade_reserva=float("inf"), relogio=lambda: 0)
+        timers = {}  # id da reserva -> id do after
+        vencidas = [0]
+        maior_fila = 0
+
+        def vencer(reserva_id):
+            timers.pop(reserva_id, None)
+            if servico.cancelar(reserva_id):
+                vencidas[0] += 1
+
+        fim_das_reservas = []  # heap (instante, id, confirmar), igual nos dois modos
+        inicio = time.perf_counter()
+        for i in range(reservas):
+            agora = i * passo_ms
+            while fim_das_reservas and fim_das_reservas[0][0] <= agora:
+                _, reserva_id, confirmar = heapq.heappop(fim_das_reservas)
+                if reserva_id in timers:
+                    loop.after_cancel(timers.pop(reserva_id))
+                (servico.confirmar if confirmar else servico.cancelar)(reserva_id)
+            loop.rodar(ate_ms=agora)
+            loop.agora_ms = agora
+            reserva_id = servico.reservar("313", f"A{rnd.randrange(areas)}", rnd.randint(1, 5))
+            if modo == "callback_por_reserva":
+                timers[reserva_id] = loop.after(validade_ms, vencer, reserva_id)
+                maior_fila = max(maior_fila, len(loop.fila))
+            else:
+                maior_fila = max(maior_fila, len(servico.vencimentos))
+            if rnd.random() >= abandonadas:
+                heapq.heappush(fim_das_reservas, (agora + rnd.randint(1000, 20000), reserva_id, rnd.random() < 0.8))
+        # Termina as que faltam e deixa vencer as abandonadas
+        for _, reserva_id, confirmar in fim_das_reservas:
+            if reserva_id in timers:
+                loop.after_cancel(timers.pop(reserva_id))
+            (servico.confirmar if confirmar else servico.cancelar)(reserva_id)
+        loop.agora_ms = reservas * passo_ms + validade_ms
+        loop.rodar()
+        servico.expirar_reservas()
+        duracao = time.perf_counter() - inicio
+
+        modelo = catalogo["313"]
+        assert not servico.reservas and not servico.vencimentos and not timers
+        assert all(not estado.reservado for estado in servico.estados.values())
+        finais[modo] = ({area: modelo.quantidade(area) for area in modelo}, vencidas[0] + servico.expiradas)
+        resultados[f"{modo}_reservas_s"] = round(reservas / duracao)
+        resultados[f"{modo}_maior_fila"] = maior_fila
+    assert finais["callback_por_reserva"] == finais["fila_vencimentos"]
+    resultados["vencidas"] = finais["fila_vencimentos"][1]
+    return resultados
+
+
+if __name__ == "__main__":
+    print(f"Serviço de estoque: {medir_servico_estoque()}")
+    print(f"Reservas: {medir_reservas()}")
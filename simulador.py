@@ -0,0 +1,225 @@
+import argparse
+import bisect
+import itertools
+import queue
+import random
+import threading
+import time
+
+from leitor_serial import MedidorLatencia, ServicoIngestao, drenar_fila
+from protocolo import CodificadorFirmware
+from transportes import TransporteMemoria, TransportePty
+
+# ---------------- SIMULADOR DE CRACHÁS ----------------
+# Gera fluxos de leituras como o firmware geraria, de alguns crachás por
+# minuto até milhares por segundo, para medir o processar_rfid e o loop do
+# Tk sob rajadas sem precisar do chão de fábrica.
+
+DISTRIBUICOES = ('uniforme', 'zipf', 'sequencial')
+
+
+class GeradorCrachas(threading.Thread):
+    """Escreve leituras simuladas no lado do dispositivo de um transporte"""
+
+    def __init__(self, escrever, taxa=1.0, tags=None, n_tags=100, distribuicao='uniforme',
+                 zipf_s=1.2, ruido=0.0, protocolo='binario', duracao=None, total=None,
+                 semente=None):
+        super().__init__(daemon=True, name="gerador-crachas")
+        if distribuicao not in DISTRIBUICOES:
+            raise ValueError(f"Distribuição desconhecida: {distribuicao}")
+        self.escrever = escrever  # Ex.: transporte.injetar
+        self.taxa = float(taxa)  # Leituras por segundo (0.05 = 3 por minuto)
+        self.rnd = random.Random(semente)
+        self.tags = list(tags) if tags else [f"{self.rnd.getrandbits(32):08X}" for _ in range(n_tags)]
+        self.distribuicao = distribuicao
+        self.ruido = ruido  # Probabilidade de ruído/corrupção por leitura
+        self.codificador = CodificadorFirmware(protocolo)
+        self.duracao = duracao
+        self.total = total
+        self.enviados = 0
+        self.com_ruido = 0
+        self.running = True
+        self._sequencia = itertools.cycle(self.tags)
+        # Pesos acumulados da Zipf: poucos crachás concentram a maior parte das leituras
+        pesos = itertools.accumulate(1 / (k ** zipf_s) for k in range(1, len(self.tags) + 1))
+        self._zipf_acumulado = list(pesos)
+
+    def proxima_tag(self):
+        if self.distribuicao == 'sequencial':
+            return next(self._sequencia)
+        if self.distribuicao == 'zipf':
+            alvo = self.rnd.random() * self._zipf_acumulado[-1]
+            return self.tags[bisect.bisect_left(self._zipf_acumulado, alvo)]
+        return self.rnd.choice(self.tags)
+
+    def _leitura(self):
+        """Bytes de uma leitura, com ruído de linha ou corrupção conforme self.ruido"""
+        dados = self.codificador.cartao(self.proxima_tag())
+        if self.ruido and self.rnd.random() < self.ruido:
+            self.com_ruido += 1
+            if self.rnd.random() < 0.5:
+                lixo = bytes(self.rnd.getrandbits(8) for _ in range(self.rnd.randrange(1, 16)))
+                return lixo + dados
+            corrompido = bytearray(dados)
+            corrompido[self.rnd.randrange(len(corrompido))] ^= 0xFF
+            return bytes(corrompido)
+        return dados
+
+    def run(self):
+        inicio = time.perf_counter()
+        while self.running:
+            decorrido = time.perf_counter() - inicio
+            if self.duracao is not None and decorrido >= self.duracao:
+                break
+            if self.total is not None and self.enviados >= self.total:
+                break
+            devidos = int(decorrido * self.taxa) - self.enviados
+            if self.total is not None:
+                devidos = min(devidos, self.total - self.enviados)
+            if devidos <= 0:
+                # Dorme até a próxima leitura programada
+                time.sleep(min(0.5, (self.enviados + 1) / self.taxa - decorrido))
+                continue
+            # Em taxas altas envia em lotes, como chegariam num buffer de UART
+            lote = bytearray()
+            for _ in range(min(devidos, 1000)):
+                lote += self._leitura()
+            self.escrever(bytes(lote))
+            self.enviados += min(devidos, 1000)
+
+    def parar(self):
+        self.running = False
+
+
+class MonitorLoop:
+    """Mede o atraso do loop do Tk agendando um after() periódico"""
+
+    def __init__(self, root, intervalo_ms=10):
+        self.root = root
+        self.intervalo_ms = intervalo_ms
+        self.atrasos = MedidorLatencia()
+        self.after_id = None
+        self.previsto = None
+
+    def iniciar(self):
+        self.previsto = time.perf_counter() + self.intervalo_ms / 1000
+        self.after_id = self.root.after(self.intervalo_ms, self._tick)
+
+    def _tick(self):
+        agora = time.perf_counter()
+        self.atrasos.registrar(max(0.0, agora - self.previsto))
+        self.previsto = agora + self.intervalo_ms / 1000
+        self.after_id = self.root.after(self.intervalo_ms, self._tick)
+
+    def parar(self):
+        if self.after_id:
+            try:
+                self.root.after_cancel(self.after_id)
+            except Exception:
+                pass
+            self.after_id = None
+
+    def resumo(self):
+        return self.atrasos.resumo()
+
+
+# ---------------- TESTE DE CARGA ----------------
+
+def medir_carga(taxa, duracao, protocolo='binario', processar=None, **opcoes):
+    """Alimenta um ServicoIngestao em memória e mede vazão, latência e perdas"""
+    transporte = TransporteMemoria()
+    servico = ServicoIngestao([{"id": "simulador", "transporte": "memoria"}], abrir_porta=lambda cfg: transporte,
+                              protocolo_padrao=protocolo, tamanho_fila=4096, verboso=False)
+    servico.iniciar()
+    gerador = GeradorCrachas(transporte.injetar, taxa=taxa, duracao=duracao,
+                             protocolo=protocolo, **opcoes)
+    latencia = MedidorLatencia()
+    recebidas = 0
+    gerador.start()
+    while gerador.is_alive() or not servico.fila.empty():
+        try:
+            leitura = servico.fila.get(timeout=0.2)
+        except queue.Empty:
+            continue
+        latencia.registrar(time.perf_counter() - leitura.t_fio)
+        if processar:
+            processar(leitura.tag)
+        recebidas += 1
+    resultado = {
+        "enviadas": gerador.enviados,
+        "com_ruido": gerador.com_ruido,
+        "recebidas": recebidas,
+        "descartadas": servico.descartadas()["simulador"],
+        "leituras_s": recebidas / duracao,
+        "latencia": latencia.resumo(),
+        "protocolo": servico.estatisticas_protocolo().get("simulador"),
+    }
+    servico.parar()
+    return resultado
+
+
+def medir_carga_tk(taxa, duracao, protocolo='binario', **opcoes):
+    """Mesma carga, mas entregue ao loop do Tk como no main.py (after + drenagem)"""
+    import tkinter as tk
+
+    root = tk.Tk()
+    label = tk.Label(root, text="")
+    label.pack()
+    transporte = TransporteMemoria()
+    agendada = threading.Event()
+    latencia = MedidorLatencia()
+
+    def processar(tag, t_fio, leitor_id):
+        latencia.registrar(time.perf_counter() - t_fio)
+        label.config(text=f"Cartão detectado... {tag}")
+
+    def drenar():
+        agendada.clear()
+        drenar_fila(servico.fila, processar)
+
+    def avisar():
+        if not agendada.is_set():
+            agendada.set()
+            root.after(0, drenar)
+
+    servico = ServicoIngestao([{"id": "simulador", "transporte": "memoria"}], abrir_porta=lambda cfg: transporte,
+                              ao_receber=avisar, protocolo_padrao=protocolo, tamanho_fila=4096,
+                              verboso=False)
+    servico.iniciar()
+    monitor = MonitorLoop(root)
+    monitor.iniciar()
+    GeradorCrachas(transporte.injetar, taxa=taxa, duracao=duracao, protocolo=protocolo, **opcoes).start()
+    root.after(int(duracao * 1000) + 500, root.quit)
+    root.mainloop()
+    monitor.parar()
+    servico.parar()
+    root.destroy()
+    return {"latencia": latencia.resumo(), "atraso_loop": monitor.resumo(),
+            "descartadas": servico.descartadas()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulador de crachás RFID")
+    parser.add_argument("--taxa", type=float, default=1000, help="leituras por segundo (0.05 = 3/min)")
+    parser.add_argument("--duracao", type=float, default=5, help="segundos de simulação")
+    parser.add_argument("--distribuicao", choices=DISTRIBUICOES, default='uniforme')
+    parser.add_argument("--tags", type=int, default=100, help="quantidade de crachás distintos")
+    parser.add_argument("--ruido", type=float, default=0.0, help="probabilidade de ruído por leitura")
+    parser.add_argument("--protocolo", choices=('binario', 'texto'), default='binario')
+    parser.add_argument("--pty", action="store_true",
+                        help="cria um pseudo-terminal para o main.py abrir como porta serial")
+    parser.add_argument("--tk", action="store_true", help="mede também o loop do Tk")
+    args = parser.parse_args()
+    opcoes = {"n_tags": args.tags, "distribuicao": args.distribuicao, "ruido": args.ruido}
+
+    if args.pty:
+        pty_transporte = TransportePty()
+        print(f"Use no leitores.json: \"porta\": \"{pty_transporte.caminho}\"")
+        gerador = GeradorCrachas(pty_transporte.injetar, taxa=args.taxa, duracao=args.duracao,
+                                 protocolo=args.protocolo, **opcoes)
+        gerador.run()
+        print(f"Enviadas: {gerador.enviados} (com ruído: {gerador.com_ruido})")
+    elif args.tk:
+        print(medir_carga_tk(args.taxa, args.duracao, args.protocolo, **opcoes))
+    else:
+        print(medir_carga(args.taxa, args.duracao, args.protocolo, **opcoes))
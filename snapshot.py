@@ -0,0 +1,208 @@
+import glob
+import json
+import os
+import tempfile
+import time
+import zlib
+
+# ---------------- SNAPSHOTS DURÁVEIS ----------------
+# Cada snapshot é gravado numa geração nova (<caminho>.g<N>), nunca por cima
+# da anterior. O arquivo tem uma linha de cabeçalho (formato, geração,
+# tamanho e CRC32 do corpo) seguida do corpo em JSON. A gravação usa um
+# arquivo temporário na mesma pasta (os.replace não funciona entre sistemas
+# de arquivos) e, conforme a durabilidade, fsync do arquivo e da pasta.
+#
+# Na carga vale a geração mais nova que passa na conferência; gerações
+# inválidas são renomeadas para .corrompido (ficam para análise e não são
+# apagadas pela limpeza das antigas).
+#
+# Durabilidade:
+#   'nenhuma'  - sem fsync: o sistema grava quando quiser (mais rápido)
+#   'arquivo'  - fsync do arquivo antes do rename: o conteúdo nunca fica pela
+#                metade, mas o rename pode se perder e a carga volta uma geração
+#   'completa' - fsync do arquivo e da pasta: a geração nova sobrevive a uma
+#                queda de energia logo depois da gravação
+
+FORMATO = "snapshot-estoque"
+VERSAO_FORMATO = 1
+DURABILIDADES = ('nenhuma', 'arquivo', 'completa')
+
+
+class SnapshotInvalido(Exception):
+    pass
+
+
+def serializar(dados):
+    """Corpo do snapshot (JSON em UTF-8)"""
+    return json.dumps(dados, ensure_ascii=False).encode('utf-8')
+
+
+def codificar(corpo, geracao):
+    cabecalho = json.dumps({"formato": FORMATO, "versao": VERSAO_FORMATO, "geracao": geracao,
+                            "tamanho": len(corpo), "crc32": zlib.crc32(corpo)})
+    return cabecalho.encode('ascii') + b'\n' + corpo
+
+
+def decodificar(conteudo):
+    """Confere cabeçalho, tamanho e CRC; retorna (geração, dados)"""
+    cabecalho, separador, corpo = conteudo.partition(b'\n')
+    try:
+        cabecalho = json.loads(cabecalho)
+        if cabecalho.get("formato") != FORMATO or not separador:
+            raise SnapshotInvalido("cabeçalho ausente")
+        if cabecalho["versao"] > VERSAO_FORMATO:
+            raise SnapshotInvalido(f"versão {cabecalho['versao']} desconhecida")
+        if len(corpo) != cabecalho["tamanho"]:
+            raise SnapshotInvalido(f"tamanho {len(corpo)}, esperado {cabecalho['tamanho']}")
+        if zlib.crc32(corpo) != cabecalho["crc32"]:
+            raise SnapshotInvalido("CRC32 não confere")
+        return cabecalho["geracao"], json.loads(corpo)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise SnapshotInvalido(str(e))
+
+
+def sincronizar_pasta(pasta):
+    """fsync da pasta, para o rename sobreviver a uma queda de energia"""
+    if os.name != 'posix':
+        return  # No Windows não há como abrir a pasta; o NTFS registra o rename no journal dele
+    fd = os.open(pasta, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def gravar_atomico(destino, conteudo, durabilidade='completa'):
+    """Grava bytes em destino via arquivo temporário na mesma pasta + os.replace"""
+    if durabilidade not in DURABILIDADES:
+        raise ValueError(f"Durabilidade desconhecida: {durabilidade}")
+    pasta = os.path.dirname(os.path.abspath(destino))
+    fd, temporario = tempfile.mkstemp(dir=pasta, prefix=f".{os.path.basename(destino)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(conteudo)
+            if durabilidade != 'nenhuma':
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temporario, destino)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    if durabilidade == 'completa':
+        sincronizar_pasta(pasta)
+
+
+class Snapshots:
+    """Gerações de snapshot de um arquivo, com recuperação da mais nova válida"""
+
+    def __init__(self, caminho, manter=3, durabilidade='completa'):
+        if durabilidade not in DURABILIDADES:
+            raise ValueError(f"Durabilidade desconhecida: {durabilidade}")
+        self.caminho = caminho  # Sem geração: formato antigo (JSON puro), só lido
+        self.manter = manter
+        self.durabilidade = durabilidade
+        self.ultima = max((n for n, _ in self.geracoes()), default=0)
+        self.invalidas = 0
+        self.geracao_carregada = None
+
+    def _caminho_geracao(self, geracao):
+        return f"{self.caminho}.g{geracao:06d}"
+
+    def geracoes(self):
+        """[(geração, caminho)] da mais nova para a mais antiga"""
+        prefixo = self.caminho + '.g'
+        encontradas = []
+        for caminho in glob.glob(glob.escape(prefixo) + '*'):
+            sufixo = caminho[len(prefixo):]
+            if sufixo.isdigit():
+                encontradas.append((int(sufixo), caminho))
+        return sorted(encontradas, reverse=True)
+
+    def gravar(self, corpo):
+        """Grava uma geração nova com o corpo serializado (bytes); retorna a geração
+
+        As gerações que passarem de 'manter' são apagadas.
+        """
+        self.ultima += 1
+        gravar_atomico(self._caminho_geracao(self.ultima), codificar(corpo, self.ultima),
+                       self.durabilidade)
+        for _, caminho in self.geracoes()[self.manter:]:
+            os.remove(caminho)
+        return self.ultima
+
+    def carregar(self):
+        """Dados da geração mais nova válida (ou do arquivo antigo); None se não houver nada
+
+        Levanta SnapshotInvalido se existem snapshots mas nenhum pôde ser lido.
+        """
+        self._limpar_temporarios()
+        geracoes = self.geracoes()
+        for geracao, caminho in geracoes:
+            try:
+                with open(caminho, 'rb') as f:
+                    _, dados = decodificar(f.read())
+            except (OSError, SnapshotInvalido) as e:
+                self.invalidas += 1
+                print(f"Snapshot {caminho} inválido ({e}); tentando a geração anterior")
+                os.replace(caminho, caminho + '.corrompido')
+                continue
+            if geracao != geracoes[0][0]:
+                print(f"{self.caminho}: usando a geração {geracao}; "
+                      f"alterações gravadas depois dela podem ter se perdido")
+            self.geracao_carregada = geracao
+            return dados
+        if geracoes:
+            raise SnapshotInvalido(f"nenhuma geração válida de {self.caminho}")
+        if os.path.exists(self.caminho):
+            try:
+                with open(self.caminho, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except ValueError as e:
+                raise SnapshotInvalido(f"{self.caminho}: {e}")
+        return None
+
+    def _limpar_temporarios(self):
+        """Remove temporários deixados por uma gravação interrompida"""
+        pasta = os.path.dirname(os.path.abspath(self.caminho))
+        padrao = os.path.join(glob.escape(pasta), glob.escape(f".{os.path.basename(self.caminho)}.") + '*.tmp')
+        for temporario in glob.glob(padrao):
+            os.remove(temporario)
+
+
+def medir_snapshots(areas=1000, gravacoes=200):
+    """Latência de gravação por durabilidade e recuperação com a geração mais nova corrompida"""
+    dados = {"seq": 1, "estoque": {f"A{i}": {"peca": f"Peça {i}", "quantidade": 100, "minimo": 10}
+                                   for i in range(areas)}}
+    resultados = {}
+    with tempfile.TemporaryDirectory(dir='.') as pasta:
+        for durabilidade in DURABILIDADES:
+            snapshots = Snapshots(os.path.join(pasta, f"estoque_{durabilidade}.json"),
+                                  durabilidade=durabilidade)
+            tempos = []
+            for _ in range(gravacoes):
+                inicio = time.perf_counter()
+                snapshots.gravar(serializar(dados))
+                tempos.append(time.perf_counter() - inicio)
+            tempos.sort()
+            resultados[durabilidade] = {"p50_ms": tempos[len(tempos) // 2] * 1000,
+                                        "p99_ms": tempos[int(len(tempos) * 0.99)] * 1000}
+
+        # Corrompe a geração mais nova (gravação cortada no meio) e recarrega
+        snapshots = Snapshots(os.path.join(pasta, "estoque_completa.json"))
+        dados["seq"] = 2
+        snapshots.gravar(serializar(dados))
+        mais_nova = snapshots.geracoes()[0][1]
+        with open(mais_nova, 'r+b') as f:
+            f.truncate(os.path.getsize(mais_nova) // 2)
+        recuperado = Snapshots(snapshots.caminho)
+        assert recuperado.carregar()["seq"] == 1
+        resultados["recuperacao"] = {"invalidas": recuperado.invalidas,
+                                     "geracao_usada": recuperado.geracao_carregada,
+                                     "geracao_corrompida": snapshots.ultima}
+    return resultados
+
+
+if __name__ == "__main__":
+    for nome, resultado in medir_snapshots().items():
+        print(f"Snapshot {nome}: {resultado}")
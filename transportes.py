@@ -0,0 +1,158 @@
+import os
+import select
+import threading
+
+# ---------------- TRANSPORTES DOS LEITORES ----------------
+# Todos os transportes expõem a mesma API que o LeitorSerial já usa do
+# pyserial (in_waiting, read bloqueante, write, cancel_read, close), então
+# um leitor pode ser uma porta serial real, um pseudo-terminal alimentado
+# pelo simulador ou um buffer em memória para testes.
+
+
+class Transporte:
+    """Interface comum dos transportes de leitor"""
+
+    @property
+    def in_waiting(self):
+        return 0
+
+    def read(self, n=1):
+        """Bloqueia até haver dados; retorna b'' após cancel_read()"""
+        raise NotImplementedError
+
+    def write(self, dados):
+        """Envia dados do host para o leitor"""
+        raise NotImplementedError
+
+    def cancel_read(self):
+        """Desbloqueia um read() pendente (usado ao encerrar)"""
+
+    def close(self):
+        pass
+
+
+class TransporteSerial(Transporte):
+    """Porta serial real (pyserial) com leitura bloqueante"""
+
+    def __init__(self, porta, baud):
+        import serial
+        self.ser = serial.Serial(porta, baud, timeout=None)
+
+    @property
+    def in_waiting(self):
+        return self.ser.in_waiting
+
+    def read(self, n=1):
+        return self.ser.read(n)
+
+    def write(self, dados):
+        return self.ser.write(dados)
+
+    def cancel_read(self):
+        self.ser.cancel_read()
+
+    def close(self):
+        self.ser.close()
+
+
+class TransportePty(Transporte):
+    """Par pseudo-terminal: o dispositivo escreve no mestre, o host lê do escravo"""
+
+    def __init__(self):
+        import pty
+        import tty
+        self.fd_mestre, self.fd_escravo = pty.openpty()
+        tty.setraw(self.fd_escravo)  # Sem eco nem tradução de fim de linha
+        tty.setraw(self.fd_mestre)
+        # Caminho que um processo externo pode abrir como porta serial
+        self.caminho = os.ttyname(self.fd_escravo)
+        self.fd_cancelar, self.fd_aviso_cancelar = os.pipe()
+
+    def read(self, n=1):
+        prontos, _, _ = select.select([self.fd_escravo, self.fd_cancelar], [], [])
+        if self.fd_cancelar in prontos:
+            return b''
+        return os.read(self.fd_escravo, max(n, 4096))
+
+    def write(self, dados):
+        return os.write(self.fd_escravo, dados)
+
+    # Lado do dispositivo (simulador/emulador)
+    def injetar(self, dados):
+        view = memoryview(dados)
+        while view:
+            escritos = os.write(self.fd_mestre, view)
+            view = view[escritos:]
+
+    def ler_dispositivo(self, n=4096):
+        return os.read(self.fd_mestre, n)
+
+    def cancel_read(self):
+        os.write(self.fd_aviso_cancelar, b'x')
+
+    def close(self):
+        for fd in (self.fd_escravo, self.fd_mestre, self.fd_cancelar, self.fd_aviso_cancelar):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class TransporteMemoria(Transporte):
+    """Buffers em memória nos dois sentidos, sem nenhum descritor do sistema"""
+
+    def __init__(self):
+        self.saida = bytearray()  # Dispositivo -> host
+        self.entrada = bytearray()  # Host -> dispositivo
+        self.cond = threading.Condition()
+        self.cancelado = False
+
+    @property
+    def in_waiting(self):
+        return len(self.saida)
+
+    def read(self, n=1):
+        with self.cond:
+            while not self.saida and not self.cancelado:
+                self.cond.wait()
+            dados = bytes(self.saida[:n])
+            del self.saida[:n]
+            return dados
+
+    def write(self, dados):
+        with self.cond:
+            self.entrada += dados
+            self.cond.notify_all()
+        return len(dados)
+
+    # Lado do dispositivo (simulador/emulador)
+    def injetar(self, dados):
+        with self.cond:
+            self.saida += dados
+            self.cond.notify_all()
+
+    def ler_dispositivo(self, n=4096):
+        with self.cond:
+            dados = bytes(self.entrada[:n])
+            del self.entrada[:n]
+            return dados
+
+    def cancel_read(self):
+        with self.cond:
+            self.cancelado = True
+            self.cond.notify_all()
+
+    def close(self):
+        self.cancel_read()
+
+
+def criar_transporte(cfg, baud_padrao=9600):
+    """Cria o transporte do leitor conforme cfg["transporte"] (padrão: serial)"""
+    tipo = cfg.get("transporte", "serial")
+    if tipo == "serial":
+        return TransporteSerial(cfg["porta"], cfg.get("baud", baud_padrao))
+    if tipo == "pty":
+        return TransportePty()
+    if tipo == "memoria":
+        return TransporteMemoria()
+    raise ValueError(f"Transporte desconhecido: {tipo}")